@@ -0,0 +1,89 @@
+"""
+Parity and speed of the CPU inference backends
+
+Exports every backend of the detection and segmentation models (or loads
+the exports already in --directory) and compares each one's outputs and
+latency with those of the eager float32 model: the fraction of matching
+detections (same class, IoU >= 0.5) or segmentation pixels, the largest
+score/logit difference, and the speedup.
+
+Usage (from the ai/ directory):
+
+    python -m benchmarks.backends --images photos/*.jpg --output backends.json
+    python -m benchmarks.backends --backends torchscript,quantized --task detection
+"""
+
+import argparse
+import json
+import os
+import sys
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AI_DIR not in sys.path:
+    sys.path.insert(0, AI_DIR)
+
+
+def load_inputs(args, task, model):
+    """Model inputs of the photos given on the command line (synthetic ones if none)"""
+    from object_detection.backends import example_inputs
+    from common.image_io import load_image
+
+    if not args.images:
+        return example_inputs(task, count=args.count)
+    tensors = [model.transform(load_image(path)) for path in args.images]
+    if task == 'detection':
+        # The detection graph does not resize its inputs (see PresizedTransform)
+        return [[model.resize_tensor(tensor, *model.input_limits())] for tensor in tensors]
+    return [tensor.unsqueeze(0) for tensor in tensors]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', nargs='*', help='Photos to compare on (synthetic inputs if omitted)')
+    parser.add_argument('--count', type=int, default=4, help='Number of synthetic inputs')
+    parser.add_argument('--task', choices=['all', 'detection', 'segmentation'], default='all')
+    parser.add_argument('--backends', default='torchscript,quantized,onnx', help='Comma-separated backends to compare')
+    parser.add_argument('--directory', default='backends', help='Export directory (exports found there are reused)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    from object_detection.backends import backend_path, check_parity, load_backend
+    from object_detection.models import ObjectDetection, Segmentation
+
+    models = {}
+    if args.task in ('all', 'detection'):
+        models['detection'] = ObjectDetection()
+    if args.task in ('all', 'segmentation'):
+        models['segmentation'] = Segmentation()
+
+    results = []
+    for task, wrapper in models.items():
+        inputs = load_inputs(args, task, wrapper)
+        for backend in [b.strip() for b in args.backends.split(',') if b.strip()]:
+            row = {'task': task, 'backend': backend, 'inputs': len(inputs)}
+            try:
+                runner = load_backend(wrapper.model, task, backend, backend_path(args.directory, wrapper.EXPORT_NAME, backend))
+                row.update(check_parity(wrapper.model, runner, task, inputs))
+            except Exception as e:
+                row['error'] = f"{type(e).__name__}: {e}"
+                print(f"{task:12} {backend:12}  ERROR {row['error']}", flush=True)
+                results.append(row)
+                continue
+
+            row['speedup'] = row['eager_seconds'] / row['backend_seconds'] if row['backend_seconds'] else None
+            results.append(row)
+            print(
+                f"{task:12} {backend:12}  agreement {row['agreement']:6.1%}  max diff {row['max_difference']:8.4f}  "
+                f"eager {row['eager_seconds'] * 1000:8.1f} ms  {backend} {row['backend_seconds'] * 1000:8.1f} ms  "
+                f"x{row['speedup']:.2f}",
+                flush=True
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'images': args.images or None, 'results': results}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
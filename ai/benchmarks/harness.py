@@ -0,0 +1,123 @@
+"""
+Measurement helpers: latency percentiles, throughput and peak memory
+"""
+
+import gc
+import os
+import resource
+import threading
+import time
+
+
+def percentile(sorted_values, fraction):
+    """
+    Linearly interpolated percentile
+
+    Args:
+        sorted_values: Ascending list of values
+        fraction: Percentile as a fraction (0.5 for the median)
+
+    Returns:
+        Percentile value
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def current_rss():
+    """
+    Resident set size of this process
+
+    Returns:
+        Bytes, or None where /proc is not available
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class PeakMemorySampler:
+    """
+    Samples RSS in a background thread to find the peak of a code section
+
+    Falls back to the process-wide maximum RSS where /proc is unavailable,
+    in which case the peak is not specific to the section.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.baseline = current_rss()
+        self.peak = self.baseline
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            # ru_maxrss is in kilobytes on Linux
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = current_rss()
+            if rss is not None and rss > self.peak:
+                self.peak = rss
+            self._stop.wait(self.interval)
+
+
+def measure(fn, iterations=10, warmup=2, min_time=0.0):
+    """
+    Time repeated calls of a benchmark function
+
+    Args:
+        fn: Zero-argument callable running one operation
+        iterations: Minimum number of timed calls
+        warmup: Untimed calls made first (lazy initialization, allocator warm-up)
+        min_time: Keep iterating until this many seconds have been timed
+
+    Returns:
+        Dictionary with latency percentiles (ms), throughput (ops/s) and memory (MB)
+    """
+    for _ in range(warmup):
+        fn()
+    gc.collect()
+
+    latencies = []
+    with PeakMemorySampler() as memory:
+        started = time.perf_counter()
+        while len(latencies) < iterations or time.perf_counter() - started < min_time:
+            start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    mb = 1024 * 1024
+    return {
+        'iterations': len(latencies),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'min_ms': latencies[0] * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'throughput_per_s': len(latencies) / elapsed if elapsed > 0 else None,
+        'peak_rss_mb': memory.peak / mb if memory.peak is not None else None,
+        'peak_rss_delta_mb': (memory.peak - memory.baseline) / mb if memory.baseline is not None else None,
+    }
@@ -0,0 +1,300 @@
+"""
+Benchmark suite for the AI model functions and API endpoints
+
+Runs every model function in-process and every endpoint through the
+FastAPI app on deterministic synthetic garments, masks and textures at
+several resolutions, and writes latency percentiles, throughput and peak
+memory as JSON so runs from different commits can be compared.
+
+Usage (from the ai/ directory):
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --resolutions 256,512 --suite inprocess --filter render_texture
+    python -m benchmarks.run --output new.json --compare bench.json --threshold 10
+    python -m benchmarks.run --suite api --detector stub --filter object-detection
+
+With --detector stub the detection endpoints run without a model, so the
+api suite measures only the service overhead (decoding, batching, caching).
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AI_DIR not in sys.path:
+    sys.path.insert(0, AI_DIR)
+
+from benchmarks.harness import measure
+from benchmarks.synthetic import encode, garment_image, garment_mask, garment_size, texture_image
+
+# (texture_type, texture_params) combinations of render_texture
+TEXTURE_CASES = [
+    ('simple', None),
+    ('mapped', {'scale': 1.5, 'rotation': 30.0, 'offset_x': 0.1, 'offset_y': 0.0}),
+    ('procedural', {'pattern': 'noise', 'scale': 0.1}),
+    ('procedural', {'pattern': 'checker', 'scale': 0.05}),
+    ('procedural', {'pattern': 'stripes', 'scale': 0.05}),
+]
+
+
+def texture_case_name(texture_type, params):
+    return f"{texture_type}:{params['pattern']}" if texture_type == 'procedural' else texture_type
+
+
+def make_inputs(resolution):
+    """Encoded garment, mask and texture uploads plus the decoded mask for one resolution"""
+    width, height = garment_size(resolution)
+    mask = garment_mask(width, height)
+    return {
+        'size': f"{width}x{height}",
+        'garment': encode(garment_image(width, height, seed=resolution)),
+        'mask': mask,
+        'mask_png': encode(mask),
+        'texture': encode(texture_image(width, height, seed=resolution + 1)),
+    }
+
+
+def inprocess_cases(resolutions, workdir):
+    """
+    Benchmarks of the model functions with shared model instances
+
+    Yields:
+        (name, size, params, fn) tuples
+    """
+    from object_detection.models import (
+        ObjectDetection, Segmentation, detect_and_segment_fashion_objects, detect_fashion_objects, segment_fashion_object
+    )
+    from texture_rendering.models import TextureRenderer, render_texture
+    from pattern_extraction.models import PatternExtractor, extract_pattern
+    from model_application.models import Model3DApplicator, apply_design_to_model
+
+    detector = ObjectDetection()
+    segmenter = Segmentation()
+    renderer = TextureRenderer()
+    extractor = PatternExtractor()
+    applicator = Model3DApplicator()
+    output_dir = os.path.join(workdir, 'model_views')
+    os.makedirs(output_dir, exist_ok=True)
+
+    for resolution in resolutions:
+        inputs = make_inputs(resolution)
+        size = inputs['size']
+
+        yield 'detect_fashion_objects', size, None, lambda i=inputs: detect_fashion_objects(i['garment'], detector=detector)
+        yield 'segment_fashion_object', size, None, lambda i=inputs: segment_fashion_object(i['garment'], segmenter=segmenter)
+        yield (
+            'detect_and_segment_fashion_objects', size, None,
+            lambda i=inputs: detect_and_segment_fashion_objects(i['garment'], detector=detector, segmenter=segmenter)
+        )
+        for texture_type, params in TEXTURE_CASES:
+            yield (
+                f"render_texture[{texture_case_name(texture_type, params)}]", size, params,
+                lambda i=inputs, t=texture_type, p=params: render_texture(
+                    i['mask'], i['texture'], None, t, p, renderer=renderer
+                )
+            )
+        yield 'extract_pattern', size, {'num_pieces': 4}, lambda i=inputs: extract_pattern(i['garment'], extractor=extractor)
+        yield (
+            'apply_design_to_model', size, {'model_type': 'smpl'},
+            lambda i=inputs: apply_design_to_model(i['garment'], output_dir, applicator=applicator, base_filename='bench')
+        )
+
+
+def api_cases(client, resolutions):
+    """
+    Benchmarks of the endpoints through the FastAPI app (caching disabled)
+
+    Yields:
+        (name, size, params, fn) tuples
+    """
+    def post(path, files, data=None):
+        response = client.post(path, files=files, data=data)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+
+    for resolution in resolutions:
+        inputs = make_inputs(resolution)
+        size = inputs['size']
+        garment = ('garment.png', inputs['garment'], 'image/png')
+
+        yield 'POST /object-detection', size, None, lambda g=garment: post('/object-detection', {'file': g})
+        yield (
+            'POST /object-detection/batch', size, {'images': 4},
+            lambda g=garment: post('/object-detection/batch', [('files', g)] * 4)
+        )
+        yield 'POST /segment-object', size, None, lambda g=garment: post('/segment-object', {'file': g})
+        yield 'POST /detect-and-segment', size, None, lambda g=garment: post('/detect-and-segment', {'file': g})
+        for texture_type, params in TEXTURE_CASES:
+            yield (
+                f"POST /render-texture[{texture_case_name(texture_type, params)}]", size, params,
+                lambda i=inputs, t=texture_type, p=params: post(
+                    '/render-texture',
+                    {
+                        'object_file': ('mask.png', i['mask_png'], 'image/png'),
+                        'texture_file': ('texture.png', i['texture'], 'image/png'),
+                    },
+                    {'texture_type': t, **({'texture_params': json.dumps(p)} if p else {})}
+                )
+            )
+        yield 'POST /extract-pattern', size, {'num_pieces': 4}, lambda g=garment: post('/extract-pattern', {'design_file': g})
+        yield 'POST /apply-to-model', size, {'model_type': 'smpl'}, lambda g=garment: post('/apply-to-model', {'design_file': g})
+
+
+def run_cases(suite, cases, args, results):
+    for name, size, params, fn in cases:
+        if args.filter and args.filter not in name:
+            continue
+        try:
+            stats = measure(fn, iterations=args.iterations, warmup=args.warmup, min_time=args.min_time)
+        except Exception as e:
+            stats = {'error': f"{type(e).__name__}: {e}"}
+        results.append({'suite': suite, 'name': name, 'size': size, 'params': params, **stats})
+        if 'error' in stats:
+            print(f"{suite:9} {name:45} {size:>10}  ERROR {stats['error']}", flush=True)
+        else:
+            print(
+                f"{suite:9} {name:45} {size:>10}  p50 {stats['p50_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms  "
+                f"{stats['throughput_per_s']:7.2f}/s  peak {stats['peak_rss_mb']:7.0f} MB",
+                flush=True
+            )
+
+
+def run_api_suite(args, workdir, results):
+    # Every request must run the models, and nothing may be forked or rejected
+    os.environ.update({
+        'AI_CACHE_MEMORY_MB': '0',
+        'AI_CACHE_DISK_MB': '0',
+        'AI_JOB_WORKERS': '0',
+        'AI_JOB_DB': os.path.join(workdir, 'jobs.sqlite3'),
+        'AI_ADMISSION_CAPACITY': '',
+        'AI_ADMISSION_CAPACITY_DEFAULT': '0',
+        'AI_PRELOAD_MODELS': '',
+    })
+    if args.detector:
+        os.environ['AI_DETECTOR'] = args.detector
+    try:
+        from fastapi.testclient import TestClient
+        import main
+    except ImportError as e:
+        print(f"Skipping the api suite: {e}", file=sys.stderr)
+        return
+
+    with TestClient(main.app) as client:
+        run_cases('api', api_cases(client, args.resolutions), args, results)
+
+
+def environment():
+    """Description of the code and machine a run was made on"""
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        info['commit'] = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=AI_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['commit'] = None
+    try:
+        import torch
+        import torchvision
+        info['torch'] = torch.__version__
+        info['torchvision'] = torchvision.__version__
+        info['torch_threads'] = torch.get_num_threads()
+        info['cuda'] = torch.cuda.is_available()
+    except ImportError:
+        pass
+    return info
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print p50 changes against a baseline run
+
+    Args:
+        results: Results of this run
+        baseline_path: JSON file written by an earlier run
+        threshold: Percent p50 increase reported as a regression
+
+    Returns:
+        Number of regressions
+    """
+    with open(baseline_path) as f:
+        baseline = {(r['suite'], r['name'], r['size']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\nComparison with {baseline_path} (p50, regression threshold {threshold:.0f}%)")
+    for result in results:
+        before = baseline.get((result['suite'], result['name'], result['size']))
+        if before is None or 'p50_ms' not in before or 'p50_ms' not in result:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+        flag = 'REGRESSION' if change > threshold else ''
+        regressions += bool(flag)
+        print(
+            f"{result['suite']:9} {result['name']:45} {result['size']:>10}  "
+            f"{before['p50_ms']:9.1f} -> {result['p50_ms']:9.1f} ms  {change:+6.1f}%  {flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resolutions', default='256,512,1024', help='Comma-separated garment widths in pixels')
+    parser.add_argument('--suite', choices=['all', 'inprocess', 'api'], default='all')
+    parser.add_argument('--filter', help='Only run benchmarks whose name contains this string')
+    parser.add_argument('--iterations', type=int, default=10, help='Minimum timed iterations per benchmark')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed iterations per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.0, help='Minimum timed seconds per benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Torch seed (procedural noise)')
+    parser.add_argument('--detector', help='Detector backend of the api suite (see AI_DETECTOR; stub for service overhead only)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Percent p50 increase counted as a regression')
+    args = parser.parse_args()
+    args.resolutions = [int(r) for r in args.resolutions.split(',') if r.strip()]
+
+    import torch
+    torch.manual_seed(args.seed)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='ai-bench-') as workdir:
+        # The app writes uploads/, results/ and cache/ relative to the working directory
+        os.chdir(workdir)
+        if args.suite in ('all', 'inprocess'):
+            run_cases('inprocess', inprocess_cases(args.resolutions, workdir), args, results)
+        if args.suite in ('all', 'api'):
+            run_api_suite(args, workdir, results)
+        os.chdir(AI_DIR)
+
+    report = {
+        'environment': environment(),
+        'settings': {
+            'resolutions': args.resolutions,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'min_time': args.min_time,
+            'seed': args.seed,
+            'detector': args.detector,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Deterministic synthetic inputs for the benchmarks
+
+Garments are drawn as a torso with sleeves on a white background and
+filled with a random fabric pattern, so detection, segmentation and
+pattern extraction see a clear foreground object at every resolution.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def garment_outline(width, height):
+    """
+    Polygon of a T-shirt-like garment scaled to the image size
+
+    Args:
+        width: Image width
+        height: Image height
+
+    Returns:
+        List of (x, y) points
+    """
+    points = [
+        (0.35, 0.12), (0.65, 0.12), (0.92, 0.30), (0.82, 0.42), (0.72, 0.35),
+        (0.72, 0.90), (0.28, 0.90), (0.28, 0.35), (0.18, 0.42), (0.08, 0.30),
+    ]
+    return [(x * width, y * height) for x, y in points]
+
+
+def garment_mask(width, height):
+    """
+    Binary garment mask
+
+    Args:
+        width: Image width
+        height: Image height
+
+    Returns:
+        HxW uint8 array (255 inside the garment)
+    """
+    mask = Image.new('L', (width, height), 0)
+    ImageDraw.Draw(mask).polygon(garment_outline(width, height), fill=255)
+    return np.array(mask)
+
+
+def texture_image(width, height, seed=0):
+    """
+    Fabric-like texture: woven stripes with per-pixel noise
+
+    Args:
+        width: Image width
+        height: Image height
+        seed: Random seed
+
+    Returns:
+        RGB PIL image
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    period = max(4, width // 32)
+    weave = ((x // period + y // period) % 2).astype(np.float32)
+    base = rng.integers(40, 215, size=3).astype(np.float32)
+    accent = rng.integers(40, 215, size=3).astype(np.float32)
+    pixels = weave[..., None] * base + (1 - weave[..., None]) * accent
+    pixels += rng.normal(0, 12, size=pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def garment_image(width, height, seed=0):
+    """
+    Garment photo stand-in: textured garment on a white background
+
+    Args:
+        width: Image width
+        height: Image height
+        seed: Random seed
+
+    Returns:
+        RGB PIL image
+    """
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    image.paste(texture_image(width, height, seed), mask=Image.fromarray(garment_mask(width, height)))
+    return image
+
+
+def encode(image, fmt='PNG'):
+    """
+    Encode an image as an upload would arrive
+
+    Args:
+        image: PIL image or numpy array
+        fmt: PIL format name
+
+    Returns:
+        Encoded bytes
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def garment_size(resolution):
+    """Portrait (width, height) of a garment image whose width is resolution"""
+    return resolution, resolution * 4 // 3
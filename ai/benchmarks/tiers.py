@@ -0,0 +1,145 @@
+"""
+Accuracy and latency of the detection resolution tiers
+
+Each tier in AI_DETECTION_TIERS is compared with detection on the fully
+decoded, full-resolution upload (the behaviour before tiers existed):
+recall and precision of the tier's boxes against that reference (same
+class, IoU >= 0.5), mean IoU of the matched boxes, and latency including
+decoding.
+
+Usage (from the ai/ directory):
+
+    python -m benchmarks.tiers --images photos/*.jpg --output tiers.json
+    python -m benchmarks.tiers --resolution 4000 --iterations 5
+"""
+
+import argparse
+import json
+import os
+import sys
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AI_DIR not in sys.path:
+    sys.path.insert(0, AI_DIR)
+
+from benchmarks.harness import measure
+from benchmarks.synthetic import encode, garment_image, garment_size
+
+
+def iou(a, b):
+    """Intersection over union of two [x1, y1, x2, y2] boxes"""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def match(reference, objects, threshold=0.5):
+    """
+    Greedily match detections to reference detections of the same class
+
+    Args:
+        reference: Reference detections
+        objects: Detections to evaluate
+        threshold: Minimum IoU of a match
+
+    Returns:
+        List of the IoUs of the matched pairs
+    """
+    unmatched = list(reference)
+    ious = []
+    for obj in sorted(objects, key=lambda o: o['confidence'], reverse=True):
+        candidates = [(iou(obj['bbox'], ref['bbox']), n) for n, ref in enumerate(unmatched) if ref['class'] == obj['class']]
+        best = max(candidates, default=(0.0, None))
+        if best[0] >= threshold:
+            ious.append(best[0])
+            unmatched.pop(best[1])
+    return ious
+
+
+def load_inputs(args):
+    """(name, encoded bytes) of the images to evaluate"""
+    if args.images:
+        inputs = []
+        for path in args.images:
+            with open(path, 'rb') as f:
+                inputs.append((os.path.basename(path), f.read()))
+        return inputs
+    width, height = garment_size(args.resolution)
+    return [(f"garment-{width}x{height}.jpg", encode(garment_image(width, height, seed=args.resolution), 'JPEG'))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', nargs='*', help='Photos to evaluate (a synthetic garment if omitted)')
+    parser.add_argument('--resolution', type=int, default=4000, help='Width of the synthetic garment')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed iterations per image and tier')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed iterations per image and tier')
+    parser.add_argument('--iou', type=float, default=0.5, help='Minimum IoU of a matching box')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    import config
+    from common.image_io import load_image
+    from object_detection.models import ObjectDetection
+
+    detector = ObjectDetection()
+    inputs = load_inputs(args)
+
+    def reference(data):
+        return detector.detect_tensors([detector.transform(load_image(data))])[0]
+
+    tiers = [('reference', None, reference)] + [
+        (name, max_size, lambda data, m=max_size or None: detector.detect_objects(data, m))
+        for name, max_size in config.DETECTION_TIERS.items()
+    ]
+    expected = {name: reference(data) for name, data in inputs}
+
+    results = []
+    for tier, max_size, detect in tiers:
+        latencies, found, matched, ious = [], 0, 0, []
+        for name, data in inputs:
+            stats = measure(lambda: detect(data), iterations=args.iterations, warmup=args.warmup)
+            latencies.append(stats)
+            objects = detect(data)
+            pair_ious = match(expected[name], objects, args.iou)
+            found += len(objects)
+            matched += len(pair_ious)
+            ious += pair_ious
+
+        total = sum(len(objects) for objects in expected.values())
+        row = {
+            'tier': tier,
+            'max_size': max_size,
+            'images': len(inputs),
+            'p50_ms': sum(s['p50_ms'] for s in latencies) / len(latencies),
+            'p90_ms': sum(s['p90_ms'] for s in latencies) / len(latencies),
+            'peak_rss_delta_mb': max((s['peak_rss_delta_mb'] or 0) for s in latencies),
+            'reference_objects': total,
+            'objects': found,
+            'recall': matched / total if total else None,
+            'precision': matched / found if found else None,
+            'mean_iou': sum(ious) / len(ious) if ious else None,
+        }
+        results.append(row)
+
+        def fmt(value):
+            return '   n/a' if value is None else f"{value:6.3f}"
+        print(
+            f"{tier:10} {str(max_size or '-'):>6}  p50 {row['p50_ms']:9.1f} ms  p90 {row['p90_ms']:9.1f} ms  "
+            f"+{row['peak_rss_delta_mb']:6.0f} MB  recall {fmt(row['recall'])}  precision {fmt(row['precision'])}  "
+            f"IoU {fmt(row['mean_iou'])}",
+            flush=True
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'inputs': [name for name, _ in inputs], 'tiers': results}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+
+def load_image(source, mode='RGB'):
+    """
+    Load an image from any supported source
+    
+    Args:
+        source: Path, raw encoded bytes, binary file object, PIL image or
+            HxW / HxWxC numpy array (uint8, or float in [0, 1])
+        mode: PIL mode to convert the image to
+        
+    Returns:
+        PIL image in the requested mode
+    """
+    if isinstance(source, Image.Image):
+        # Already decoded, avoid a copy when no conversion is needed
+        return source if source.mode == mode else source.convert(mode)
+    
+    if isinstance(source, np.ndarray):
+        if source.dtype != np.uint8:
+            source = (np.clip(source, 0, 1) * 255).astype(np.uint8)
+        image = Image.fromarray(source)
+        return image if image.mode == mode else image.convert(mode)
+    
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(source))
+    else:
+        # Path or file-like object
+        image = Image.open(source)
+    
+    # convert() also forces the lazy decode, releasing the file handle
+    return image.convert(mode)
+
+
+def fit_size(size, max_short, max_long):
+    """
+    Size of an image downscaled to fit side limits
+    
+    Args:
+        size: (width, height)
+        max_short: Maximum length of the shorter side
+        max_long: Maximum length of the longer side
+        
+    Returns:
+        (width, height) with the aspect ratio kept (never larger than size)
+    """
+    width, height = size
+    scale = min(1.0, max_short / max(1, min(width, height)), max_long / max(1, width, height))
+    if scale >= 1.0:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_image_fit(source, max_short, max_long, mode='RGB'):
+    """
+    Load an image downscaled to fit side limits
+    
+    Encoded JPEGs are decoded at reduced scale (draft mode), so a large
+    photo is never fully decoded when only a small version is needed.
+    
+    Args:
+        source: Image source accepted by load_image
+        max_short: Maximum length of the shorter side
+        max_long: Maximum length of the longer side
+        mode: PIL mode to convert the image to
+        
+    Returns:
+        Tuple of the PIL image and the original (width, height)
+    """
+    if isinstance(source, (Image.Image, np.ndarray)):
+        image = load_image(source, mode)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(source))
+    else:
+        image = Image.open(source)
+    
+    original_size = image.size
+    target = fit_size(original_size, max_short, max_long)
+    if target != original_size:
+        # Lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while staying >= target
+        image.draft(mode, target)
+        image = image.resize(target, Image.BILINEAR, reducing_gap=2.0)
+    
+    return (image if image.mode == mode else image.convert(mode)), original_size
+
+
+def load_mask(source):
+    """
+    Load a mask image as a single channel
+    
+    Images with transparency (e.g. segment-object output) give their alpha
+    channel, other images their luminance.
+    
+    Args:
+        source: Path, raw encoded bytes, binary file object or PIL image
+        
+    Returns:
+        PIL image in mode L
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = Image.open(io.BytesIO(source))
+    elif not isinstance(source, Image.Image):
+        source = Image.open(source)
+    
+    if 'A' in source.getbands() or 'transparency' in source.info:
+        return source.convert('RGBA').getchannel('A')
+    return load_image(source, 'L')
+
+
+def flatten_alpha(image, background=(0, 0, 0)):
+    """
+    Composite an image with transparency onto a solid background
+    
+    Args:
+        image: PIL image
+        background: RGB background color
+        
+    Returns:
+        RGB PIL image (the image itself if it has no alpha channel and is RGB)
+    """
+    if 'A' not in image.getbands():
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    flattened = Image.new('RGB', image.size, background)
+    flattened.paste(image.convert('RGBA'), mask=image.getchannel('A'))
+    return flattened
+
+
+def frame_count(data):
+    """
+    Read the number of frames of an encoded image without decoding them
+    
+    Args:
+        data: Raw encoded bytes
+        
+    Returns:
+        Frame count (1 for a still or unreadable image)
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return max(1, getattr(image, 'n_frames', 1))
+    except Exception:
+        return 1
+
+
+def animated_frames(data):
+    """
+    Decode the frames of an animated image (GIF, WebP, APNG) one at a time
+    
+    Only the current frame is kept in memory, however long the animation.
+    
+    Args:
+        data: Raw encoded bytes
+        
+    Yields:
+        RGB PIL image of each frame
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        for frame in ImageSequence.Iterator(image):
+            yield frame.convert('RGB')
+
+
+def image_pixels(data, all_frames=False):
+    """
+    Read the pixel count of an encoded image from its header, without decoding it
+    
+    Args:
+        data: Raw encoded bytes
+        all_frames: Count the pixels of every frame of an animated image
+            (only the first frame's by default)
+        
+    Returns:
+        Width times height (times the frame count with all_frames), or None
+        if the header cannot be read
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            frames = getattr(image, 'n_frames', 1) if all_frames else 1
+    except Exception:
+        return None
+    return width * height * max(1, frames)
+
+
+def source_path(source):
+    """
+    Get the file path of an image source
+    
+    Args:
+        source: Image source accepted by load_image
+        
+    Returns:
+        Path if the source is a file path, otherwise None
+    """
+    return os.fspath(source) if isinstance(source, (str, os.PathLike)) else None
+
+
+# Supported output formats: name -> (PIL format, media type, file extension)
+IMAGE_FORMATS = {
+    'png': ('PNG', 'image/png', '.png'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+    'webp': ('WEBP', 'image/webp', '.webp'),
+}
+
+# Quality used when the client does not ask for one
+DEFAULT_QUALITY = {
+    'jpeg': 85,
+    'webp': 80,
+}
+
+
+def encode_image(image, fmt='png', quality=None, max_size=None):
+    """
+    Encode an image in memory
+    
+    Args:
+        image: PIL image or numpy array
+        fmt: Output format (png, jpeg or webp)
+        quality: Lossy quality from 1 to 100 (ignored for png)
+        max_size: Maximum width/height of a downscaled preview (None keeps full size)
+        
+    Returns:
+        Encoded image bytes
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format '{fmt}'")
+    pil_format = IMAGE_FORMATS[fmt][0]
+    
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    
+    if max_size and max(image.size) > max_size:
+        # thumbnail() works in place, so shrink a copy
+        image = image.copy()
+        image.thumbnail((max_size, max_size), Image.BILINEAR)
+    
+    # JPEG has no alpha channel: transparent pixels become black
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = flatten_alpha(image)
+    
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        # Level 3 is several times faster than the default 6 for a few percent more bytes
+        image.save(buffer, pil_format, compress_level=3)
+    else:
+        image.save(buffer, pil_format, quality=quality or DEFAULT_QUALITY[fmt])
+    
+    return buffer.getvalue()
+
+
+# File extensions picked from archives
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+
+
+class ArchiveTooLarge(ValueError):
+    """Raised when an archive holds more images or image bytes than allowed"""
+
+
+def read_archive(data, max_items=None, max_bytes=None):
+    """
+    Extract image files from a zip or tar archive in memory
+    
+    Member sizes are checked before a member is inflated, so an archive
+    over the limits is rejected without being extracted.
+    
+    Args:
+        data: Archive bytes (zip, or tar with optional gzip/bz2/xz compression)
+        max_items: Maximum number of image files (None for no limit)
+        max_bytes: Maximum total uncompressed size of the image files (None for no limit)
+        
+    Returns:
+        List of (member name, file bytes) tuples sorted by member name
+        
+    Raises:
+        ArchiveTooLarge: If the archive exceeds max_items or max_bytes
+        ValueError: If the data is not an archive
+    """
+    images = []
+    total = 0
+    
+    def admit(size):
+        nonlocal total
+        total += size
+        if max_items is not None and len(images) >= max_items:
+            raise ArchiveTooLarge(f"Archive holds more than {max_items} images")
+        if max_bytes is not None and total > max_bytes:
+            raise ArchiveTooLarge(f"Archive images exceed {max_bytes} bytes uncompressed")
+    
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    # Reads stop at the declared file_size, so it bounds the inflated bytes
+                    admit(info.file_size)
+                    images.append((info.filename, archive.read(info)))
+    else:
+        try:
+            with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as archive:
+                # Iterating reads headers one at a time, unlike getmembers() which scans the whole archive first
+                for member in archive:
+                    if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                        admit(member.size)
+                        images.append((member.name, archive.extractfile(member).read()))
+        except tarfile.TarError:
+            raise ValueError("Archive is neither a zip nor a tar file")
+    
+    return sorted(images, key=lambda item: item[0])
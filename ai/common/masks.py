@@ -0,0 +1,127 @@
+import math
+import struct
+import zlib
+
+import numpy as np
+
+
+def encode_rle(mask):
+    """
+    Run-length encode a binary mask
+    
+    Args:
+        mask: HxW array (non-zero is foreground)
+        
+    Returns:
+        Dictionary with the mask size [height, width] and the row-major run
+        lengths, alternating background and foreground and starting with
+        background (so the first count is 0 when the mask starts with foreground)
+    """
+    mask = np.asarray(mask)
+    flat = mask.ravel() != 0
+    if flat.size == 0:
+        return {'size': list(mask.shape), 'counts': []}
+    
+    # Run boundaries are where a value differs from its predecessor
+    boundaries = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1, [flat.size]])
+    counts = np.diff(boundaries).tolist()
+    if flat[0]:
+        counts.insert(0, 0)
+    return {'size': list(mask.shape), 'counts': counts}
+
+
+def decode_rle(rle):
+    """
+    Decode a mask produced by encode_rle
+    
+    Args:
+        rle: Dictionary with size and counts
+        
+    Returns:
+        HxW uint8 array (1 for foreground)
+    """
+    height, width = rle['size']
+    counts = np.asarray(rle['counts'], dtype=np.int64)
+    values = (np.arange(len(counts)) % 2).astype(np.uint8)
+    return np.repeat(values, counts).reshape(height, width)
+
+
+# Header of packed masks: magic, height, width
+PACKED_HEADER = struct.Struct('<4sII')
+PACKED_MAGIC = b'MSK1'
+
+
+def pack_mask(mask):
+    """
+    Pack a binary mask into compact bytes
+    
+    One bit per pixel, deflate-compressed (long runs of equal pixels
+    compress to almost nothing), so a 12 megapixel mask usually takes a
+    few kilobytes.
+    
+    Args:
+        mask: HxW array (non-zero is foreground)
+        
+    Returns:
+        Packed mask bytes (see unpack_mask)
+    """
+    mask = np.asarray(mask)
+    height, width = mask.shape
+    bits = np.packbits(mask.ravel() != 0)
+    return PACKED_HEADER.pack(PACKED_MAGIC, height, width) + zlib.compress(bits.tobytes(), 1)
+
+
+def packed_mask_size(data):
+    """
+    Size of a packed mask, read from its header
+    
+    Args:
+        data: Bytes from pack_mask
+        
+    Returns:
+        (height, width)
+    """
+    magic, height, width = PACKED_HEADER.unpack_from(data)
+    if magic != PACKED_MAGIC:
+        raise ValueError("Not a packed mask")
+    return height, width
+
+
+def unpack_mask(data):
+    """
+    Decode a mask produced by pack_mask
+    
+    Args:
+        data: Packed mask bytes
+        
+    Returns:
+        HxW uint8 array (1 for foreground)
+    """
+    height, width = packed_mask_size(data)
+    bits = np.frombuffer(zlib.decompress(data[PACKED_HEADER.size:]), dtype=np.uint8)
+    return np.unpackbits(bits, count=height * width).reshape(height, width)
+
+
+def box_region(bbox, width, height, margin=0.0):
+    """
+    Integer pixel region covering a bounding box, optionally enlarged
+    
+    Args:
+        bbox: [x1, y1, x2, y2] in pixels (floats allowed)
+        width: Image width
+        height: Image height
+        margin: Fraction of the box size added on every side
+        
+    Returns:
+        (x0, y0, x1, y1) clipped to the image, or None if the region is empty
+    """
+    x1, y1, x2, y2 = bbox
+    pad_x = (x2 - x1) * margin
+    pad_y = (y2 - y1) * margin
+    x0 = max(0, int(math.floor(x1 - pad_x)))
+    y0 = max(0, int(math.floor(y1 - pad_y)))
+    x1 = min(width, int(math.ceil(x2 + pad_x)))
+    y1 = min(height, int(math.ceil(y2 + pad_y)))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
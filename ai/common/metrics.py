@@ -0,0 +1,265 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from cache hits to multi-second model runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Labels added to every sample (see MetricsRegistry.set_constant_labels)
+        self.constant_labels: Tuple[Tuple[str, str], ...] = ()
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        return _format_labels(self.labelnames, key, self.constant_labels + tuple(extra))
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a cumulative total kept by another component"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{self._labels(key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, usually set at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{self._labels(key)} {_format_value(value)}' for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(counts), total[0]) for key, (counts, total) in self._values.items())
+
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = self._labels(key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = self._labels(key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered in the Prometheus text exposition format
+
+    Kept dependency-free so the model modules can record timings without
+    pulling in a client library.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self.constant_labels: Tuple[Tuple[str, str], ...] = ()
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets or DEFAULT_BUCKETS)
+
+    def set_constant_labels(self, **labels: str):
+        """
+        Add labels to every sample, e.g. to tell the series of server processes apart
+
+        Args:
+            **labels: Label names and values
+        """
+        with self._lock:
+            self.constant_labels = tuple((name, str(value)) for name, value in labels.items())
+            for metric in self._metrics.values():
+                metric.constant_labels = self.constant_labels
+
+    def render(self) -> str:
+        """
+        Render every metric
+
+        Returns:
+            Exposition text (content type text/plain; version=0.0.4)
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        # Registering the same name twice returns the existing metric, so
+        # modules can declare the metrics they use independently
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+                metric.constant_labels = self.constant_labels
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric '{name}' is already registered with a different type or labels")
+            return metric
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'ai_stage_seconds',
+    'Time spent in each processing stage of a model',
+    ['model', 'stage']
+)
+
+
+def stage(model: str, name: str):
+    """
+    Time a block as one processing stage of a model
+
+    Args:
+        model: Model name
+        name: Stage name (e.g. preprocess, forward, postprocess)
+
+    Returns:
+        Context manager recording the block duration
+    """
+    return STAGE_SECONDS.time(model=model, stage=name)
+
+
+def timed_stage(model: str, name: str):
+    """
+    Decorator recording every call of a function as a processing stage
+
+    Args:
+        model: Model name
+        name: Stage name
+
+    Returns:
+        Decorator
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(model, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,178 @@
+"""
+Runtime configuration for the AI service
+
+All settings are read from environment variables so that every replica
+can be tuned without code changes.
+"""
+
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_list(name, default):
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_limits(name, default):
+    limits = {}
+    for item in _env_list(name, default):
+        key, _, value = item.partition("=")
+        limits[key.strip()] = int(value)
+    return limits
+
+
+# Endpoints this worker serves, e.g. "object-detection,segment-object" (empty serves all).
+# Models of other endpoints are never imported or loaded.
+ENDPOINTS = _env_list("AI_ENDPOINTS", "")
+
+# Models loaded once on startup and kept warm for the lifetime of the process
+PRELOAD_MODELS = _env_list("AI_PRELOAD_MODELS", "object_detection,segmentation")
+
+# Seconds a lazily loaded model may stay unused before it is evicted (0 disables)
+MODEL_IDLE_TIMEOUT = _env_float("AI_MODEL_IDLE_TIMEOUT", 1800.0)
+
+# Seconds between idle model eviction sweeps
+MODEL_REAPER_INTERVAL = _env_float("AI_MODEL_REAPER_INTERVAL", 60.0)
+
+# Micro-batching of concurrent detection and segmentation requests
+BATCH_MAX_SIZE = _env_int("AI_BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = _env_float("AI_BATCH_MAX_WAIT_MS", 10.0)
+BATCH_WORKERS = _env_int("AI_BATCH_WORKERS", 1)
+
+# Pool that runs blocking model functions ("thread" or "process")
+EXECUTOR_KIND = os.environ.get("AI_EXECUTOR", "thread")
+EXECUTOR_WORKERS = _env_int("AI_EXECUTOR_WORKERS", 0) or None
+
+# Concurrent model calls allowed per endpoint, e.g. "extract-pattern=1,apply-to-model=2"
+ENDPOINT_CONCURRENCY = _env_limits("AI_ENDPOINT_CONCURRENCY", "extract-pattern=2,apply-to-model=2")
+ENDPOINT_CONCURRENCY_DEFAULT = _env_int("AI_ENDPOINT_CONCURRENCY_DEFAULT", 4)
+
+# Content-addressed result cache (a budget of 0 disables a tier)
+CACHE_MEMORY_MB = _env_int("AI_CACHE_MEMORY_MB", 256)
+CACHE_DIR = os.environ.get("AI_CACHE_DIR", "cache")
+CACHE_DISK_MB = _env_int("AI_CACHE_DISK_MB", 2048)
+
+# Keep a copy of every upload under uploads/ (models decode uploads from memory either way)
+PERSIST_UPLOADS = os.environ.get("AI_PERSIST_UPLOADS", "0") == "1"
+
+# Keep a copy of every image result under results/ (clients can also ask with ?save=true)
+PERSIST_RESULTS = os.environ.get("AI_PERSIST_RESULTS", "0") == "1"
+
+# Retention of uploads/ and results/ (0 disables a limit)
+STORAGE_TTL_HOURS = _env_float("AI_STORAGE_TTL_HOURS", 24.0)
+STORAGE_MAX_MB = _env_int("AI_STORAGE_MAX_MB", 10240)
+STORAGE_SWEEP_INTERVAL = _env_float("AI_STORAGE_SWEEP_INTERVAL", 300.0)
+
+# Asynchronous job queue. Workers send a heartbeat for the job they run; a
+# running job without one for AI_JOB_TIMEOUT seconds is requeued.
+JOB_DB = os.environ.get("AI_JOB_DB", "jobs/jobs.sqlite3")
+JOB_WORKERS = _env_int("AI_JOB_WORKERS", 1)
+JOB_MAX_ATTEMPTS = _env_int("AI_JOB_MAX_ATTEMPTS", 3)
+JOB_TIMEOUT = _env_float("AI_JOB_TIMEOUT", 600.0)
+JOB_SHUTDOWN_TIMEOUT = _env_float("AI_JOB_SHUTDOWN_TIMEOUT", 30.0)
+
+# Admission control: megapixels each endpoint may have in service at once
+# (0 disables it). Requests beyond the budget queue, and are rejected with
+# 429 once the queued megapixels or the estimated wait exceed the limits.
+ADMISSION_CAPACITY = _env_limits("AI_ADMISSION_CAPACITY", "segment-object=8")
+ADMISSION_CAPACITY_DEFAULT = _env_int("AI_ADMISSION_CAPACITY_DEFAULT", 16)
+ADMISSION_MAX_QUEUE = _env_int("AI_ADMISSION_MAX_QUEUE", 64)
+ADMISSION_MAX_WAIT = _env_float("AI_ADMISSION_MAX_WAIT", 30.0)
+
+# Pre-fork HTTP workers started by `python main.py` (models are loaded once
+# in the parent and shared copy-on-write). The admission capacities, result
+# cache budgets and AI_EXECUTOR_WORKERS are totals that the workers split
+# evenly; /metrics reports the worker that answers the scrape.
+WORKERS = _env_int("AI_WORKERS", 1)
+
+# Torch intra-op threads per worker (0 divides the cores between the workers)
+TORCH_THREADS = _env_int("AI_TORCH_THREADS", 0)
+
+# Per-request profiling: with AI_PROFILE_ON_DEMAND=1 clients ask with an
+# X-Profile header or ?profile= (cprofile, torch or all), and a fraction of
+# requests can be sampled. Captures per minute are capped per worker (0 for
+# unlimited). When AI_PROFILE_TOKEN is set, asking for a profile and the
+# /profiles endpoints require it in an X-Profile-Token header.
+PROFILE_DIR = os.environ.get("AI_PROFILE_DIR", "profiles")
+PROFILE_ON_DEMAND = os.environ.get("AI_PROFILE_ON_DEMAND", "0") == "1"
+PROFILE_TOKEN = os.environ.get("AI_PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = _env_float("AI_PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_SAMPLE_MODES = _env_list("AI_PROFILE_SAMPLE_MODES", "cprofile")
+PROFILE_MAX_PER_MINUTE = _env_int("AI_PROFILE_MAX_PER_MINUTE", 10)
+
+# Detection resolution tiers: name=longest side detection runs at (0 for the
+# model's own 800/1333 limits). Clients pick one with ?tier=; larger uploads
+# are decoded at that size and boxes are mapped back to original coordinates.
+DETECTION_TIERS = _env_limits("AI_DETECTION_TIERS", "fast=512,balanced=800,full=0")
+DETECTION_TIER = os.environ.get("AI_DETECTION_TIER", "full")
+
+# CPU inference backend of the detection and segmentation models: eager,
+# torchscript, quantized (int8 dynamic quantization) or onnx (needs the
+# onnxruntime package). Exports are written to AI_BACKEND_DIR once and
+# reused. A backend whose outputs agree with the eager model on less than
+# AI_BACKEND_MIN_PARITY at load time is not used (0 skips the check).
+INFERENCE_BACKEND = os.environ.get("AI_INFERENCE_BACKEND", "eager")
+BACKEND_DIR = os.environ.get("AI_BACKEND_DIR", "backends")
+BACKEND_MIN_PARITY = _env_float("AI_BACKEND_MIN_PARITY", 0.9)
+
+# Longest side images are segmented at; masks are upsampled back to the
+# image size. Lower is faster and uses less memory, 0 segments at full
+# resolution.
+SEGMENTATION_MAX_SIZE = _env_int("AI_SEGMENTATION_MAX_SIZE", 640)
+
+# Tiled detection (?tiled=true on /object-detection): square tiles of
+# AI_DETECTION_TILE_SIZE pixels overlapping by AI_DETECTION_TILE_OVERLAP
+# run at full resolution, AI_DETECTION_TILE_BATCH per forward pass. Images
+# are decoded at most AI_DETECTION_TILE_MAX_SIDE pixels on their longest
+# side (0 for no limit), which bounds memory.
+DETECTION_TILE_SIZE = _env_int("AI_DETECTION_TILE_SIZE", 800)
+DETECTION_TILE_OVERLAP = _env_float("AI_DETECTION_TILE_OVERLAP", 0.25)
+DETECTION_TILE_BATCH = _env_int("AI_DETECTION_TILE_BATCH", 4)
+DETECTION_TILE_MAX_SIDE = _env_int("AI_DETECTION_TILE_MAX_SIDE", 8000)
+
+# Object detection backend (see object_detection/detectors.py): torchvision
+# (Faster R-CNN), clothing (TensorFlow clothing detector placeholder) or stub
+# (instant, deterministic objects without a model, for load testing the
+# service itself)
+DETECTOR = os.environ.get("AI_DETECTOR", "torchvision")
+
+# Frame-sequence detection (/object-detection/sequence): the detector runs
+# at most every AI_SEQUENCE_KEYFRAME_INTERVAL frames, and boxes are tracked
+# in between. A mean gray level change above AI_SEQUENCE_SCENE_THRESHOLD
+# (0-1) since the last keyframe, or a template match score below
+# AI_SEQUENCE_MIN_SIMILARITY (-1 to 1), runs the detector early.
+SEQUENCE_KEYFRAME_INTERVAL = _env_int("AI_SEQUENCE_KEYFRAME_INTERVAL", 5)
+SEQUENCE_SCENE_THRESHOLD = _env_float("AI_SEQUENCE_SCENE_THRESHOLD", 0.15)
+SEQUENCE_MIN_SIMILARITY = _env_float("AI_SEQUENCE_MIN_SIMILARITY", 0.5)
+
+# Segmentation masks of /segment-object, stored bit-packed by image so
+# /render-texture can use them by ID (X-Mask-Id) without a re-upload.
+# Managed by the janitor like results/.
+MASK_DIR = os.environ.get("AI_MASK_DIR", "masks")
+
+# Byte budget of the decoded texture cache of the texture renderer, per
+# process (0 disables it). Textures are kept as uint8 mip pyramids keyed by
+# content, so reused fabrics skip decoding and full-size resampling.
+TEXTURE_CACHE_MB = _env_int("AI_TEXTURE_CACHE_MB", 256)
+
+# Limits of /object-detection/batch and /object-detection/sequence uploads:
+# images per request and their total uncompressed megabytes. Archive
+# members are checked before they are extracted; requests over a limit are
+# rejected with 413.
+BATCH_MAX_ITEMS = _env_int("AI_BATCH_MAX_ITEMS", 1000)
+BATCH_MAX_MB = _env_int("AI_BATCH_MAX_MB", 1024)
+
+# Segmentation backend: deeplabv3 (DeepLabV3 ResNet-101) or stub (instant,
+# deterministic masks without a model). Defaults to stub with AI_DETECTOR=stub,
+# so load tests of the service need no model weights at all.
+SEGMENTER = os.environ.get("AI_SEGMENTER") or ("stub" if DETECTOR == "stub" else "deeplabv3")
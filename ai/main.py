@@ -1,18 +1,73 @@
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import FileResponse, JSONResponse
+import time
+
+# Measured before the framework and the rest of the service are imported
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, Form, Header, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from starlette.routing import Match
 import uvicorn
+import asyncio
+import contextvars
+import functools
+import hmac
+import itertools
+import multiprocessing
 import os
 import shutil
-import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import json
 
-# Import AI modules
-from object_detection.models import detect_fashion_objects, segment_fashion_object
-from texture_rendering.models import render_texture
-from model_application.models import apply_design_to_model, create_model_animation
-from pattern_extraction.models import extract_pattern
+import config
+from common.masks import pack_mask, packed_mask_size, unpack_mask
+from common.image_io import ArchiveTooLarge, animated_frames, encode_image, frame_count, image_pixels, load_image, load_image_fit, read_archive, source_path
+from common.metrics import metrics
+from serving.admission import AdmissionController, Overloaded
+from serving.batching import MicroBatcher
+from serving.cache import ResultCache, content_digest, make_cache_key
+from serving.executor import InferenceExecutor
+from serving.jobs import JobStore, SUCCEEDED, run_worker_process
+from serving.lazy import imports
+from serving.registry import ModelRegistry
+from serving.singleflight import SingleFlight
+from serving.responses import ImageOptions, image_response, parse_image_options
+from serving.prefork import PreforkServer, intra_op_threads
+from serving.profiling import RequestProfiler, current_profile, run_profiled
+from serving.storage import Janitor, MaskStore, shard_path
+
+# AI modules are imported on first use, so a worker only pays for torch,
+# torchvision and matplotlib when it serves an endpoint that needs them
+create_detector = imports.attr("object_detection.detectors", "create_detector")
+Segmentation = imports.attr("object_detection.models", "Segmentation")
+StubSegmentation = imports.attr("object_detection.models", "StubSegmentation")
+detect_and_segment_fashion_objects = imports.attr("object_detection.models", "detect_and_segment_fashion_objects")
+ObjectTracker = imports.attr("object_detection.tracking", "ObjectTracker")
+TextureRenderer = imports.attr("texture_rendering.models", "TextureRenderer")
+render_texture = imports.attr("texture_rendering.models", "render_texture")
+Model3DApplicator = imports.attr("model_application.models", "Model3DApplicator")
+apply_design_to_model = imports.attr("model_application.models", "apply_design_to_model")
+PatternExtractor = imports.attr("pattern_extraction.models", "PatternExtractor")
+extract_pattern = imports.attr("pattern_extraction.models", "extract_pattern")
+
+# Models needed by each endpoint (a job endpoint needs the same models as its synchronous one)
+ENDPOINT_MODELS = {
+    "object-detection": ["object_detection"],
+    "segment-object": ["segmentation"],
+    "detect-and-segment": ["object_detection", "segmentation"],
+    "render-texture": ["texture_renderer"],
+    "apply-to-model": ["model_applicator"],
+    "extract-pattern": ["pattern_extractor"],
+    "process-evaluations": [],
+    "generate": [],
+}
+ENABLED_ENDPOINTS = set(config.ENDPOINTS or ENDPOINT_MODELS)
+ENABLED_MODELS = {model for endpoint in ENABLED_ENDPOINTS for model in ENDPOINT_MODELS.get(endpoint, [])}
+
+# Cold-start timings in seconds, filled in as the service comes up
+startup_report = {"import": time.perf_counter() - IMPORT_STARTED}
 
 # Create FastAPI app
 app = FastAPI(
@@ -30,90 +85,1164 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def reject_disabled_endpoints(request: Request, call_next):
+    """Answer 404 for endpoints this worker is not configured to serve"""
+    segments = request.url.path.strip("/").split("/")
+    endpoint = segments[1] if segments[0] == "jobs" and len(segments) > 1 and request.method == "POST" else segments[0]
+    if endpoint in ENDPOINT_MODELS and endpoint not in ENABLED_ENDPOINTS:
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"Endpoint '{endpoint}' is not served by this worker"}
+        )
+    return await call_next(request)
+
+# Request and per-stage latency, exported on /metrics. Model stages
+# (preprocess, forward, postprocess, ...) are recorded by the model classes.
+REQUEST_SECONDS = metrics.histogram("ai_request_seconds", "End-to-end request latency", ["endpoint", "method", "status"])
+ENDPOINT_STAGE_SECONDS = metrics.histogram("ai_endpoint_stage_seconds", "Time spent in each request handling stage", ["endpoint", "stage"])
+IN_FLIGHT = metrics.gauge("ai_in_flight", "Blocking model calls running on the inference pool", ["endpoint"])
+WAITING = metrics.gauge("ai_waiting", "Blocking model calls waiting for their endpoint's concurrency limit", ["endpoint"])
+BATCH_QUEUE_DEPTH = metrics.gauge("ai_batch_queue_depth", "Items waiting to be micro-batched", ["model"])
+MODEL_LOADED = metrics.gauge("ai_model_loaded", "Whether a model is loaded", ["model"])
+MODEL_LOAD_SECONDS = metrics.gauge("ai_model_load_seconds", "Duration of the last load of a model", ["model"])
+CACHE_LOOKUPS = metrics.counter("ai_cache_lookups_total", "Result cache lookups", ["result"])
+CACHE_HIT_RATIO = metrics.gauge("ai_cache_hit_ratio", "Fraction of result cache lookups that hit")
+SINGLE_FLIGHT = metrics.counter("ai_single_flight_total", "Requests that computed a result (leader) or shared one (follower)", ["role"])
+CACHE_BYTES = metrics.gauge("ai_cache_bytes", "Size of the result cache", ["tier"])
+JOBS = metrics.gauge("ai_jobs", "Jobs in the job store", ["status"])
+ADMISSION_REJECTED = metrics.counter("ai_admission_rejected_total", "Requests rejected with 429 by admission control", ["endpoint"])
+ADMISSION_COST = metrics.gauge("ai_admission_cost_megapixels", "Megapixels admitted and queued per endpoint", ["endpoint", "state"])
+
+# Route template of the request being handled, used to label stage timings
+current_endpoint = contextvars.ContextVar("current_endpoint", default="unknown")
+
+def route_template(request: Request) -> str:
+    """Path template of the route matching a request (low-cardinality metric label)"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Observe the latency of every request"""
+    endpoint = route_template(request)
+    current_endpoint.set(endpoint)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method, status=status)
+
+def endpoint_stage(name: str):
+    """Time a block as a request handling stage of the current endpoint"""
+    return ENDPOINT_STAGE_SECONDS.time(endpoint=current_endpoint.get(), stage=name)
+
+# Opt-in and sampled profiles of the work a request sends to the inference pool
+profiler = RequestProfiler(
+    directory=config.PROFILE_DIR,
+    on_demand=config.PROFILE_ON_DEMAND,
+    sample_rate=config.PROFILE_SAMPLE_RATE,
+    sample_modes=set(config.PROFILE_SAMPLE_MODES),
+    max_per_minute=config.PROFILE_MAX_PER_MINUTE
+)
+PROFILES = metrics.counter("ai_profiles_total", "Requests profiled", ["trigger"])
+
+def profile_access(token: Optional[str]) -> bool:
+    """Whether an X-Profile-Token value allows capturing and reading profiles (any does unless AI_PROFILE_TOKEN is set)"""
+    return not config.PROFILE_TOKEN or hmac.compare_digest(token or "", config.PROFILE_TOKEN)
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profile a request the client asked to profile (X-Profile header or ?profile=) or that is sampled"""
+    requested = request.headers.get("x-profile") or request.query_params.get("profile")
+    if requested is not None and not profile_access(request.headers.get("x-profile-token")):
+        # Served without a profile rather than rejected
+        requested = None
+    try:
+        # Only model requests are sampled, not health checks and scrapes
+        session = profiler.start(requested, route_template(request), sampling=request.method == "POST")
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if session is None:
+        return await call_next(request)
+    
+    PROFILES.inc(trigger=session.trigger)
+    token = current_profile.set(session)
+    try:
+        response = await call_next(request)
+    finally:
+        current_profile.reset(token)
+    
+    # Written after the body has been sent, so streamed responses are covered too
+    response.background = BackgroundTask(session.finish, response.status_code)
+    response.headers["X-Profile-Id"] = session.id
+    response.headers["X-Profile-Url"] = f"/profiles/{session.id}.json"
+    return response
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Reject overloaded requests with 429 and a Retry-After hint"""
+    ADMISSION_REJECTED.inc(endpoint=exc.endpoint)
+    return JSONResponse(
+        status_code=429,
+        content={"error": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(AdmissionController.retry_after(exc))}
+    )
+
 # Create directories for uploads and results
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("results", exist_ok=True)
 
+# Shared model instances, loaded once per process instead of once per request
+registry = ModelRegistry(idle_timeout=config.MODEL_IDLE_TIMEOUT)
+# Detection and segmentation run on the configured inference backend
+BACKEND_OPTIONS = {
+    "backend": config.INFERENCE_BACKEND,
+    "backend_dir": config.BACKEND_DIR,
+    "min_parity": config.BACKEND_MIN_PARITY,
+}
+# Identity of the models behind a result. Part of every cache key and mask
+# ID, so results of another detector, segmenter or inference backend (e.g.
+# the stub's after a load test) are never served from the persistent cache.
+DETECTION_MODEL = {"detector": config.DETECTOR, "backend": config.INFERENCE_BACKEND}
+SEGMENTATION_MODEL = {
+    "segmenter": config.SEGMENTER,
+    "backend": config.INFERENCE_BACKEND,
+    "resolution": config.SEGMENTATION_MAX_SIZE,
+}
+MODEL_FACTORIES = {
+    "object_detection": functools.partial(create_detector, config.DETECTOR, **BACKEND_OPTIONS),
+    "segmentation": (
+        functools.partial(StubSegmentation, max_size=config.SEGMENTATION_MAX_SIZE)
+        if config.SEGMENTER == "stub"
+        else functools.partial(Segmentation, max_size=config.SEGMENTATION_MAX_SIZE, **BACKEND_OPTIONS)
+    ),
+    "texture_renderer": functools.partial(TextureRenderer, cache_bytes=config.TEXTURE_CACHE_MB * 1024 * 1024),
+    "pattern_extractor": PatternExtractor,
+    "model_applicator": Model3DApplicator,
+}
+for model_name in ENABLED_MODELS:
+    registry.register(model_name, MODEL_FACTORIES[model_name])
+
+# Results keyed by upload content and parameters, so repeated uploads skip inference
+cache = ResultCache(
+    memory_max_bytes=config.CACHE_MEMORY_MB * 1024 * 1024,
+    disk_dir=config.CACHE_DIR,
+    disk_max_bytes=config.CACHE_DISK_MB * 1024 * 1024
+)
+
+# Segmentation masks reusable by ID across endpoints
+masks = MaskStore(config.MASK_DIR)
+
+# Retention and quota enforcement for everything written under uploads/, results/, profiles/ and masks/
+janitor = Janitor(
+    ["uploads", "results", config.PROFILE_DIR, config.MASK_DIR],
+    ttl=config.STORAGE_TTL_HOURS * 3600,
+    max_bytes=config.STORAGE_MAX_MB * 1024 * 1024
+)
+
+# Bounds the megapixels in service per endpoint and rejects bursts early with 429
+admission = AdmissionController(
+    capacity=config.ADMISSION_CAPACITY,
+    default_capacity=config.ADMISSION_CAPACITY_DEFAULT,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    max_wait=config.ADMISSION_MAX_WAIT
+)
+
+# Identical concurrent requests (same cache key) share one computation
+flights = SingleFlight()
+
+# Blocking model calls run here so the event loop keeps serving requests
+executor = InferenceExecutor(
+    kind=config.EXECUTOR_KIND,
+    max_workers=config.EXECUTOR_WORKERS,
+    endpoint_limits=config.ENDPOINT_CONCURRENCY,
+    default_limit=config.ENDPOINT_CONCURRENCY_DEFAULT,
+    call_wrapper=run_profiled
+)
+
+# Model functions run on the executor. They look their model up in the
+# registry so that only plain data crosses into process pool workers.
+def detect_batch(items):
+    """
+    Run batched detection forward passes, one per resolution tier
+    
+    Args:
+        items: List of (image, max_size) tuples
+        
+    Returns:
+        List with the detected objects of each image, in input order
+    """
+    detector = registry.get("object_detection")
+    tiers = {}
+    for index, (_, max_size) in enumerate(items):
+        tiers.setdefault(max_size, []).append(index)
+    
+    results = [None] * len(items)
+    for max_size, indices in tiers.items():
+        for index, objects in zip(indices, detector.detect_batch([items[i][0] for i in indices], max_size)):
+            results[index] = objects
+    return results
+
+# Keyword arguments of ObjectDetection.detect_tiled (other detectors ignore them)
+TILE_OPTIONS = {
+    "tile_size": config.DETECTION_TILE_SIZE,
+    "overlap": config.DETECTION_TILE_OVERLAP,
+    "batch_size": config.DETECTION_TILE_BATCH,
+    "max_side": config.DETECTION_TILE_MAX_SIDE,
+}
+
+def run_detect_tiled(source):
+    """Detect on full-resolution tiles with the shared detector"""
+    return registry.get("object_detection").detect_tiled(source, **TILE_OPTIONS)
+
+def segment_batch(images):
+    """Run batched segmentation forward passes"""
+    return registry.get("segmentation").segment_batch(images)
+
+def run_detect_and_segment(image, margin, image_size):
+    """Detect and segment with the shared detector and segmenter"""
+    return detect_and_segment_fashion_objects(
+        image, detector=registry.get("object_detection"), segmenter=registry.get("segmentation"),
+        margin=margin, image_size=image_size
+    )
+
+def run_render_texture(*args):
+    """Render texture with the shared renderer"""
+    return render_texture(*args, renderer=registry.get("texture_renderer"))
+
+def run_render_texture_mask(packed_mask, *args):
+    """Render texture on a stored mask, unpacked straight to a 0/1 array in the worker"""
+    return render_texture(unpack_mask(packed_mask), *args, renderer=registry.get("texture_renderer"))
+
+def run_apply_design_to_model(*args, **kwargs):
+    """Apply design with the shared 3D model applicator"""
+    return apply_design_to_model(*args, applicator=registry.get("model_applicator"), **kwargs)
+
+def run_extract_pattern(*args):
+    """Extract pattern with the shared pattern extractor"""
+    return extract_pattern(*args, extractor=registry.get("pattern_extractor"))
+
+def mask_id_for(data: bytes) -> str:
+    """ID of the stored segmentation mask of an upload (the same image gives the same ID)"""
+    return make_cache_key("mask", [content_digest(data)], {"segmentation": SEGMENTATION_MODEL})[:32]
+
+def store_mask(mask_id: str, mask: Any):
+    """Pack and store a segmentation mask"""
+    masks.put(mask_id, pack_mask(mask))
+
+def mask_image(image, mask):
+    """Apply a segmentation mask (module-level so it can run in a process pool)"""
+    return imports.load("object_detection.models").Segmentation.mask_image(image, mask)
+
+async def detect_image(image, max_size: Optional[int] = None):
+    """Detect objects in one image, batched with concurrent requests unless the request is profiled"""
+    if current_profile.get() is not None:
+        # Unbatched, so the profile contains only this request's forward pass
+        return (await executor.run("object-detection", detect_batch, [(image, max_size)]))[0]
+    return await detection_batcher.submit((image, max_size))
+
+async def segment_image(image):
+    """Segment one image, batched with concurrent requests unless the request is profiled"""
+    if current_profile.get() is not None:
+        return (await executor.run("segment-object", segment_batch, [image]))[0]
+    return await segmentation_batcher.submit(image)
+
+# Concurrent detection and segmentation requests share forward passes
+detection_batcher = MicroBatcher(
+    detect_batch,
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait=config.BATCH_MAX_WAIT_MS / 1000,
+    num_workers=config.BATCH_WORKERS,
+    runner=functools.partial(executor.run, "object-detection")
+)
+segmentation_batcher = MicroBatcher(
+    segment_batch,
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait=config.BATCH_MAX_WAIT_MS / 1000,
+    num_workers=config.BATCH_WORKERS,
+    runner=functools.partial(executor.run, "segment-object")
+)
+
+@app.on_event("startup")
+async def load_models():
+    """Warm up the configured models and start the idle model reaper"""
+    preload_models()
+    if config.MODEL_IDLE_TIMEOUT:
+        asyncio.create_task(evict_idle_models())
+    if storage_sweeper and (janitor.ttl or janitor.max_bytes):
+        asyncio.create_task(sweep_storage())
+    
+    # Forked after preloading so job workers share the loaded weights
+    start_job_workers()
+    
+    startup_report["ready"] = time.perf_counter() - IMPORT_STARTED
+    print(format_startup_report())
+
+# Pre-forked workers share uploads/ and results/, so only the first one sweeps them
+storage_sweeper = True
+
+def preload_models():
+    """Load the configured models (already loaded models are skipped)"""
+    registry.preload([name for name in config.PRELOAD_MODELS if name in ENABLED_MODELS])
+
+def format_startup_report() -> str:
+    """
+    Format the cold-start timings for the startup log
+    
+    Returns:
+        Multi-line report
+    """
+    lines = [f"Startup: ready in {startup_report['ready']:.2f}s (service import {startup_report['import']:.2f}s)"]
+    for module, seconds in imports.report().items():
+        lines.append(f"  import {module}: {seconds:.2f}s")
+    for name, stats in registry.stats().items():
+        if stats["loaded"]:
+            lines.append(f"  load {name}: {stats['load_time']:.2f}s")
+    return "\n".join(lines)
+
+async def evict_idle_models():
+    """Periodically evict models that have not been used recently"""
+    while True:
+        await asyncio.sleep(config.MODEL_REAPER_INTERVAL)
+        # Eviction runs gc.collect(), which must not block in-flight requests
+        await run_in_threadpool(registry.evict_idle)
+
+async def sweep_storage():
+    """Periodically delete expired results and uploads"""
+    while True:
+        await run_in_threadpool(janitor.sweep)
+        await asyncio.sleep(config.STORAGE_SWEEP_INTERVAL)
+
+@app.on_event("shutdown")
+async def stop_workers():
+    """Stop the micro-batching workers, the inference pool and the job workers"""
+    await detection_batcher.close()
+    await segmentation_batcher.close()
+    executor.shutdown(wait=False)
+    await run_in_threadpool(stop_job_workers)
+
 # Helper functions
-def save_upload_file(upload_file: UploadFile) -> str:
+def save_upload_file(upload_file: UploadFile, data: Optional[bytes] = None) -> str:
     """
     Save an uploaded file to the uploads directory
     
     Args:
         upload_file: File uploaded by user
+        data: Upload content if it has already been read
         
     Returns:
         Path to the saved file
     """
-    file_path = f"uploads/{time.time()}_{upload_file.filename}"
+    file_path = shard_path("uploads", f"{time.time()}_{upload_file.filename}")
     
     with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
+        if data is None:
+            shutil.copyfileobj(upload_file.file, buffer)
+        else:
+            buffer.write(data)
     
     return file_path
 
+async def upload_source(upload_file: UploadFile, data: bytes):
+    """
+    Get the image source handed to the model functions
+    
+    Args:
+        upload_file: File uploaded by user
+        data: Upload content
+        
+    Returns:
+        Path of the saved upload when uploads are persisted, otherwise the raw bytes
+    """
+    if config.PERSIST_UPLOADS:
+        with endpoint_stage("save_upload"):
+            return await run_in_threadpool(save_upload_file, upload_file, data)
+    return data
+
+# Admission cost of an image whose header cannot be read, and the floor for tiny images
+DEFAULT_REQUEST_COST = 1.0
+MIN_REQUEST_COST = 0.1
+
+def request_cost(*uploads: bytes, all_frames: bool = False) -> float:
+    """
+    Estimate the cost of a request from the pixel count of its images
+    
+    Args:
+        *uploads: Encoded image uploads
+        all_frames: Charge every frame of animated uploads (only the first one is processed otherwise)
+        
+    Returns:
+        Cost in megapixels
+    """
+    cost = 0.0
+    for data in uploads:
+        pixels = image_pixels(data, all_frames)
+        cost += max(MIN_REQUEST_COST, pixels / 1e6) if pixels else DEFAULT_REQUEST_COST
+    return cost
+
+def detection_tier(name: Optional[str]) -> Tuple[str, Optional[int]]:
+    """
+    Resolve a detection resolution tier
+    
+    Args:
+        name: Tier asked for by the client (None for the configured default)
+        
+    Returns:
+        Tier name and the longest side detection runs at (None for the model's own limits)
+    
+    Raises:
+        ValueError: If the tier is not configured
+    """
+    name = name or config.DETECTION_TIER
+    if name not in config.DETECTION_TIERS:
+        raise ValueError(f"Unknown tier '{name}' (available: {', '.join(config.DETECTION_TIERS)})")
+    return name, config.DETECTION_TIERS[name] or None
+
+def detection_cache_key(data: bytes, max_size: Optional[int]) -> str:
+    """Cache key of the detections of an upload at a resolution tier"""
+    return make_cache_key("object-detection", [content_digest(data)], {"max_size": max_size, "detection": DETECTION_MODEL})
+
+def decode_for_detection(source: Any, max_size: Optional[int]) -> Tuple[Any, Tuple[int, int]]:
+    """
+    Decode an upload at the detector's input size
+    
+    JPEGs are decoded at reduced scale, so large photos are never decoded
+    at full resolution.
+    
+    Args:
+        source: Saved upload path or raw bytes
+        max_size: Longest side of the resolution tier
+        
+    Returns:
+        RGB PIL image and the original (width, height)
+    """
+    limits = imports.load("object_detection.detectors").detector_class(config.DETECTOR).input_limits(max_size)
+    return load_image_fit(source, *limits)
+
+def rescale_objects(objects: List[Dict[str, Any]], from_size: Tuple[int, int], to_size: Tuple[int, int]) -> List[Dict[str, Any]]:
+    """Map bounding boxes detected on a downscaled image back to original image coordinates"""
+    return imports.load("object_detection.detectors").Detector.rescale_objects(objects, from_size, to_size)
+
+async def decode_upload(source: Any) -> Any:
+    """
+    Decode an upload into an RGB image
+    
+    Args:
+        source: Saved upload path or raw bytes
+        
+    Returns:
+        RGB PIL image
+    """
+    with endpoint_stage("decode"):
+        return await run_in_threadpool(load_image, source)
+
+async def get_cached(key: str) -> Optional[Any]:
+    """
+    Look up a cached result
+    
+    Args:
+        key: Cache key
+        
+    Returns:
+        Cached result, or None on a miss or when caching is disabled
+    """
+    if not cache.enabled:
+        return None
+    with endpoint_stage("cache_lookup"):
+        return await run_in_threadpool(cache.get, key)
+
+def cached_response(entry) -> Response:
+    """
+    Build a response from a cached JSON result
+    
+    Args:
+        entry: Cached result
+        
+    Returns:
+        Response with the cached body
+    """
+    return Response(content=entry.body, media_type=entry.media_type, headers={"X-Cache": "hit"})
+
+async def store_json(key: str, result: Dict[str, Any]):
+    """Cache a JSON result"""
+    if cache.enabled:
+        with endpoint_stage("cache_store"):
+            await run_in_threadpool(cache.put, key, "application/json", json.dumps(result).encode("utf-8"))
+
+def write_result_file(filename: str, data: bytes) -> str:
+    """
+    Write encoded result bytes to the results directory
+    
+    Args:
+        filename: Result filename
+        data: File content
+        
+    Returns:
+        Path to the saved file
+    """
+    path = shard_path("results", filename)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+async def encode_result(
+    endpoint: str,
+    key: str,
+    image: Any,
+    options: ImageOptions,
+    filename_stem: str,
+    save: bool = False
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Encode a result image, caching and optionally saving it
+    
+    Args:
+        endpoint: Endpoint name used for the executor concurrency limit
+        key: Cache key of the result
+        image: PIL image or numpy array
+        options: Negotiated output format, quality and preview size
+        filename_stem: Download filename without extension
+        save: Whether to also write the encoded image to results/
+        
+    Returns:
+        Encoded image and the response headers describing it
+    """
+    with endpoint_stage("encode"):
+        body = await executor.run(endpoint, encode_image, image, options.format, options.quality, options.max_size)
+    
+    if cache.enabled:
+        with endpoint_stage("cache_store"):
+            await run_in_threadpool(cache.put, key, options.media_type, body)
+    
+    headers = {}
+    if save or config.PERSIST_RESULTS:
+        output_filename = f"{filename_stem}_{time.time()}{options.extension}"
+        with endpoint_stage("save_result"):
+            headers["X-Result-Path"] = await run_in_threadpool(write_result_file, output_filename, body)
+    
+    return body, headers
+
+def flight_key(key: str, save: bool) -> str:
+    """Single-flight key of an image result (saved and unsaved results differ in their headers)"""
+    return f"{key}:save" if save or config.PERSIST_RESULTS else key
+
+def filename_stem(upload_file: UploadFile) -> str:
+    """Upload filename without directory and extension"""
+    return os.path.splitext(os.path.basename(upload_file.filename or "image"))[0]
+
+def create_placeholder_design(prompt: str, output_path: str) -> str:
+    """
+    Create a blank placeholder design image
+    
+    Args:
+        prompt: Text prompt written onto the image
+        output_path: Path to save the image
+        
+    Returns:
+        Path to the saved image
+    """
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (512, 512), color=(255, 255, 255))
+    d = ImageDraw.Draw(img)
+    d.text((10, 10), f"AI Generated Design\nPrompt: {prompt}", fill=(0, 0, 0))
+    img.save(output_path)
+    
+    return output_path
+
 @app.get("/")
 def read_root():
     """Root endpoint"""
     return {"message": "Welcome to AI Fashion Collective API"}
 
+@app.get("/models")
+def model_status():
+    """Load state of the shared models"""
+    return registry.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Metrics in the Prometheus text exposition format
+    
+    With pre-fork workers (AI_WORKERS > 1) a scrape is answered by one
+    worker and reports that process only; its samples carry a worker
+    label, so series of different workers are never mixed up.
+    """
+    for endpoint in executor.endpoints():
+        IN_FLIGHT.set(executor.in_flight(endpoint), endpoint=endpoint)
+        WAITING.set(executor.waiting(endpoint), endpoint=endpoint)
+    BATCH_QUEUE_DEPTH.set(detection_batcher.queue_depth(), model="object_detection")
+    BATCH_QUEUE_DEPTH.set(segmentation_batcher.queue_depth(), model="segmentation")
+    for name, stats in registry.stats().items():
+        MODEL_LOADED.set(int(stats["loaded"]), model=name)
+        if stats["load_time"] is not None:
+            MODEL_LOAD_SECONDS.set(stats["load_time"], model=name)
+    cache_stats = cache.stats()
+    CACHE_LOOKUPS.set_total(cache_stats["hits"], result="hit")
+    CACHE_LOOKUPS.set_total(cache_stats["misses"], result="miss")
+    CACHE_HIT_RATIO.set(cache_stats["hit_rate"])
+    SINGLE_FLIGHT.set_total(flights.leaders, role="leader")
+    SINGLE_FLIGHT.set_total(flights.followers, role="follower")
+    CACHE_BYTES.set(cache_stats["memory_bytes"], tier="memory")
+    CACHE_BYTES.set(cache_stats["disk_bytes"], tier="disk")
+    for status, count in job_store.counts().items():
+        JOBS.set(count, status=status)
+    for endpoint, stats in admission.stats().items():
+        ADMISSION_COST.set(stats["active_cost"], endpoint=endpoint, state="active")
+        ADMISSION_COST.set(stats["queued_cost"], endpoint=endpoint, state="queued")
+    
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/startup")
+def startup_status():
+    """Time spent importing modules and loading models before the service became ready"""
+    return {
+        **startup_report,
+        "imports": imports.report(),
+        "models": {name: stats["load_time"] for name, stats in registry.stats().items() if stats["loaded"]},
+        "endpoints": sorted(ENABLED_ENDPOINTS),
+    }
+
+@app.get("/cache")
+def cache_status():
+    """Result cache hit rate and size, requests deduplicated while in flight and the decoded texture cache"""
+    textures = registry.stats().get("texture_renderer", {}).get("cache")
+    return {**cache.stats(), "single_flight": flights.stats(), "textures": textures}
+
+@app.get("/admission")
+def admission_status():
+    """Admitted and queued megapixels, rejections and estimated wait per endpoint"""
+    return admission.stats()
+
+@app.get("/storage")
+def storage_status():
+    """Disk usage of uploads/, results/ and profiles/ and space reclaimed by the janitor"""
+    return janitor.stats()
+
+@app.get("/profiles")
+def list_profiles(limit: int = Query(50), x_profile_token: Optional[str] = Header(None)):
+    """Profiling settings and summaries of the most recent request profiles"""
+    if not profile_access(x_profile_token):
+        return JSONResponse(status_code=403, content={"error": "Invalid or missing X-Profile-Token"})
+    return {**profiler.stats(), "profiles": profiler.recent(limit)}
+
+@app.get("/profiles/{name}")
+def get_profile(name: str, x_profile_token: Optional[str] = Header(None)):
+    """
+    Download a profile file
+    
+    <id>.json is the summary (top functions and torch operators), <id>.prof
+    the cProfile stats (pstats, snakeviz) and <id>.trace<n>.json the torch
+    traces (chrome://tracing, Perfetto).
+    """
+    if not profile_access(x_profile_token):
+        return JSONResponse(status_code=403, content={"error": "Invalid or missing X-Profile-Token"})
+    path = profiler.path(name)
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": f"Profile file '{name}' not found"})
+    media_type = "application/json" if name.endswith(".json") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
 @app.post("/object-detection")
 async def object_detection(
     file: UploadFile = File(...),
+    tier: Optional[str] = Query(None),
+    tiled: bool = Query(False),
 ):
     """
     Detect fashion objects in an image
     
     Args:
         file: Image file to analyze
+        tier: Resolution tier (see AI_DETECTION_TIERS; lower tiers are faster)
+        tiled: Also detect on full-resolution tiles, for small objects in large photos (tier is ignored)
         
     Returns:
-        JSON with detected objects
+        JSON with detected objects (bounding boxes in original image coordinates)
     """
-    # Save uploaded file
-    file_path = save_upload_file(file)
+    try:
+        _, max_size = detection_tier(tier)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    
+    data = await file.read()
+    if tiled:
+        key = make_cache_key("object-detection", [content_digest(data)], {"tiles": TILE_OPTIONS, "detection": DETECTION_MODEL})
+    else:
+        key = detection_cache_key(data, max_size)
+    cached = await get_cached(key)
+    if cached is not None:
+        return cached_response(cached)
+    
+    async def detect():
+        async with admission.admit("object-detection", request_cost(data)):
+            source = await upload_source(file, data)
+            if tiled:
+                # Tiles are decoded at full resolution by the detector itself
+                objects = await executor.run("object-detection", run_detect_tiled, source)
+            else:
+                # Decode straight from the request body, at the size detection runs at
+                with endpoint_stage("decode"):
+                    image, original_size = await run_in_threadpool(decode_for_detection, source, max_size)
+                
+                # Detect objects, batched with concurrent requests
+                objects = rescale_objects(await detect_image(image, max_size), image.size, original_size)
+        
+        result = {
+            'image_path': source_path(source),
+            'objects': objects
+        }
+        await store_json(key, result)
+        return result
+    
+    # Identical concurrent uploads share one detection
+    return await flights.do(key, detect)
+
+async def read_batch_items(files, archive):
+    """
+    Read the images of a batch upload within AI_BATCH_MAX_ITEMS and AI_BATCH_MAX_MB
+    
+    Args:
+        files: Uploaded image files (may be None)
+        archive: Uploaded zip or tar archive of images (may be None)
+        
+    Returns:
+        List of (name, bytes) tuples, files first, then archive members by name
+        
+    Raises:
+        ArchiveTooLarge: If the upload exceeds a limit
+        ValueError: If the archive cannot be read
+    """
+    max_bytes = config.BATCH_MAX_MB * 1024 * 1024
+    items = []
+    for file in files or []:
+        items.append((file.filename, await file.read()))
+        if len(items) > config.BATCH_MAX_ITEMS:
+            raise ArchiveTooLarge(f"More than {config.BATCH_MAX_ITEMS} images")
+    size = sum(len(data) for _, data in items)
+    if size > max_bytes:
+        raise ArchiveTooLarge(f"Images exceed {config.BATCH_MAX_MB} MB")
+    
+    if archive is not None:
+        # The archive gets what the plain files left of both limits
+        items += await run_in_threadpool(
+            read_archive,
+            await archive.read(),
+            max_items=config.BATCH_MAX_ITEMS - len(items),
+            max_bytes=max_bytes - size
+        )
+    return items
+
+@app.post("/object-detection/batch")
+async def object_detection_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    tier: Optional[str] = Query(None),
+):
+    """
+    Detect fashion objects in many images
+    
+    Args:
+        files: Image files to analyze
+        archive: Zip or tar archive of image files to analyze
+        tier: Resolution tier (see AI_DETECTION_TIERS; lower tiers are faster)
+        
+    Returns:
+        NDJSON stream with one line per image, in completion order
+    """
+    try:
+        _, max_size = detection_tier(tier)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    
+    try:
+        items = await read_batch_items(files, archive)
+    except ArchiveTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    
+    if not items:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "No images provided"}
+        )
     
-    # Detect objects
-    result = detect_fashion_objects(file_path)
+    # The whole batch is admitted up front so overload is reported before streaming starts
+    ticket = await admission.acquire("object-detection", request_cost(*[data for _, data in items]))
+    return StreamingResponse(
+        stream_batch_detections(items, max_size, ticket),
+        media_type="application/x-ndjson",
+        # Also releases the budget if the stream is never consumed
+        background=BackgroundTask(ticket.release)
+    )
+
+@app.post("/object-detection/sequence")
+async def object_detection_sequence(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    tier: Optional[str] = Query(None),
+    keyframe_interval: Optional[int] = Query(None),
+):
+    """
+    Detect and track fashion objects across the frames of a clip
+    
+    The detector only runs on keyframes; boxes are propagated to the frames
+    in between by template matching and keep their track_id.
+    
+    Args:
+        files: Frames in order, or an animated GIF/WebP/PNG
+        archive: Zip or tar archive of frames (ordered by file name)
+        tier: Resolution tier of the keyframe detections (see AI_DETECTION_TIERS)
+        keyframe_interval: Maximum frames between detector runs (see AI_SEQUENCE_KEYFRAME_INTERVAL)
+        
+    Returns:
+        NDJSON stream with one line per frame, in frame order
+    """
+    try:
+        _, max_size = detection_tier(tier)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    
+    interval = config.SEQUENCE_KEYFRAME_INTERVAL if keyframe_interval is None else keyframe_interval
+    if interval < 1:
+        return JSONResponse(status_code=400, content={"error": "keyframe_interval must be at least 1"})
+    
+    try:
+        items = await read_batch_items(files, archive)
+    except ArchiveTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     
-    return result
+    if not items:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "No frames provided"}
+        )
+    
+    # Frame counts and sizes come from the headers; frames are only decoded while streaming
+    uploads = [data for _, data in items]
+    frames = sum([await run_in_threadpool(frame_count, data) for data in uploads])
+    if frames > config.BATCH_MAX_ITEMS:
+        return JSONResponse(status_code=413, content={"error": f"More than {config.BATCH_MAX_ITEMS} frames"})
+    
+    # Admitted before anything is decoded, at the pixels of every frame
+    cost = await run_in_threadpool(functools.partial(request_cost, *uploads, all_frames=True))
+    ticket = await admission.acquire("object-detection", cost)
+    return StreamingResponse(
+        stream_sequence_detections(expand_frames(items), max_size, interval, ticket),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(ticket.release)
+    )
+
+def expand_frames(items):
+    """
+    Split animated images into their frames, lazily
+    
+    Args:
+        items: List of (name, bytes) tuples
+        
+    Yields:
+        (name, bytes) for still images, (name#frame, PIL image) for the frames
+        of animated ones, and (name#frame, exception) for a frame that cannot
+        be decoded (the rest of that animation is skipped)
+    """
+    for name, data in items:
+        if frame_count(data) < 2:
+            yield name, data
+            continue
+        n = 0
+        try:
+            for n, frame in enumerate(animated_frames(data)):
+                yield f"{name}#{n}", frame
+        except Exception as e:
+            yield f"{name}#{n}", e
+
+def next_frame(frames: Any, max_size: Optional[int]) -> Optional[Tuple[str, Any]]:
+    """
+    Take and decode the next frame of expand_frames
+    
+    Args:
+        frames: Iterator from expand_frames
+        max_size: Longest side of the resolution tier
+        
+    Returns:
+        (name, (image, original size) or the decoding exception), or None after the last frame
+    """
+    item = next(frames, None)
+    if item is None:
+        return None
+    name, source = item
+    if isinstance(source, Exception):
+        return name, source
+    try:
+        return name, decode_for_detection(source, max_size)
+    except Exception as e:
+        return name, e
+
+async def stream_sequence_detections(frames, max_size, interval, ticket):
+    """
+    Detect and track objects frame by frame and yield one NDJSON line per frame
+    
+    Frames are decoded one at a time, the next one while the current one
+    is tracked or detected. Keyframe detections go through the detection
+    batcher, so they share forward passes with concurrent requests.
+    
+    Args:
+        frames: Iterator of frames in order (see expand_frames)
+        max_size: Longest side of the resolution tier
+        interval: Maximum frames between detector runs
+        ticket: Admission ticket of the clip, released when the stream ends
+    """
+    tracker = ObjectTracker(
+        keyframe_interval=interval,
+        scene_threshold=config.SEQUENCE_SCENE_THRESHOLD,
+        min_similarity=config.SEQUENCE_MIN_SIMILARITY
+    )
+    
+    def fetch():
+        return asyncio.ensure_future(run_in_threadpool(next_frame, frames, max_size))
+    
+    try:
+        fetching = fetch()
+        for index in itertools.count():
+            with endpoint_stage("decode"):
+                fetched = await fetching
+            if fetched is None:
+                break
+            name, decoded = fetched
+            if isinstance(decoded, Exception):
+                image = None
+                error = f"Could not decode image: {decoded}"
+            else:
+                image, original_size = decoded
+            fetching = fetch()
+            
+            if image is not None:
+                try:
+                    frame = await run_in_threadpool(tracker.prepare, image)
+                    objects = None if tracker.needs_detection(frame) else await run_in_threadpool(tracker.propagate, frame)
+                    keyframe = objects is None
+                    if keyframe:
+                        objects = tracker.update(frame, await detect_image(image, max_size))
+                except Exception as e:
+                    image = None
+                    error = f"Detection failed: {e}"
+            
+            if image is None:
+                line = {"frame": index, "filename": name, "error": error}
+            else:
+                line = {
+                    "frame": index,
+                    "filename": name,
+                    "keyframe": keyframe,
+                    "objects": rescale_objects(objects, image.size, original_size)
+                }
+            yield json.dumps(line) + "\n"
+    finally:
+        ticket.release()
+
+async def decode_images(items, max_size):
+    """Decode (name, bytes) items in parallel, returning (image, original size) or the exception for each"""
+    with endpoint_stage("decode"):
+        return await asyncio.gather(
+            *[run_in_threadpool(decode_for_detection, data, max_size) for _, data in items],
+            return_exceptions=True
+        )
+
+async def stream_batch_detections(items, max_size, ticket):
+    """
+    Run detection over many images and yield one NDJSON line per image
+    
+    Cached results are emitted first. The remaining images are decoded in
+    parallel one chunk ahead of inference and detected in batches of
+    AI_BATCH_MAX_SIZE.
+    
+    Args:
+        items: List of (filename, bytes) tuples
+        max_size: Longest side of the resolution tier
+        ticket: Admission ticket of the batch, released when the stream ends
+    """
+    try:
+        async for line in detect_batch_items(items, max_size):
+            yield line
+    finally:
+        ticket.release()
+
+async def detect_batch_items(items, max_size):
+    """Yield the NDJSON lines of stream_batch_detections"""
+    pending = []
+    for index, (name, data) in enumerate(items):
+        key = detection_cache_key(data, max_size)
+        cached = await get_cached(key)
+        if cached is not None:
+            objects = json.loads(cached.body)["objects"]
+            yield json.dumps({"index": index, "filename": name, "objects": objects, "cached": True}) + "\n"
+        else:
+            pending.append((index, name, data, key))
+    
+    chunk_size = config.BATCH_MAX_SIZE
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    decoding = asyncio.ensure_future(decode_images([(name, data) for _, name, data, _ in chunks[0]], max_size)) if chunks else None
+    
+    for n, chunk in enumerate(chunks):
+        images = await decoding
+        
+        # Decode the next chunk while this one runs through the detector
+        if n + 1 < len(chunks):
+            decoding = asyncio.ensure_future(decode_images([(name, data) for _, name, data, _ in chunks[n + 1]], max_size))
+        
+        decoded = [i for i, image in enumerate(images) if not isinstance(image, Exception)]
+        detections = {}
+        error = None
+        if decoded:
+            try:
+                objects = await executor.run("object-detection", detect_batch, [(images[i][0], max_size) for i in decoded])
+                detections = {
+                    i: rescale_objects(found, images[i][0].size, images[i][1])
+                    for i, found in zip(decoded, objects)
+                }
+            except Exception as e:
+                error = f"Detection failed: {e}"
+        
+        for i, (index, name, _, key) in enumerate(chunk):
+            if i in detections:
+                await store_json(key, {'image_path': None, 'objects': detections[i]})
+                line = {"index": index, "filename": name, "objects": detections[i]}
+            elif isinstance(images[i], Exception):
+                line = {"index": index, "filename": name, "error": f"Could not decode image: {images[i]}"}
+            else:
+                line = {"index": index, "filename": name, "error": error}
+            yield json.dumps(line) + "\n"
+
+@app.post("/detect-and-segment")
+async def detect_and_segment(
+    file: UploadFile = File(...),
+    margin: float = Query(0.1),
+):
+    """
+    Detect fashion objects and segment each one in a single pass
+    
+    The upload is decoded at the detection resolution and converted to a
+    tensor once. Segmentation only runs on the detected bounding boxes, and
+    boxes and masks are scaled back to the original image size.
+    
+    Args:
+        file: Image file to analyze
+        margin: Context added around each box before segmenting, as a fraction of the box size
+        
+    Returns:
+        JSON with the image size and the detected objects, each with a
+        run-length encoded mask of its box region
+    """
+    if not 0 <= margin <= 1:
+        return JSONResponse(status_code=400, content={"error": "margin must be between 0 and 1"})
+    
+    data = await file.read()
+    key = make_cache_key(
+        "detect-and-segment", [content_digest(data)],
+        {"margin": margin, "detection": DETECTION_MODEL, "segmentation": SEGMENTATION_MODEL}
+    )
+    cached = await get_cached(key)
+    if cached is not None:
+        return cached_response(cached)
+    
+    async def detect_and_segment_objects():
+        async with admission.admit("detect-and-segment", request_cost(data)):
+            # Decode straight from the request body, at the size detection runs at
+            source = await upload_source(file, data)
+            with endpoint_stage("decode"):
+                image, original_size = await run_in_threadpool(decode_for_detection, source, None)
+            
+            result = await executor.run("detect-and-segment", run_detect_and_segment, image, margin, original_size)
+        
+        result['image_path'] = source_path(source)
+        await store_json(key, result)
+        return result
+    
+    # Identical concurrent uploads share one pass
+    return await flights.do(key, detect_and_segment_objects)
 
 @app.post("/segment-object")
 async def segment_object(
     file: UploadFile = File(...),
+    output_format: Optional[str] = Query(None, alias="format"),
+    quality: Optional[int] = Query(None),
+    max_size: Optional[int] = Query(None),
+    save: bool = Query(False),
+    accept: Optional[str] = Header(None),
 ):
     """
     Segment fashion object from image
     
     Args:
         file: Image file to segment
+        output_format: Output image format (png, jpeg or webp; negotiated from Accept if omitted)
+        quality: Lossy output quality (1-100)
+        max_size: Maximum width/height of a downscaled preview
+        save: Whether to also keep the result under results/
         
     Returns:
-        JSON with paths to input and output images
+        Segmented image with a transparent background (black in JPEG); the
+        X-Mask-Id header references the stored mask (see /render-texture)
     """
-    # Save uploaded file
-    file_path = save_upload_file(file)
+    try:
+        options = parse_image_options(output_format, quality, max_size, accept)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     
-    # Create output path
-    output_filename = f"segmented_{time.time()}_{file.filename}"
-    output_path = f"results/{output_filename}"
+    stem = f"segmented_{filename_stem(file)}"
+    data = await file.read()
+    key = make_cache_key(
+        "segment-object", [content_digest(data)],
+        {**options.cache_params(), "segmentation": SEGMENTATION_MODEL}
+    )
+    mask_id = mask_id_for(data)
+    cached = await get_cached(key)
+    if cached is not None:
+        headers = {"X-Cache": "hit"}
+        if await run_in_threadpool(masks.exists, mask_id):
+            headers["X-Mask-Id"] = mask_id
+        return image_response(cached.body, options, stem, headers)
     
-    # Segment object
-    result = segment_fashion_object(file_path, output_path)
+    async def segment():
+        async with admission.admit("segment-object", request_cost(data)):
+            # Decode straight from the request body
+            source = await upload_source(file, data)
+            image = await decode_upload(source)
+            
+            # Segment object, batched with concurrent requests
+            mask = await segment_image(image)
+            masked_image = await executor.run("segment-object", mask_image, image, mask)
+            
+            with endpoint_stage("store_mask"):
+                await run_in_threadpool(store_mask, mask_id, mask)
+            body, headers = await encode_result("segment-object", key, masked_image, options, stem, save)
+            return body, {**headers, "X-Mask-Id": mask_id}
     
-    # Return file response
-    return FileResponse(
-        path=result["output_image"],
-        media_type="image/png",
-        filename=output_filename
-    )
+    body, headers = await flights.do(flight_key(key, save), segment)
+    return image_response(body, options, stem, headers)
 
 @app.post("/render-texture")
 async def texture_rendering(
-    object_file: UploadFile = File(...),
+    object_file: Optional[UploadFile] = File(None),
     texture_file: UploadFile = File(...),
+    mask_id: Optional[str] = Form(None),
     texture_type: str = Form("simple"),
     texture_params: Optional[str] = Form(None),
+    output_format: Optional[str] = Query(None, alias="format"),
+    quality: Optional[int] = Query(None),
+    max_size: Optional[int] = Query(None),
+    save: bool = Query(False),
+    accept: Optional[str] = Header(None),
 ):
     """
     Render texture on an object
@@ -121,15 +1250,21 @@ async def texture_rendering(
     Args:
         object_file: Image file with object mask
         texture_file: Image file with texture
+        mask_id: Stored mask to use instead of object_file (X-Mask-Id of /segment-object)
         texture_type: Type of texture application
         texture_params: Additional parameters for texture application
+        output_format: Output image format (png, jpeg or webp; negotiated from Accept if omitted)
+        quality: Lossy output quality (1-100)
+        max_size: Maximum width/height of a downscaled preview
+        save: Whether to also keep the result under results/
         
     Returns:
-        JSON with paths to input and output images
+        Textured image
     """
-    # Save uploaded files
-    object_path = save_upload_file(object_file)
-    texture_path = save_upload_file(texture_file)
+    try:
+        options = parse_image_options(output_format, quality, max_size, accept)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     
     # Parse texture parameters
     params = None
@@ -142,19 +1277,60 @@ async def texture_rendering(
                 content={"error": "Invalid texture parameters"}
             )
     
-    # Create output path
-    output_filename = f"textured_{time.time()}_{object_file.filename}"
-    output_path = f"results/{output_filename}"
+    if (object_file is None) == (mask_id is None):
+        return JSONResponse(status_code=400, content={"error": "Provide either object_file or mask_id"})
     
-    # Render texture
-    result = render_texture(object_path, texture_path, output_path, texture_type, params)
+    packed_mask = None
+    if mask_id is not None:
+        packed_mask = await run_in_threadpool(masks.get, mask_id)
+        if packed_mask is None:
+            return JSONResponse(status_code=404, content={"error": f"Mask '{mask_id}' not found"})
+        height, width = packed_mask_size(packed_mask)
+        object_data = b""
+        object_digest = f"mask:{mask_id}"
+        stem = f"textured_{mask_id}"
+    else:
+        object_data = await object_file.read()
+        object_digest = content_digest(object_data)
+        stem = f"textured_{filename_stem(object_file)}"
     
-    # Return file response
-    return FileResponse(
-        path=result["output_image"],
-        media_type="image/png",
-        filename=output_filename
+    texture_data = await texture_file.read()
+    key = make_cache_key(
+        "render-texture",
+        [object_digest, content_digest(texture_data)],
+        {"texture_type": texture_type, "texture_params": params, **options.cache_params()}
     )
+    cached = await get_cached(key)
+    if cached is not None:
+        return image_response(cached.body, options, stem, {"X-Cache": "hit"})
+    
+    if packed_mask is not None:
+        cost = request_cost(texture_data) + max(MIN_REQUEST_COST, height * width / 1e6)
+    else:
+        cost = request_cost(object_data, texture_data)
+    
+    async def render():
+        async with admission.admit("render-texture", cost):
+            texture_source = await upload_source(texture_file, texture_data)
+            
+            # Render texture in memory
+            if packed_mask is not None:
+                # The packed mask is small to hand to a worker and skips the PNG decode
+                result = await executor.run(
+                    "render-texture", run_render_texture_mask,
+                    packed_mask, texture_source, None, texture_type, params
+                )
+            else:
+                object_source = await upload_source(object_file, object_data)
+                result = await executor.run(
+                    "render-texture", run_render_texture,
+                    object_source, texture_source, None, texture_type, params
+                )
+            
+            return await encode_result("render-texture", key, result["image"], options, stem, save)
+    
+    body, headers = await flights.do(flight_key(key, save), render)
+    return image_response(body, options, stem, headers)
 
 @app.post("/apply-to-model")
 async def model_application(
@@ -175,9 +1351,6 @@ async def model_application(
     Returns:
         JSON with paths to rendered views
     """
-    # Save uploaded file
-    design_path = save_upload_file(design_file)
-    
     # Parse parameters
     pose = None
     if pose_params:
@@ -199,19 +1372,48 @@ async def model_application(
                 content={"error": "Invalid shape parameters"}
             )
     
-    # Create output directory
-    output_dir = f"results/model_{time.time()}"
-    os.makedirs(output_dir, exist_ok=True)
+    data = await design_file.read()
+    key = make_cache_key(
+        "apply-to-model",
+        [content_digest(data)],
+        {"model_type": model_type, "pose_params": pose, "shape_params": shape}
+    )
+    cached = await get_cached(key)
+    if cached is not None:
+        result = json.loads(cached.body)
+        # Rendered views are files, so the entry is only valid while they exist
+        if all(os.path.exists(path) for path in result["views"].values()):
+            return cached_response(cached)
     
-    # Apply to model
-    result = apply_design_to_model(design_path, output_dir, model_type, pose, shape)
+    async def apply():
+        async with admission.admit("apply-to-model", request_cost(data)):
+            design_source = await upload_source(design_file, data)
+            
+            # Create output directory
+            output_dir = shard_path("results", f"model_{time.time()}")
+            os.makedirs(output_dir, exist_ok=True)
+            
+            # Apply to model
+            result = await executor.run(
+                "apply-to-model", run_apply_design_to_model,
+                design_source, output_dir, model_type, pose, shape,
+                base_filename=os.path.splitext(os.path.basename(design_file.filename or "design"))[0]
+            )
+        await store_json(key, result)
+        return result
     
-    return result
+    # Identical concurrent uploads share one set of rendered views
+    return await flights.do(key, apply)
 
 @app.post("/extract-pattern")
 async def pattern_extraction(
     design_file: UploadFile = File(...),
     num_pieces: int = Form(4),
+    output_format: Optional[str] = Query(None, alias="format"),
+    quality: Optional[int] = Query(None),
+    max_size: Optional[int] = Query(None),
+    save: bool = Query(False),
+    accept: Optional[str] = Header(None),
 ):
     """
     Extract clothing pattern from design
@@ -219,26 +1421,39 @@ async def pattern_extraction(
     Args:
         design_file: Image file with design
         num_pieces: Number of pattern pieces to generate
+        output_format: Output image format (png, jpeg or webp; negotiated from Accept if omitted)
+        quality: Lossy output quality (1-100)
+        max_size: Maximum width/height of a downscaled preview
+        save: Whether to also keep the result under results/
         
     Returns:
-        JSON with pattern extraction results
+        Pattern visualization image
     """
-    # Save uploaded file
-    design_path = save_upload_file(design_file)
+    try:
+        options = parse_image_options(output_format, quality, max_size, accept)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     
-    # Create output path
-    output_filename = f"pattern_{time.time()}_{design_file.filename}.png"
-    output_path = f"results/{output_filename}"
+    stem = f"pattern_{filename_stem(design_file)}"
+    data = await design_file.read()
+    key = make_cache_key(
+        "extract-pattern", [content_digest(data)], {"num_pieces": num_pieces, **options.cache_params()}
+    )
+    cached = await get_cached(key)
+    if cached is not None:
+        return image_response(cached.body, options, stem, {"X-Cache": "hit"})
     
-    # Extract pattern
-    result = extract_pattern(design_path, output_path, num_pieces)
+    async def extract():
+        async with admission.admit("extract-pattern", request_cost(data)):
+            design_source = await upload_source(design_file, data)
+            
+            # Extract pattern, rendering the visualization in memory
+            result = await executor.run("extract-pattern", run_extract_pattern, design_source, None, num_pieces)
+            
+            return await encode_result("extract-pattern", key, result["image"], options, stem, save)
     
-    # Return visualization
-    return FileResponse(
-        path=result["visualization"],
-        media_type="image/png",
-        filename=output_filename
-    )
+    body, headers = await flights.do(flight_key(key, save), extract)
+    return image_response(body, options, stem, headers)
 
 @app.post("/generate")
 async def ai_design_generation(
@@ -260,7 +1475,7 @@ async def ai_design_generation(
     # Save base design if provided
     base_design_path = None
     if base_design_file:
-        base_design_path = save_upload_file(base_design_file)
+        base_design_path = await run_in_threadpool(save_upload_file, base_design_file)
     
     # Parse parameters
     params = {}
@@ -278,18 +1493,13 @@ async def ai_design_generation(
     
     # Create a dummy response
     output_filename = f"generated_{time.time()}.png"
-    output_path = f"results/{output_filename}"
+    output_path = shard_path("results", output_filename)
     
     # Just copy the base design as a placeholder
     if base_design_path:
-        shutil.copy(base_design_path, output_path)
+        await run_in_threadpool(shutil.copy, base_design_path, output_path)
     else:
-        # Create a dummy blank image
-        from PIL import Image, ImageDraw
-        img = Image.new('RGB', (512, 512), color=(255, 255, 255))
-        d = ImageDraw.Draw(img)
-        d.text((10, 10), f"AI Generated Design\nPrompt: {prompt}", fill=(0, 0, 0))
-        img.save(output_path)
+        await run_in_threadpool(create_placeholder_design, prompt, output_path)
     
     return {
         "prompt": prompt,
@@ -319,7 +1529,7 @@ async def process_evaluations(
         JSON with improved design
     """
     # Save uploaded file
-    design_path = save_upload_file(design_file)
+    design_path = await run_in_threadpool(save_upload_file, design_file)
     
     # Parse evaluations
     try:
@@ -330,12 +1540,25 @@ async def process_evaluations(
             content={"error": "Invalid evaluations data"}
         )
     
+    return await run_in_threadpool(improve_design, design_path, eval_data)
+
+def improve_design(design_path: str, eval_data: List[Any]) -> Dict[str, Any]:
+    """
+    Generate an improved design from evaluations
+    
+    Args:
+        design_path: Path to the original design
+        eval_data: Evaluation data
+        
+    Returns:
+        Dictionary with the improved design
+    """
     # Simulate processing evaluations
     # In a real implementation, this would use the evaluations to guide a generative model
     
     # Create a dummy response
     output_filename = f"improved_{time.time()}.png"
-    output_path = f"results/{output_filename}"
+    output_path = shard_path("results", output_filename)
     
     # Just copy the original design as a placeholder
     shutil.copy(design_path, output_path)
@@ -351,6 +1574,288 @@ async def process_evaluations(
         }
     }
 
+# Asynchronous jobs
+#
+# Long-running operations can be submitted as jobs instead of being run
+# inside the request. Jobs are persisted in a local SQLite store and run
+# by worker processes forked on startup, which share the parent's
+# already loaded models.
+
+def apply_to_model_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler for /jobs/apply-to-model"""
+    output_dir = shard_path("results", f"model_{payload['job_id']}")
+    os.makedirs(output_dir, exist_ok=True)
+    return run_apply_design_to_model(
+        payload["design_path"], output_dir, payload["model_type"],
+        payload["pose_params"], payload["shape_params"],
+        base_filename=payload["base_filename"]
+    )
+
+def extract_pattern_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler for /jobs/extract-pattern"""
+    output_path = shard_path("results", f"pattern_{payload['base_filename']}_{payload['job_id']}.png")
+    return run_extract_pattern(payload["design_path"], output_path, payload["num_pieces"])
+
+def process_evaluations_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler for /jobs/process-evaluations"""
+    return improve_design(payload["design_path"], payload["evaluations"])
+
+JOB_HANDLERS = {
+    kind: handler
+    for kind, handler in [
+        ("apply-to-model", apply_to_model_job),
+        ("extract-pattern", extract_pattern_job),
+        ("process-evaluations", process_evaluations_job),
+    ]
+    if kind in ENABLED_ENDPOINTS
+}
+
+job_store = JobStore(config.JOB_DB)
+job_workers = []
+job_workers_owner = None
+
+def start_job_workers():
+    """Fork the job worker processes (once; pre-forked HTTP workers inherit the parent's)"""
+    global job_workers_owner
+    if job_workers:
+        return
+    job_workers_owner = os.getpid()
+    context = multiprocessing.get_context("fork")
+    for _ in range(config.JOB_WORKERS):
+        process = context.Process(
+            target=run_worker_process,
+            args=(config.JOB_DB, JOB_HANDLERS),
+            kwargs={"stale_timeout": config.JOB_TIMEOUT},
+            daemon=True
+        )
+        process.start()
+        job_workers.append(process)
+
+def stop_job_workers():
+    """Ask the job workers to finish their current job and exit"""
+    if job_workers_owner != os.getpid():
+        # Started by the pre-fork parent, which stops them itself
+        return
+    for process in job_workers:
+        process.terminate()
+    for process in job_workers:
+        process.join(timeout=config.JOB_SHUTDOWN_TIMEOUT)
+        if process.is_alive():
+            process.kill()
+    job_workers.clear()
+
+async def submit_job(kind: str, upload_file: UploadFile, payload: Dict[str, Any], priority: int) -> JSONResponse:
+    """
+    Persist the upload and queue a job
+    
+    Args:
+        kind: Job kind
+        upload_file: Uploaded design file
+        payload: Job parameters
+        priority: Job priority (higher runs first)
+        
+    Returns:
+        202 response with the job ID
+    """
+    # Workers run in other processes, so the input must be on disk
+    design_path = await run_in_threadpool(save_upload_file, upload_file)
+    job_id = await run_in_threadpool(
+        job_store.submit, kind, dict(payload, design_path=design_path),
+        priority, config.JOB_MAX_ATTEMPTS
+    )
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+def parse_json_field(value: Optional[str]) -> Any:
+    """Parse an optional JSON form field (raises ValueError when invalid)"""
+    return json.loads(value) if value else None
+
+@app.post("/jobs/apply-to-model")
+async def submit_model_application(
+    design_file: UploadFile = File(...),
+    model_type: str = Form("smpl"),
+    pose_params: Optional[str] = Form(None),
+    shape_params: Optional[str] = Form(None),
+    priority: int = Form(0),
+):
+    """
+    Submit an /apply-to-model job
+    
+    Args:
+        design_file: Image file with design
+        model_type: Type of 3D model
+        pose_params: Parameters for posing the model
+        shape_params: Parameters for model shape
+        priority: Job priority (higher runs first)
+        
+    Returns:
+        JSON with the job ID
+    """
+    try:
+        pose = parse_json_field(pose_params)
+        shape = parse_json_field(shape_params)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid pose or shape parameters"}
+        )
+    
+    return await submit_job("apply-to-model", design_file, {
+        "model_type": model_type,
+        "pose_params": pose,
+        "shape_params": shape,
+        "base_filename": filename_stem(design_file),
+    }, priority)
+
+@app.post("/jobs/extract-pattern")
+async def submit_pattern_extraction(
+    design_file: UploadFile = File(...),
+    num_pieces: int = Form(4),
+    priority: int = Form(0),
+):
+    """
+    Submit an /extract-pattern job
+    
+    Args:
+        design_file: Image file with design
+        num_pieces: Number of pattern pieces to generate
+        priority: Job priority (higher runs first)
+        
+    Returns:
+        JSON with the job ID
+    """
+    return await submit_job("extract-pattern", design_file, {
+        "num_pieces": num_pieces,
+        "base_filename": filename_stem(design_file),
+    }, priority)
+
+@app.post("/jobs/process-evaluations")
+async def submit_evaluation_processing(
+    design_file: UploadFile = File(...),
+    evaluations: str = Form(...),
+    priority: int = Form(0),
+):
+    """
+    Submit a /process-evaluations job
+    
+    Args:
+        design_file: Image file with original design
+        evaluations: JSON string with evaluation data
+        priority: Job priority (higher runs first)
+        
+    Returns:
+        JSON with the job ID
+    """
+    try:
+        eval_data = json.loads(evaluations)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid evaluations data"}
+        )
+    
+    return await submit_job("process-evaluations", design_file, {"evaluations": eval_data}, priority)
+
+@app.get("/jobs")
+async def job_counts():
+    """Number of jobs in each status"""
+    return await run_in_threadpool(job_store.counts)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    Poll a job
+    
+    Args:
+        job_id: Job ID
+        
+    Returns:
+        JSON with the job status, and its result once it has succeeded
+    """
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    
+    job.pop("payload")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """
+    Fetch the result of a finished job
+    
+    Args:
+        job_id: Job ID
+        
+    Returns:
+        JSON result of the job
+    """
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    if job["status"] != SUCCEEDED:
+        return JSONResponse(
+            status_code=409,
+            content={"error": f"Job is {job['status']}", "status": job["status"]}
+        )
+    
+    return job["result"]
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a job
+    
+    Args:
+        job_id: Job ID
+        
+    Returns:
+        JSON with the job status after cancellation
+    """
+    status = await run_in_threadpool(job_store.cancel, job_id)
+    if status is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    
+    return {"job_id": job_id, "status": status}
+
+def before_fork():
+    """Pre-fork parent: load models and start job workers once, for all HTTP workers to share"""
+    preload_models()
+    start_job_workers()
+
+def after_fork(index: int):
+    """
+    Pre-fork worker: take this worker's share of the cores and of the service-wide budgets
+    
+    The admission capacity, the result cache budgets and the inference
+    pool size are configured for the whole service, so each of the
+    workers gets its fraction of them. Metrics stay per process and are
+    labelled with the worker index.
+    """
+    global storage_sweeper
+    storage_sweeper = index == 0
+    torch = imports.load("torch")
+    torch.set_num_threads(intra_op_threads(config.WORKERS, config.TORCH_THREADS))
+    
+    share = 1 / config.WORKERS
+    admission.scale(share)
+    cache.resize(
+        int(config.CACHE_MEMORY_MB * 1024 * 1024 * share),
+        int(config.CACHE_DISK_MB * 1024 * 1024 * share)
+    )
+    executor.resize(max(1, executor.max_workers // config.WORKERS))
+    metrics.set_constant_labels(worker=index)
+
 # Run the API server
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if config.WORKERS > 1:
+        PreforkServer(
+            app,
+            host="0.0.0.0",
+            port=8000,
+            workers=config.WORKERS,
+            before_fork=before_fork,
+            after_fork=after_fork,
+            on_shutdown=stop_job_workers
+        ).run()
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
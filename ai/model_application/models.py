@@ -5,6 +5,9 @@ import torch.nn.functional as F
 import torchvision.transforms as transforms
 from torch.utils.model_zoo import load_url as load_state_dict_from_url
 
+from common.image_io import load_image, source_path
+from common.metrics import timed_stage
+
 # URLs for pretrained model weights
 MODEL_URLS = {
     'smpl': 'https://github.com/gulvarol/smplpytorch/raw/master/smplpytorch/native/models/basicModel_neutral_lbs_10_207_0_v1.0.0.pkl',
@@ -40,22 +43,24 @@ class Model3DApplicator:
         
         print(f"Initialized 3D model of type {model_type}")
     
+    @timed_stage('model_applicator', 'preprocess')
     def load_texture(self, texture_path):
         """
         Load texture for 3D model
         
         Args:
-            texture_path: Path to texture image
+            texture_path: Texture image (path, encoded bytes, PIL image or numpy array)
         
         Returns:
             Tensor representation of texture
         """
         # Load texture image
-        texture = Image.open(texture_path).convert('RGB')
+        texture = load_image(texture_path)
         texture_tensor = self.transform(texture).to(self.device)
         
         return texture_tensor
     
+    @timed_stage('model_applicator', 'render')
     def apply_to_model(self, texture_tensor, pose_params=None, shape_params=None):
         """
         Apply texture to 3D model with given pose
@@ -121,6 +126,7 @@ class Model3DApplicator:
         
         return views
     
+    @timed_stage('model_applicator', 'save')
     def save_rendered_views(self, views, output_dir, base_filename):
         """
         Save rendered views of the model
@@ -152,22 +158,24 @@ class Model3DApplicator:
         return output_paths
 
 # Main model application function to be used by the API
-def apply_design_to_model(design_image_path, output_dir, model_type='smpl', pose_params=None, shape_params=None):
+def apply_design_to_model(design_image_path, output_dir, model_type='smpl', pose_params=None, shape_params=None, applicator=None, base_filename=None):
     """
     Apply design to 3D model
     
     Args:
-        design_image_path: Path to the design image (texture)
+        design_image_path: Design image (texture) as path, encoded bytes, PIL image or numpy array
         output_dir: Directory to save the rendered views
         model_type: Type of 3D model
         pose_params: Parameters for posing the model
         shape_params: Parameters for model shape
+        applicator: Shared Model3DApplicator instance (a new one is created if None)
+        base_filename: Base filename for the rendered views (derived from the design path if None)
         
     Returns:
         Dictionary with paths to rendered views
     """
     # Initialize model applicator
-    model_applicator = Model3DApplicator()
+    model_applicator = applicator or Model3DApplicator()
     model_applicator.initialize_model(model_type)
     
     # Load texture
@@ -177,11 +185,13 @@ def apply_design_to_model(design_image_path, output_dir, model_type='smpl', pose
     views = model_applicator.apply_to_model(texture_tensor, pose_params, shape_params)
     
     # Save rendered views
-    base_filename = design_image_path.split('/')[-1].split('.')[0]
+    if base_filename is None:
+        design_path = source_path(design_image_path)
+        base_filename = design_path.split('/')[-1].split('.')[0] if design_path else 'design'
     output_paths = model_applicator.save_rendered_views(views, output_dir, base_filename)
     
     return {
-        'design_image': design_image_path,
+        'design_image': source_path(design_image_path),
         'model_type': model_type,
         'views': output_paths
     }
@@ -217,4 +227,4 @@ def create_model_animation(design_image_path, output_path, model_type='smpl', an
     }
 
 # Export functions for API
-__all__ = ['apply_design_to_model', 'create_model_animation']
+__all__ = ['Model3DApplicator', 'apply_design_to_model', 'create_model_animation']
@@ -0,0 +1,312 @@
+import inspect
+import os
+import time
+
+import torch
+from torchvision.ops import box_iou
+
+# Inference backends for the detection and segmentation models:
+# eager       - the torchvision model as is (float32)
+# torchscript - scripted and frozen TorchScript graph
+# quantized   - int8 dynamic quantization of the linear layers, scripted
+#               (the segmentation model has none, so it is only scripted)
+# onnx        - ONNX Runtime session (needs the onnxruntime package)
+BACKENDS = ['eager', 'torchscript', 'quantized', 'onnx']
+
+
+class ScriptRunner:
+    def __init__(self, module, task):
+        """
+        Initialize TorchScript runner
+        
+        Args:
+            module: Scripted model
+            task: 'detection' or 'segmentation'
+        """
+        self.module = module
+        self.task = task
+    
+    def __call__(self, inputs):
+        output = self.module(inputs)
+        # Scripted detection models return a (losses, detections) tuple
+        return output[1] if self.task == 'detection' else output
+
+
+class OnnxRunner:
+    def __init__(self, path, task):
+        """
+        Initialize ONNX Runtime runner
+        
+        The session is created on first use in each process, so it is never
+        shared across a fork.
+        
+        Args:
+            path: Exported ONNX model
+            task: 'detection' or 'segmentation'
+        """
+        self.path = path
+        self.task = task
+        self._session = None
+        self._pid = None
+    
+    def session(self):
+        """ONNX Runtime session of this process"""
+        if self._session is None or self._pid != os.getpid():
+            try:
+                import onnxruntime
+            except ImportError:
+                raise RuntimeError("The onnx backend needs the onnxruntime package") from None
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            # Same thread budget as torch (see AI_TORCH_THREADS)
+            options.intra_op_num_threads = torch.get_num_threads()
+            self._session = onnxruntime.InferenceSession(self.path, options, providers=['CPUExecutionProvider'])
+            self._pid = os.getpid()
+        return self._session
+    
+    def __call__(self, inputs):
+        session = self.session()
+        if self.task == 'segmentation':
+            out, = session.run(['out'], {'input': inputs.cpu().numpy()})
+            return {'out': torch.from_numpy(out)}
+        
+        # The exported detection graph takes one image at a time
+        outputs = []
+        for image in inputs:
+            boxes, labels, scores = session.run(None, {'image': image.cpu().numpy()})
+            outputs.append({
+                'boxes': torch.from_numpy(boxes),
+                'labels': torch.from_numpy(labels),
+                'scores': torch.from_numpy(scores)
+            })
+        return outputs
+
+
+def backend_path(directory, name, backend):
+    """
+    File an exported model is stored in
+    
+    The torch version is part of the name because TorchScript and ONNX
+    exports are not guaranteed to load in other versions.
+    
+    Args:
+        directory: Export directory (None keeps TorchScript exports in memory)
+        name: Model name, e.g. 'detection' or 'detection-512'
+        backend: Backend name
+    
+    Returns:
+        Path, or None without a directory
+    """
+    if not directory or backend == 'eager':
+        return None
+    extension = 'onnx' if backend == 'onnx' else 'pt'
+    return os.path.join(directory, f"{name}-{backend}-torch{torch.__version__.split('+')[0]}.{extension}")
+
+
+def script(model):
+    """Script and freeze an eval-mode model"""
+    scripted = torch.jit.script(model)
+    try:
+        # Folds weights and batch norms into the graph
+        return torch.jit.freeze(scripted)
+    except RuntimeError:
+        return scripted
+
+
+def quantize(model):
+    """Int8 dynamic quantization of the linear layers of a float model"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(model, task, path):
+    """
+    Export a model to ONNX
+    
+    Args:
+        model: Eval-mode model
+        task: 'detection' or 'segmentation'
+        path: Output file
+    """
+    kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # The TorchScript-based exporter handles the detection model's control flow
+        kwargs['dynamo'] = False
+    
+    if task == 'detection':
+        args = ([torch.rand(3, 480, 640)],)
+        names = {'input_names': ['image'], 'output_names': ['boxes', 'labels', 'scores']}
+        dynamic_axes = {'image': {1: 'height', 2: 'width'}, 'boxes': {0: 'objects'}, 'labels': {0: 'objects'}, 'scores': {0: 'objects'}}
+    else:
+        args = (torch.rand(1, 3, 256, 256),)
+        names = {'input_names': ['input'], 'output_names': ['out']}
+        dynamic_axes = {'input': {0: 'batch', 2: 'height', 3: 'width'}, 'out': {0: 'batch', 2: 'height', 3: 'width'}}
+    
+    partial = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(model, args, partial, opset_version=17, dynamic_axes=dynamic_axes, **names, **kwargs)
+    os.replace(partial, path)
+
+
+def load_backend(model, task, backend='eager', path=None):
+    """
+    Build the inference callable of a model for a backend
+    
+    Exports are written to path and loaded from there by later processes.
+    
+    Args:
+        model: Eval-mode torchvision model
+        task: 'detection' (list of CxHxW tensors -> list of dicts) or
+            'segmentation' (NxCxHxW tensor -> dict with 'out' logits)
+        backend: One of BACKENDS
+        path: Export file (see backend_path; required for onnx)
+    
+    Returns:
+        Callable with the calling convention of the eager model
+    """
+    if backend == 'eager':
+        return model
+    
+    if path:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    
+    if backend == 'onnx':
+        if not path:
+            raise ValueError("The onnx backend needs an export directory")
+        if not os.path.exists(path):
+            export_onnx(model, task, path)
+        return OnnxRunner(path, task)
+    
+    if backend not in ('torchscript', 'quantized'):
+        raise ValueError(f"Unknown inference backend '{backend}' (available: {', '.join(BACKENDS)})")
+    
+    if path and os.path.exists(path):
+        module = torch.jit.load(path, map_location='cpu')
+    else:
+        module = script(quantize(model) if backend == 'quantized' else model)
+        if path:
+            partial = f"{path}.{os.getpid()}.tmp"
+            torch.jit.save(module, partial)
+            os.replace(partial, path)
+    return ScriptRunner(module, task)
+
+
+def example_inputs(task, count=2, seed=0):
+    """
+    Deterministic inputs for a parity check
+    
+    Args:
+        task: 'detection' or 'segmentation'
+        count: Number of inputs
+        seed: Random seed
+    
+    Returns:
+        List of model inputs (detection: list of one CxHxW tensor; segmentation: 1xCxHxW tensor)
+    """
+    generator = torch.Generator().manual_seed(seed)
+    inputs = []
+    for _ in range(count):
+        # Smooth blobs rather than pixel noise, so the detector proposes something
+        image = torch.nn.functional.interpolate(torch.rand(1, 3, 12, 16, generator=generator), size=(480, 640), mode='bilinear')
+        inputs.append([image[0]] if task == 'detection' else image)
+    return inputs
+
+
+def check_parity(reference, candidate, task, inputs, iou_threshold=0.5, score_threshold=0.5):
+    """
+    Compare a backend's outputs with the eager model's
+    
+    Args:
+        reference: Eager model
+        candidate: Backend callable
+        task: 'detection' or 'segmentation'
+        inputs: Model inputs (see example_inputs)
+        iou_threshold: Minimum IoU of a matching detection
+        score_threshold: Detections compared (the 10 best are used when none reaches it)
+    
+    Returns:
+        Dictionary with the agreement (fraction of matching detections or
+        pixels), the largest score/logit difference and the seconds per
+        call of both models
+    """
+    matched = total = 0
+    max_difference = 0.0
+    reference_seconds = candidate_seconds = 0.0
+    
+    with torch.no_grad():
+        # Warm up lazy initialization (ONNX sessions, TorchScript profiling runs)
+        candidate(inputs[0])
+        candidate(inputs[0])
+        
+        for example in inputs:
+            start = time.perf_counter()
+            expected = reference(example)
+            reference_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            actual = candidate(example)
+            candidate_seconds += time.perf_counter() - start
+            
+            if task == 'segmentation':
+                expected, actual = expected['out'], actual['out']
+                matched += int((expected.argmax(1) == actual.argmax(1)).sum())
+                total += expected.argmax(1).numel()
+                max_difference = max(max_difference, float((expected - actual).abs().max()))
+                continue
+            
+            for want, got in zip(expected, actual):
+                keep = want['scores'] >= score_threshold
+                if not keep.any():
+                    keep = torch.arange(len(want['scores'])) < 10
+                total += int(keep.sum())
+                if not keep.any() or len(got['boxes']) == 0:
+                    continue
+                ious = box_iou(want['boxes'][keep], got['boxes'])
+                ious[want['labels'][keep][:, None] != got['labels'][None, :]] = 0
+                best, index = ious.max(1)
+                hits = best >= iou_threshold
+                matched += int(hits.sum())
+                if hits.any():
+                    score_difference = (want['scores'][keep][hits] - got['scores'][index[hits]]).abs().max()
+                    max_difference = max(max_difference, float(score_difference))
+    
+    return {
+        'agreement': matched / total if total else 1.0,
+        'compared': total,
+        'max_difference': max_difference,
+        'eager_seconds': reference_seconds / len(inputs),
+        'backend_seconds': candidate_seconds / len(inputs),
+    }
+
+
+def select_backend(model, task, name, backend='eager', directory=None, min_parity=0.0):
+    """
+    Load a backend, falling back to the eager model when it cannot be
+    loaded or its outputs disagree with the eager model's
+    
+    Args:
+        model: Eval-mode torchvision model
+        task: 'detection' or 'segmentation'
+        name: Model name used for the export file
+        backend: One of BACKENDS
+        directory: Export directory
+        min_parity: Minimum agreement with the eager model (0 skips the check)
+    
+    Returns:
+        Tuple of the inference callable, the backend used and the parity report (None if not checked)
+    """
+    if backend == 'eager':
+        return model, 'eager', None
+    
+    try:
+        runner = load_backend(model, task, backend, backend_path(directory, name, backend))
+    except Exception as e:
+        print(f"Could not load the {backend} backend of {name}, using eager: {e}")
+        return model, 'eager', None
+    
+    if not min_parity:
+        return runner, backend, None
+    
+    report = check_parity(model, runner, task, example_inputs(task))
+    if report['agreement'] < min_parity:
+        print(f"The {backend} backend of {name} agrees with eager on {report['agreement']:.1%} (< {min_parity:.1%}), using eager")
+        return model, 'eager', report
+    return runner, backend, report
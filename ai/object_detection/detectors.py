@@ -0,0 +1,227 @@
+import importlib
+import inspect
+
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+
+from common.image_io import fit_size, load_image_fit
+
+
+class Detector:
+    """
+    Interface of the object detection backends
+
+    A backend implements detect_tensors (or detect_batch, if it does not
+    work on tensors); the rest has working defaults. Detected objects are
+    dictionaries with 'class', 'confidence' and 'bbox' ([x1, y1, x2, y2]
+    in the coordinates of the image they were detected in).
+    """
+    # Input size limits: shorter side at most MIN_SIZE, longer side at most MAX_SIZE
+    MIN_SIZE = 800
+    MAX_SIZE = 1333
+
+    # Prepares images for detect_tensors
+    transform = transforms.ToTensor()
+    device = torch.device('cpu')
+
+    @classmethod
+    def input_limits(cls, max_size=None):
+        """
+        Side limits the detector resizes its inputs to
+
+        A resolution tier lowers both limits to its longest side.
+
+        Args:
+            max_size: Longest side of the tier (None or 0 for the detector's own limits)
+
+        Returns:
+            (max shorter side, max longer side)
+        """
+        if max_size and max_size < cls.MAX_SIZE:
+            return max_size, max_size
+        return cls.MIN_SIZE, cls.MAX_SIZE
+
+    def detect_objects(self, image, max_size=None):
+        """
+        Detect objects in an image
+
+        Large images are decoded straight at the inference size (JPEG draft
+        mode) instead of at full resolution.
+
+        Args:
+            image: Path, encoded bytes, PIL image or numpy array
+            max_size: Longest side of the resolution tier (None for the detector's own limits)
+
+        Returns:
+            List of dictionaries with detected objects (class, confidence, bounding box
+            in original image coordinates)
+        """
+        decoded, original_size = load_image_fit(image, *self.input_limits(max_size))
+        objects = self.detect_batch([decoded], max_size)[0]
+        return self.rescale_objects(objects, decoded.size, original_size)
+
+    def detect_batch(self, images, max_size=None):
+        """
+        Detect objects in several images
+
+        Args:
+            images: List of RGB PIL images (sizes may differ)
+            max_size: Longest side of the resolution tier (None for the detector's own limits)
+
+        Returns:
+            List with the detected objects of each image (bounding boxes in
+            the coordinates of that image), in input order
+        """
+        limits = self.input_limits(max_size)
+        inputs = [self.fit_image(image, limits) for image in images]
+        objects = self.detect_tensors([self.transform(image) for image in inputs], max_size)
+        return [self.rescale_objects(found, fitted.size, image.size) for found, fitted, image in zip(objects, inputs, images)]
+
+    def detect_tensors(self, image_tensors, max_size=None):
+        """
+        Detect objects in already converted images
+
+        Backends that only implement detect_batch get the tensors back as
+        PIL images, so the fused detect-and-segment path works with them too.
+
+        Args:
+            image_tensors: List of CxHxW float tensors in [0, 1] (ToTensor output)
+            max_size: Longest side of the resolution tier (None for the detector's own limits)
+
+        Returns:
+            List with the detected objects of each image, in input order
+        """
+        if type(self).detect_batch is Detector.detect_batch:
+            raise NotImplementedError(f"{type(self).__name__} implements neither detect_tensors nor detect_batch")
+        to_image = transforms.ToPILImage()
+        return self.detect_batch([to_image(tensor.cpu()) for tensor in image_tensors], max_size)
+
+    def detect_tiled(self, image, **options):
+        """
+        Detect objects on full-resolution tiles of a large image
+
+        Backends without tiled inference detect on the whole image.
+
+        Args:
+            image: Path, encoded bytes, PIL image or numpy array
+            **options: Tiling options of the backend
+
+        Returns:
+            List of dictionaries with detected objects, in original image coordinates
+        """
+        return self.detect_objects(image)
+
+    @staticmethod
+    def fit_image(image, limits):
+        """
+        Downscale an image to fit (max shorter side, max longer side) limits
+
+        Args:
+            image: RGB PIL image
+            limits: Side limits from input_limits
+
+        Returns:
+            The image itself if it already fits, otherwise a smaller copy
+        """
+        target = fit_size(image.size, *limits)
+        return image if target == image.size else image.resize(target, Image.BILINEAR, reducing_gap=2.0)
+
+    @staticmethod
+    def rescale_objects(objects, from_size, to_size):
+        """
+        Map bounding boxes between two resolutions of the same image
+
+        Args:
+            objects: Detected objects
+            from_size: (width, height) the boxes were detected at
+            to_size: (width, height) to map them to
+
+        Returns:
+            The objects, with bbox scaled in place
+        """
+        if from_size == to_size:
+            return objects
+        scale_x = to_size[0] / from_size[0]
+        scale_y = to_size[1] / from_size[1]
+        for obj in objects:
+            x1, y1, x2, y2 = obj['bbox']
+            obj['bbox'] = [x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y]
+        return objects
+
+
+class StubDetector(Detector):
+    """
+    Deterministic detector without a model, for load testing
+
+    Returns the same objects, placed relative to the image size, for every
+    image without running anything, so benchmarks of the API measure only
+    the service (decoding, batching, caching, serialization).
+    """
+    # (class, confidence, bbox as fractions of the image width and height)
+    OBJECTS = [
+        ('person', 0.98, (0.20, 0.05, 0.80, 0.95)),
+        ('handbag', 0.87, (0.60, 0.50, 0.75, 0.70)),
+        ('tie', 0.76, (0.46, 0.20, 0.54, 0.45)),
+    ]
+
+    def detect_batch(self, images, max_size=None):
+        # Nothing to gain from downscaling or converting the images
+        return [self.objects(*image.size) for image in images]
+
+    def detect_tensors(self, image_tensors, max_size=None):
+        return [self.objects(tensor.shape[2], tensor.shape[1]) for tensor in image_tensors]
+
+    def objects(self, width, height):
+        """Stub objects of an image of the given size"""
+        return [
+            {
+                'class': name,
+                'confidence': confidence,
+                'bbox': [x1 * width, y1 * height, x2 * width, y2 * height]
+            }
+            for name, confidence, (x1, y1, x2, y2) in self.OBJECTS
+        ]
+
+
+# Detector backends selectable with AI_DETECTOR: name -> (module, class)
+DETECTORS = {
+    'torchvision': ('object_detection.models', 'ObjectDetection'),
+    'clothing': ('object_detection.model', 'ClothingObjectDetector'),
+    'stub': ('object_detection.detectors', 'StubDetector'),
+}
+
+
+def detector_class(name):
+    """
+    Class of a detector backend
+
+    Args:
+        name: Backend name (see DETECTORS)
+
+    Returns:
+        Detector subclass
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}' (available: {', '.join(DETECTORS)})")
+    module, attribute = DETECTORS[name]
+    return getattr(importlib.import_module(module), attribute)
+
+
+def create_detector(name, **options):
+    """
+    Create a detector backend
+
+    Args:
+        name: Backend name (see DETECTORS)
+        **options: Constructor arguments; those the backend does not take are ignored
+
+    Returns:
+        Detector instance
+    """
+    cls = detector_class(name)
+    accepted = inspect.signature(cls).parameters
+    return cls(**{key: value for key, value in options.items() if key in accepted})
@@ -10,45 +10,63 @@
 
 import os
 import numpy as np
-import tensorflow as tf
 from PIL import Image
-import cv2
 import json
 import time
 
+from object_detection.detectors import Detector
+
 # 모델 경로 및 설정
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "model")
 CLASSES = ["배경", "상의", "하의", "아우터", "원피스", "신발", "가방", "액세서리"]
 CONFIDENCE_THRESHOLD = 0.7
 
-class ClothingObjectDetector:
+# 시뮬레이션 지연 시간 (초): 모델 로드, 이미지당 추론
+LOAD_DELAY = 2.0
+INFERENCE_DELAY = 3.0
+
+class ClothingObjectDetector(Detector):
     """
     의류 객체 감지 클래스
     
     이미지에서 의류 아이템을 감지하고 위치를 반환합니다.
+    detectors.Detector 인터페이스를 구현합니다 (AI_DETECTOR=clothing).
     """
     
-    def __init__(self, model_path=MODEL_PATH):
-        """모델 초기화"""
+    def __init__(self, model_path=MODEL_PATH, load_delay=LOAD_DELAY, inference_delay=INFERENCE_DELAY):
+        """
+        모델 초기화
+        
+        Args:
+            model_path: TensorFlow 모델 경로
+            load_delay: 모델 로드 시간 시뮬레이션 (초, 0이면 지연 없음)
+            inference_delay: 이미지당 추론 시간 시뮬레이션 (초, 0이면 지연 없음)
+        """
         # 실제 구현 시 여기에 TensorFlow 모델 로드
         self.model = None
+        self.loaded = False
         self.model_path = model_path
+        self.load_delay = load_delay
+        self.inference_delay = inference_delay
         print(f"의류 객체 감지 모델 초기화 (경로: {model_path})")
     
     def load_model(self):
         """TensorFlow 모델 로드"""
         # 실제 구현 시 여기에 모델 로드 로직 작성
-        # 예시: self.model = tf.saved_model.load(self.model_path)
+        # 예시: import tensorflow as tf; self.model = tf.saved_model.load(self.model_path)
+        # (tensorflow는 필요할 때만 import: 이 모듈을 불러오는 데 필요하지 않음)
         print("모델 로드 중...")
         # 모델 로드 시간 시뮬레이션
-        time.sleep(2)
+        if self.load_delay:
+            time.sleep(self.load_delay)
+        self.loaded = True
         print("모델 로드 완료")
     
-    def preprocess_image(self, image_path):
-        """이미지 전처리"""
+    def preprocess_image(self, image):
+        """이미지 전처리 (경로, 파일 객체 또는 PIL 이미지)"""
         try:
             # 이미지 로드 및 전처리
-            img = Image.open(image_path)
+            img = image if isinstance(image, Image.Image) else Image.open(image)
             # RGB로 변환 (이미지가 RGBA 또는 다른 형식일 수 있음)
             img = img.convert("RGB")
             # 모델 입력 크기로 리사이즈
@@ -64,14 +82,27 @@ class ClothingObjectDetector:
             print(f"이미지 전처리 중 오류 발생: {e}")
             return None
     
-    def detect_objects(self, image_path):
-        """이미지에서 의류 객체 감지"""
-        # 모델이 로드되지 않았다면 로드
-        if self.model is None:
+    def detect_batch(self, images, max_size=None):
+        """
+        여러 이미지에서 의류 객체 감지
+        
+        Args:
+            images: RGB PIL 이미지 목록
+            max_size: 해상도 등급 (이 모델은 항상 416x416 입력을 사용하므로 무시)
+            
+        Returns:
+            이미지별 감지 객체 목록 (class, confidence, bbox [x1, y1, x2, y2])
+        """
+        return [self.detect_image(image) for image in images]
+    
+    def detect_image(self, image):
+        """이미지 한 장에서 의류 객체 감지 (경로, 파일 객체 또는 PIL 이미지)"""
+        # 모델이 로드되지 않았다면 로드 (한 번만)
+        if not self.loaded:
             self.load_model()
         
         # 이미지 전처리
-        img_array = self.preprocess_image(image_path)
+        img_array = self.preprocess_image(image)
         if img_array is None:
             return []
         
@@ -79,9 +110,10 @@ class ClothingObjectDetector:
         # 예시: predictions = self.model(img_array)
         
         # 테스트용 더미 결과 생성
-        print(f"이미지 '{image_path}'에서 객체 감지 중...")
+        print("이미지에서 객체 감지 중...")
         # 처리 시간 시뮬레이션
-        time.sleep(3)
+        if self.inference_delay:
+            time.sleep(self.inference_delay)
         
         # 더미 결과
         results = [
@@ -99,16 +131,21 @@ class ClothingObjectDetector:
             }
         ]
         
-        # 신뢰도 임계값보다 높은 결과만 필터링
-        filtered_results = [r for r in results if r["confidence"] >= CONFIDENCE_THRESHOLD]
-        
-        # 결과를 API 응답 형식으로 변환
+        # 신뢰도 임계값보다 높은 결과만 필터링 (Detector 공통 형식)
+        return [
+            {"class": r["class_name"], "confidence": r["confidence"], "bbox": list(r["bbox"])}
+            for r in results if r["confidence"] >= CONFIDENCE_THRESHOLD
+        ]
+    
+    @staticmethod
+    def format_objects(objects):
+        """감지 결과를 API 응답 형식으로 변환"""
         formatted_results = []
-        for i, r in enumerate(filtered_results):
+        for i, r in enumerate(objects):
             x, y, x2, y2 = r["bbox"]
             formatted_results.append({
                 "id": i + 1,
-                "name": r["class_name"],
+                "name": r["class"],
                 "confidence": r["confidence"],
                 "bbox": {
                     "x": x,
@@ -124,6 +161,9 @@ class ClothingObjectDetector:
     def segment_object(self, image_path, bbox):
         """객체 바운딩 박스를 사용하여 세그멘테이션 수행"""
         try:
+            # opencv는 세그멘테이션에만 필요
+            import cv2
+            
             # 이미지 로드
             image = cv2.imread(image_path)
             if image is None:
@@ -153,7 +193,7 @@ class ClothingObjectDetector:
 def process_detection_request(image_path):
     """API 요청 처리: 이미지에서 의류 객체 감지"""
     detector = ClothingObjectDetector()
-    objects = detector.detect_objects(image_path)
+    objects = detector.format_objects(detector.detect_image(image_path))
     
     # API 응답 형식으로 결과 반환
     response = {
@@ -172,4 +212,4 @@ if __name__ == "__main__":
         results = process_detection_request(image_path)
         print(json.dumps(results, indent=2))
     else:
-        print("사용법: python model.py <이미지_경로>")
+        print("사용법 (ai/ 디렉터리에서): python -m object_detection.model <이미지_경로>")
@@ -1,14 +1,57 @@
+import math
+from typing import Dict, Optional, Tuple
+
 import torch
+import torch.nn.functional as F
 import numpy as np
 from PIL import Image
 import torchvision.transforms as transforms
 from torchvision.models.detection import fasterrcnn_resnet50_fpn
+from torchvision.models.detection.transform import GeneralizedRCNNTransform
 from torchvision.models.segmentation import deeplabv3_resnet101
+from torchvision.ops import batched_nms
+
+from common.image_io import fit_size, flatten_alpha, load_image, load_image_fit, source_path
+from common.masks import box_region, encode_rle
+from common.metrics import stage, timed_stage
+from object_detection.backends import select_backend
+from object_detection.detectors import Detector
+
+class PresizedTransform(GeneralizedRCNNTransform):
+    """
+    GeneralizedRCNNTransform that normalizes and batches without resizing
+    
+    ObjectDetection resizes its inputs to the resolution tier before the
+    forward pass, so one model (and one exported backend) serves every tier.
+    """
+    
+    # Annotated, the override is compiled by TorchScript like the method it replaces
+    def resize(self, image: torch.Tensor, target: Optional[Dict[str, torch.Tensor]] = None) -> Tuple[torch.Tensor, Optional[Dict[str, torch.Tensor]]]:
+        return image, target
 
-class ObjectDetection:
-    def __init__(self):
+class ObjectDetection(Detector):
+    # Input resize of the detector: shorter side 800, longer side at most 1333 (torchvision defaults)
+    MIN_SIZE = 800
+    MAX_SIZE = 1333
+    
+    # Name of the backend exports (the graph has no input resize, unlike the stock model's)
+    EXPORT_NAME = 'detection-presized'
+    
+    def __init__(self, backend='eager', backend_dir=None, min_parity=0.0):
+        """
+        Initialize object detection
+        
+        Args:
+            backend: Inference backend (eager, torchscript, quantized or onnx; see backends.py)
+            backend_dir: Directory exported models are stored in and loaded from
+            min_parity: Minimum agreement of the backend with the eager model (0 skips the check)
+        """
         # Load pre-trained model for object detection
-        self.model = fasterrcnn_resnet50_fpn(pretrained=True)
+        self.model = fasterrcnn_resnet50_fpn(pretrained=True, min_size=self.MIN_SIZE, max_size=self.MAX_SIZE)
+        transform = self.model.transform
+        self.model.transform = PresizedTransform(
+            min_size=self.MIN_SIZE, max_size=self.MAX_SIZE, image_mean=transform.image_mean, image_std=transform.image_std
+        )
         self.model.eval()
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.model.to(self.device)
@@ -43,29 +86,275 @@ class ObjectDetection:
         self.transform = transforms.Compose([
             transforms.ToTensor(),
         ])
+        
+        # Inference backend, shared by all resolution tiers. The eager model
+        # stays loaded for the parity check. The optimized backends are CPU-only.
+        if self.device.type != 'cpu':
+            backend = 'eager'
+        self.runner, self.backend, self.parity = select_backend(
+            self.model, 'detection', self.EXPORT_NAME, backend, backend_dir, min_parity
+        )
     
-    def detect_objects(self, image_path):
+    @staticmethod
+    def load_image(image):
+        """
+        Load image for detection
+        
+        Args:
+            image: Path, encoded bytes, PIL image or numpy array
+            
+        Returns:
+            RGB PIL image
+        """
+        return load_image(image)
+    
+    def detect_objects(self, image, max_size=None):
         """
         Detect objects in an image
         
+        Large images are decoded straight at the inference size (JPEG draft
+        mode) instead of at full resolution.
+        
         Args:
-            image_path: Path to the image file
+            image: Path, encoded bytes, PIL image or numpy array
+            max_size: Longest side of the resolution tier (None for the model's own limits)
             
         Returns:
-            List of dictionaries with detected objects (class, confidence, bounding box)
+            List of dictionaries with detected objects (class, confidence, bounding box
+            in original image coordinates)
         """
-        # Load image
-        image = Image.open(image_path).convert('RGB')
-        image_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        with stage('object_detection', 'decode'):
+            decoded, original_size = load_image_fit(image, *self.input_limits(max_size))
+        objects = self.detect_batch([decoded], max_size)[0]
+        return self.rescale_objects(objects, decoded.size, original_size)
+    
+    def detect_batch(self, images, max_size=None):
+        """
+        Detect objects in several images with one forward pass
+        
+        Args:
+            images: List of RGB PIL images (sizes may differ)
+            max_size: Longest side of the resolution tier (None for the model's own limits)
+            
+        Returns:
+            List with the detected objects of each image (bounding boxes in
+            the coordinates of that image), in input order
+        """
+        limits = self.input_limits(max_size)
+        with stage('object_detection', 'preprocess'):
+            # Downscaled here rather than by the model, before the float conversion
+            inputs = [self.fit_image(image, limits) for image in images]
+            image_tensors = [self.transform(image) for image in inputs]
+        
+        objects = self.detect_tensors(image_tensors, max_size)
+        return [self.rescale_objects(found, fitted.size, image.size) for found, fitted, image in zip(objects, inputs, images)]
+    
+    def detect_tensors(self, image_tensors, max_size=None):
+        """
+        Detect objects in already converted images with one forward pass
+        
+        Args:
+            image_tensors: List of CxHxW float tensors in [0, 1] (ToTensor output)
+            max_size: Longest side of the resolution tier (None for the model's own limits)
+            
+        Returns:
+            List with the detected objects of each image, in input order
+        """
+        predictions = self.predict_tensors(image_tensors, max_size)
+        
+        with stage('object_detection', 'postprocess'):
+            return [self.process_predictions(prediction) for prediction in predictions]
+    
+    def predict_tensors(self, image_tensors, max_size=None):
+        """
+        Raw model outputs of already converted images, with one forward pass
+        
+        Args:
+            image_tensors: List of CxHxW float tensors in [0, 1] (ToTensor output)
+            max_size: Longest side of the resolution tier (None for the model's own limits)
+            
+        Returns:
+            List of prediction dictionaries (boxes, labels, scores, with boxes in
+            the coordinates of the input tensors), in input order
+        """
+        limits = self.input_limits(max_size)
+        with stage('object_detection', 'preprocess'):
+            inputs = [self.resize_tensor(tensor.to(self.device), *limits) for tensor in image_tensors]
         
         # Run inference
-        with torch.no_grad():
-            predictions = self.model(image_tensor)
+        with stage('object_detection', 'forward'), torch.no_grad():
+            predictions = self.runner(inputs)
+        
+        for prediction, tensor, resized in zip(predictions, image_tensors, inputs):
+            prediction['boxes'] = self.resize_boxes(prediction['boxes'], resized.shape[-2:], tensor.shape[-2:])
+        return predictions
+    
+    def detect_tiled(self, image, tile_size=800, overlap=0.25, batch_size=4, max_side=8000, iou_threshold=0.5):
+        """
+        Detect objects in a large image on overlapping full-resolution tiles
+        
+        Small objects that vanish when the whole image is downscaled to the
+        detector's input size are found on the tiles; the whole image is
+        detected too, for objects larger than a tile. Tile detections cut
+        off by an inner tile border are dropped (the neighbouring tile or
+        the whole-image pass sees the full object), and the rest are merged
+        with per-class NMS.
+        
+        Peak memory is bounded: the image is decoded at most max_side pixels
+        on its longest side and tiles are converted and run batch_size at a
+        time.
         
-        # Process predictions
-        pred_classes = predictions[0]['labels'].cpu().numpy()
-        pred_scores = predictions[0]['scores'].cpu().numpy()
-        pred_bboxes = predictions[0]['boxes'].cpu().numpy()
+        Args:
+            image: Path, encoded bytes, PIL image or numpy array
+            tile_size: Side of the square tiles, run without resizing
+            overlap: Fraction of a tile shared with its neighbours
+            batch_size: Tiles per forward pass
+            max_side: Longest side the image is decoded at (0 for no limit)
+            iou_threshold: IoU above which overlapping boxes of a class are merged
+            
+        Returns:
+            List of dictionaries with detected objects (class, confidence, bounding box
+            in original image coordinates)
+        """
+        with stage('object_detection', 'decode'):
+            limit = max_side or math.inf
+            decoded, original_size = load_image_fit(image, limit, limit)
+        width, height = decoded.size
+        
+        # Whole image at the detector's own resolution
+        with stage('object_detection', 'preprocess'):
+            fitted = self.fit_image(decoded, self.input_limits())
+            whole_tensor = self.transform(fitted)
+        whole = self.predict_tensors([whole_tensor])[0]
+        scale = torch.tensor([width / fitted.width, height / fitted.height] * 2, device=whole['boxes'].device)
+        boxes, scores, labels = [whole['boxes'] * scale], [whole['scores']], [whole['labels']]
+        
+        origins = self.tile_origins(width, height, tile_size, overlap)
+        if len(origins) > 1:
+            for start in range(0, len(origins), batch_size):
+                chunk = origins[start:start + batch_size]
+                with stage('object_detection', 'preprocess'):
+                    crops = [(x, y, min(x + tile_size, width), min(y + tile_size, height)) for x, y in chunk]
+                    tensors = [self.transform(decoded.crop(crop)) for crop in crops]
+                predictions = self.predict_tensors(tensors, tile_size)
+                # Freed before the next batch is converted
+                del tensors
+                
+                for (x0, y0, x1, y1), prediction in zip(crops, predictions):
+                    tile_boxes = prediction['boxes']
+                    keep = ~self.cut_by_tile(tile_boxes, (x0, y0, x1, y1), width, height)
+                    offset = torch.tensor([x0, y0, x0, y0], dtype=tile_boxes.dtype, device=tile_boxes.device)
+                    boxes.append(tile_boxes[keep] + offset)
+                    scores.append(prediction['scores'][keep])
+                    labels.append(prediction['labels'][keep])
+        
+        with stage('object_detection', 'postprocess'):
+            boxes, scores, labels = torch.cat(boxes), torch.cat(scores), torch.cat(labels)
+            keep = batched_nms(boxes, scores, labels, iou_threshold)
+            objects = self.process_predictions({'boxes': boxes[keep], 'scores': scores[keep], 'labels': labels[keep]})
+        return self.rescale_objects(objects, decoded.size, original_size)
+    
+    @staticmethod
+    def tile_origins(width, height, tile_size, overlap):
+        """
+        Top-left corners of overlapping tiles covering an image
+        
+        Args:
+            width: Image width
+            height: Image height
+            tile_size: Side of the square tiles
+            overlap: Fraction of a tile shared with its neighbours
+            
+        Returns:
+            List of (x, y) tile origins, row by row (one tile if the image fits)
+        """
+        def positions(length):
+            if length <= tile_size:
+                return [0]
+            stride = max(1, tile_size * (1 - overlap))
+            count = math.ceil((length - tile_size) / stride) + 1
+            # Evenly spread, the last tile ending on the image border
+            return [round(n * (length - tile_size) / (count - 1)) for n in range(count)]
+        
+        return [(x, y) for y in positions(height) for x in positions(width)]
+    
+    @staticmethod
+    def cut_by_tile(boxes, tile, width, height, margin=2):
+        """
+        Which tile detections touch an inner tile border (objects cut off by the tile)
+        
+        Args:
+            boxes: Nx4 boxes in tile coordinates
+            tile: (x0, y0, x1, y1) of the tile in the image
+            width: Image width
+            height: Image height
+            margin: Distance from a border in pixels still counted as touching
+            
+        Returns:
+            N boolean tensor
+        """
+        x0, y0, x1, y1 = tile
+        return (
+            ((boxes[:, 0] <= margin) & (x0 > 0))
+            | ((boxes[:, 1] <= margin) & (y0 > 0))
+            | ((boxes[:, 2] >= x1 - x0 - margin) & (x1 < width))
+            | ((boxes[:, 3] >= y1 - y0 - margin) & (y1 < height))
+        )
+    
+    @staticmethod
+    def resize_tensor(tensor, min_size, max_size):
+        """
+        Resize an image tensor to the detector input size of a tier
+        
+        Same scale and interpolation as the resize of GeneralizedRCNNTransform,
+        which the model itself skips (see PresizedTransform).
+        
+        Args:
+            tensor: CxHxW float tensor
+            min_size: Target shorter side
+            max_size: Maximum longer side
+            
+        Returns:
+            Resized CxHxW tensor
+        """
+        height, width = tensor.shape[-2:]
+        scale = min(min_size / min(height, width), max_size / max(height, width))
+        if scale == 1.0:
+            return tensor
+        return F.interpolate(tensor[None], scale_factor=scale, mode='bilinear', recompute_scale_factor=True, align_corners=False)[0]
+    
+    @staticmethod
+    def resize_boxes(boxes, from_size, to_size):
+        """
+        Map Nx4 boxes between two (height, width) sizes of an image tensor
+        
+        Args:
+            boxes: Nx4 tensor of [x1, y1, x2, y2]
+            from_size: (height, width) the boxes are in
+            to_size: (height, width) to map them to
+            
+        Returns:
+            Nx4 tensor
+        """
+        if tuple(from_size) == tuple(to_size):
+            return boxes
+        ratio_height = torch.tensor(to_size[0], dtype=torch.float32) / torch.tensor(from_size[0], dtype=torch.float32)
+        ratio_width = torch.tensor(to_size[1], dtype=torch.float32) / torch.tensor(from_size[1], dtype=torch.float32)
+        return boxes * torch.stack([ratio_width, ratio_height, ratio_width, ratio_height]).to(boxes.device)
+    
+    def process_predictions(self, prediction):
+        """
+        Convert raw model output for one image into detected objects
+        
+        Args:
+            prediction: Model output dictionary (labels, scores, boxes)
+            
+        Returns:
+            List of dictionaries with detected objects (class, confidence, bounding box)
+        """
+        pred_classes = prediction['labels'].cpu().numpy()
+        pred_scores = prediction['scores'].cpu().numpy()
+        pred_bboxes = prediction['boxes'].cpu().numpy()
         
         # Filter predictions (confidence > 0.5)
         keep_indices = np.where(pred_scores > 0.5)[0]
@@ -89,115 +378,432 @@ class ObjectDetection:
         return results
 
 class Segmentation:
-    def __init__(self):
+    # Longest side images are segmented at (DeepLabV3 was trained at 520 px);
+    # masks are upsampled back to the input size
+    MAX_SIZE = 640
+    
+    # Name of the backend exports
+    EXPORT_NAME = 'segmentation'
+    
+    def __init__(self, backend='eager', backend_dir=None, min_parity=0.0, max_size=None):
+        """
+        Initialize segmentation
+        
+        Args:
+            backend: Inference backend (eager, torchscript, quantized or onnx; see backends.py)
+            backend_dir: Directory exported models are stored in and loaded from
+            min_parity: Minimum agreement of the backend with the eager model (0 skips the check)
+            max_size: Longest side images are segmented at (None for MAX_SIZE, 0 for full resolution)
+        """
+        self.max_size = self.MAX_SIZE if max_size is None else max_size
+        
         # Load pre-trained model for segmentation
         self.model = deeplabv3_resnet101(pretrained=True)
         self.model.eval()
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.model.to(self.device)
         
+        # Inference backend (the optimized backends are CPU-only)
+        if self.device.type != 'cpu':
+            backend = 'eager'
+        self.runner, self.backend, self.parity = select_backend(
+            self.model, 'segmentation', self.EXPORT_NAME, backend, backend_dir, min_parity
+        )
+        
         # Transform to prepare image for model
-        self.transform = transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-        ])
+        self.to_tensor = transforms.ToTensor()
+        self.normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        self.transform = transforms.Compose([self.to_tensor, self.normalize])
+    
+    @staticmethod
+    def load_image(image):
+        """
+        Load image for segmentation
+        
+        Args:
+            image: Path, encoded bytes, PIL image or numpy array
+            
+        Returns:
+            RGB PIL image
+        """
+        return load_image(image)
     
-    def segment_image(self, image_path):
+    def segment_image(self, image):
         """
         Segment objects in an image
         
         Args:
-            image_path: Path to the image file
+            image: Path, encoded bytes, PIL image or numpy array
             
         Returns:
-            Segmentation mask
+            HxW uint8 class mask at the image size (0 is background)
         """
-        # Load image
-        image = Image.open(image_path).convert('RGB')
-        image_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        return self.segment_batch([self.load_image(image)])[0]
+    
+    def segment_batch(self, images):
+        """
+        Segment several images, running one forward pass per distinct image size
         
-        # Run inference
-        with torch.no_grad():
-            output = self.model(image_tensor)['out'][0]
+        Args:
+            images: List of RGB PIL images
+            
+        Returns:
+            List of uint8 class masks at the image sizes, in input order
+        """
+        with stage('segmentation', 'preprocess'):
+            # Shrinking the PIL image is cheaper than converting it at full size
+            image_tensors = [self.to_tensor(self.fit_image(image)) for image in images]
+        
+        return self.segment_tensors(image_tensors, [(image.height, image.width) for image in images])
+    
+    def fit_image(self, image):
+        """Downscale a PIL image to the segmentation resolution"""
+        if not self.max_size:
+            return image
+        size = fit_size(image.size, self.max_size, self.max_size)
+        return image if size == image.size else image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    
+    def fit_tensor(self, tensor):
+        """Downscale a CxHxW tensor to the segmentation resolution"""
+        if not self.max_size:
+            return tensor
+        height, width = tensor.shape[1:]
+        size = fit_size((width, height), self.max_size, self.max_size)
+        if size == (width, height):
+            return tensor
+        return F.interpolate(tensor[None], size=(size[1], size[0]), mode='bilinear', align_corners=False, antialias=True)[0]
+    
+    def segment_tensors(self, image_tensors, output_sizes=None):
+        """
+        Segment already converted images, running one forward pass per distinct size
+        
+        Tensors larger than the segmentation resolution are downscaled first.
+        
+        Args:
+            image_tensors: List of CxHxW float tensors in [0, 1] (ToTensor output, not normalized)
+            output_sizes: (height, width) of each mask (None for the tensor sizes)
+            
+        Returns:
+            List of uint8 class masks (0 is background), in input order
+        """
+        if output_sizes is None:
+            output_sizes = [tuple(tensor.shape[1:]) for tensor in image_tensors]
+        with stage('segmentation', 'preprocess'):
+            image_tensors = [self.fit_tensor(tensor) for tensor in image_tensors]
+        
+        # Images can only be stacked into one tensor when their sizes match
+        groups = {}
+        for index, tensor in enumerate(image_tensors):
+            groups.setdefault(tuple(tensor.shape[1:]), []).append(index)
+        
+        masks = [None] * len(image_tensors)
+        for indices in groups.values():
+            with stage('segmentation', 'preprocess'):
+                image_tensor = self.normalize(torch.stack([image_tensors[i] for i in indices])).to(self.device)
+            
+            # Run inference
+            with stage('segmentation', 'forward'), torch.no_grad():
+                output = self.runner(image_tensor)['out']
+            
+            # Get segmentation masks
+            with stage('segmentation', 'postprocess'):
+                for i, logits in zip(indices, output):
+                    masks[i] = self.logits_to_mask(logits, output_sizes[i])
+        
+        return masks
+    
+    @staticmethod
+    def logits_to_mask(logits, size):
+        """
+        Class mask of segmentation logits, upsampled to an output size
+        
+        Only the foreground margin (best object logit minus background
+        logit) is upsampled smoothly, so the object outline stays sharp
+        without resizing every class channel; class labels are upsampled
+        by nearest neighbour. At the logits' own size this is the argmax.
+        
+        Args:
+            logits: CxHxW logits, class 0 being background
+            size: (height, width) of the mask
+            
+        Returns:
+            HxW uint8 class mask
+        """
+        score, label = logits[1:].max(0)
+        margin = score - logits[0]
+        label = (label + 1).to(torch.uint8).cpu().numpy()
+        if tuple(margin.shape) != tuple(size):
+            margin = F.interpolate(margin[None, None], size=size, mode='bilinear', align_corners=False)[0, 0]
+            rows = (np.arange(size[0]) * label.shape[0]) // size[0]
+            cols = (np.arange(size[1]) * label.shape[1]) // size[1]
+            label = label[rows[:, None], cols]
+        return label * (margin > 0).cpu().numpy()
+    
+    def segment_objects(self, image_tensor, objects, margin=0.1):
+        """
+        Segment each detected object within its bounding box
+        
+        Only the box regions (enlarged by a margin for context) go through
+        the segmentation model, instead of the whole image.
+        
+        Args:
+            image_tensor: CxHxW float tensor in [0, 1] of the whole image
+            objects: Detected objects with a bbox each
+            margin: Fraction of the box size added around each crop
+            
+        Returns:
+            List with a binary mask of each object's box region, or None for empty boxes
+        """
+        height, width = image_tensor.shape[1:]
+        crops, regions = [], []
+        for obj in objects:
+            region = box_region(obj['bbox'], width, height, margin)
+            if region is None:
+                regions.append(None)
+                continue
+            x0, y0, x1, y1 = region
+            crops.append(image_tensor[:, y0:y1, x0:x1])
+            regions.append(region)
         
-        # Get segmentation mask
-        output_predictions = output.argmax(0).cpu().numpy()
+        crop_masks = iter(self.segment_tensors(crops)) if crops else iter(())
+        masks = []
+        for obj, region in zip(objects, regions):
+            box = box_region(obj['bbox'], width, height)
+            if region is None or box is None:
+                masks.append(None)
+                continue
+            crop_mask = next(crop_masks)
+            # Cut the margin off again: the mask covers exactly the box
+            x0, y0, x1, y1 = box
+            masks.append((crop_mask[y0 - region[1]:y1 - region[1], x0 - region[0]:x1 - region[0]] > 0).astype(np.uint8))
         
-        return output_predictions
+        return masks
     
-    def apply_segmentation_mask(self, image_path, mask, output_path):
+    @staticmethod
+    def scale_mask(mask, from_box, to_box, scale):
+        """
+        Map a box mask to the same box at another resolution of the image
+        
+        The mask is resized as 8-bit image, so upscaling it to a large
+        photo costs no more than the output mask itself.
+        
+        Args:
+            mask: Binary mask of from_box
+            from_box: (x0, y0, x1, y1) pixel region the mask covers
+            to_box: (x0, y0, x1, y1) pixel region of the same box at the other resolution
+            scale: (x, y) factors from the other resolution to the mask's
+            
+        Returns:
+            HxW uint8 binary mask of to_box
+        """
+        x0, y0, x1, y1 = to_box
+        scale_x, scale_y = scale
+        # to_box in the pixel coordinates of the mask (fractional, possibly overhanging)
+        source = (
+            x0 * scale_x - from_box[0], y0 * scale_y - from_box[1],
+            x1 * scale_x - from_box[0], y1 * scale_y - from_box[1]
+        )
+        alpha = Image.fromarray(np.multiply(np.asarray(mask) > 0, 255, dtype=np.uint8))
+        scaled = alpha.resize((x1 - x0, y1 - y0), Image.BILINEAR, box=source)
+        return (np.asarray(scaled) >= 128).astype(np.uint8)
+    
+    @staticmethod
+    def apply_segmentation_mask(image, mask, output_path):
         """
         Apply segmentation mask to image
         
+        Formats without an alpha channel (JPEG) get a black background.
+        
         Args:
-            image_path: Path to the input image
+            image: Path, encoded bytes, PIL image or numpy array of the input image
             mask: Segmentation mask
             output_path: Path to save the output image
             
         Returns:
             Path to the output image
         """
-        # Load image
-        image = Image.open(image_path).convert('RGB')
-        
-        # Convert image to numpy array
-        image_np = np.array(image)
+        masked_image = Segmentation.mask_image(image, mask)
+        if output_path.lower().endswith(('.jpg', '.jpeg')):
+            masked_image = flatten_alpha(masked_image)
+        masked_image.save(output_path)
         
-        # Create a binary mask (1 for foreground, 0 for background)
-        binary_mask = (mask > 0).astype(np.uint8)
-        
-        # Expand mask to match image dimensions
-        expanded_mask = np.expand_dims(binary_mask, axis=2)
-        expanded_mask = np.repeat(expanded_mask, 3, axis=2)
+        return output_path
+    
+    @staticmethod
+    @timed_stage('segmentation', 'mask')
+    def mask_image(image, mask):
+        """
+        Apply segmentation mask to image in memory
         
-        # Apply mask to image
-        masked_image = image_np * expanded_mask
+        Args:
+            image: Path, encoded bytes, PIL image or numpy array of the input image
+            mask: Segmentation mask (class mask, 0 is background)
+            
+        Returns:
+            RGBA PIL image with the mask as alpha channel
+        """
+        # A copy, so a decoded image shared with the caller is left alone
+        masked_image = load_image(image, 'RGBA')
+        if masked_image is image:
+            masked_image = masked_image.copy()
         
-        # Convert back to PIL image and save
-        output_image = Image.fromarray(masked_image)
-        output_image.save(output_path)
+        # Foreground opaque, background transparent, without widening the mask
+        alpha = np.multiply(np.asarray(mask) > 0, 255, dtype=np.uint8)
+        masked_image.putalpha(Image.fromarray(alpha))
+        return masked_image
+
+class StubSegmentation(Segmentation):
+    """
+    Deterministic segmentation without a model, for load testing
+    
+    Every image gets the same centered elliptical mask without loading
+    DeepLabV3 or running anything, so benchmarks of the API measure only
+    the service. Cropping and mask handling are those of Segmentation.
+    """
+    # Class of the stub mask (person in the VOC labels of DeepLabV3)
+    LABEL = 15
+    
+    def __init__(self, max_size=None):
+        """
+        Initialize stub segmentation
         
-        return output_path
+        Args:
+            max_size: Longest side images are segmented at (None for MAX_SIZE, 0 for full resolution)
+        """
+        self.max_size = self.MAX_SIZE if max_size is None else max_size
+        self.device = torch.device('cpu')
+        self.to_tensor = transforms.ToTensor()
+    
+    def segment_batch(self, images):
+        # Nothing to gain from converting the images
+        return [self.stub_mask(image.height, image.width) for image in images]
+    
+    def segment_tensors(self, image_tensors, output_sizes=None):
+        if output_sizes is None:
+            output_sizes = [tuple(tensor.shape[1:]) for tensor in image_tensors]
+        return [self.stub_mask(height, width) for height, width in output_sizes]
+    
+    def stub_mask(self, height, width):
+        """Class mask of an ellipse covering the middle of an image of the given size"""
+        rows = ((np.arange(height) + 0.5) / height - 0.5) / 0.4
+        cols = ((np.arange(width) + 0.5) / width - 0.5) / 0.3
+        inside = rows[:, None] ** 2 + cols[None, :] ** 2 <= 1
+        return inside.astype(np.uint8) * self.LABEL
 
 # Main object detection class to be used by the API
-def detect_fashion_objects(image_path):
+def detect_fashion_objects(image, detector=None, max_size=None, tiled=None):
     """
     Detect fashion objects in an image
     
     Args:
-        image_path: Path to the image file
+        image: Path, encoded bytes, PIL image or numpy array
+        detector: Shared ObjectDetection instance (a new one is created if None)
+        max_size: Longest side of the resolution tier (None for the model's own limits)
+        tiled: Keyword arguments of ObjectDetection.detect_tiled to detect on
+            full-resolution tiles instead (None detects on the whole image)
         
     Returns:
         Dictionary with detected objects
     """
-    obj_detector = ObjectDetection()
-    detected_objects = obj_detector.detect_objects(image_path)
+    obj_detector = detector or ObjectDetection()
+    if tiled is not None:
+        detected_objects = obj_detector.detect_tiled(image, **tiled)
+    else:
+        detected_objects = obj_detector.detect_objects(image, max_size)
     
     return {
-        'image_path': image_path,
+        'image_path': source_path(image),
         'objects': detected_objects
     }
 
 # Segment fashion objects from image
-def segment_fashion_object(image_path, output_path):
+def segment_fashion_object(image, output_path=None, segmenter=None):
     """
     Segment fashion objects from image
     
     Args:
-        image_path: Path to the input image
-        output_path: Path to save the output image
+        image: Path, encoded bytes, PIL image or numpy array of the input image
+        output_path: Path to save the output image (None keeps it in memory only)
+        segmenter: Shared Segmentation instance (a new one is created if None)
         
     Returns:
-        Path to the output image
+        Path to the output image and, when not saved, the masked PIL image
     """
-    segmentation_model = Segmentation()
-    mask = segmentation_model.segment_image(image_path)
-    result_path = segmentation_model.apply_segmentation_mask(image_path, mask, output_path)
+    segmentation_model = segmenter or Segmentation()
+    
+    # Decode once for both segmentation and masking
+    decoded = segmentation_model.load_image(image)
+    mask = segmentation_model.segment_image(decoded)
+    
+    if output_path is None:
+        return {
+            'input_image': source_path(image),
+            'output_image': None,
+            'image': segmentation_model.mask_image(decoded, mask)
+        }
+    
+    result_path = segmentation_model.apply_segmentation_mask(decoded, mask, output_path)
     
     return {
-        'input_image': image_path,
+        'input_image': source_path(image),
         'output_image': result_path
     }
 
+# Detect and segment fashion objects with one decode
+def detect_and_segment_fashion_objects(image, detector=None, segmenter=None, margin=0.1, image_size=None):
+    """
+    Detect fashion objects and segment each one within its bounding box
+    
+    The image is decoded at the detection resolution (JPEG draft mode, as
+    in ObjectDetection.detect_objects) and converted to a tensor once;
+    detection runs on the whole tensor and segmentation on crops of it
+    around the detections. Boxes and masks are scaled back to the original
+    image size, so a large photo is never held as a full-resolution tensor.
+    
+    Args:
+        image: Path, encoded bytes, PIL image or numpy array
+        detector: Shared ObjectDetection instance (a new one is created if None)
+        segmenter: Shared Segmentation instance (a new one is created if None)
+        margin: Fraction of the box size added around each segmentation crop
+        image_size: Original (width, height) when image is an already downscaled
+            decode (None if image is the original)
+        
+    Returns:
+        Dictionary with the image size and the detected objects, each with a
+        run-length encoded mask of its box region (see common.masks)
+    """
+    obj_detector = detector or ObjectDetection()
+    segmentation_model = segmenter or Segmentation()
+    
+    with stage('object_detection', 'decode'):
+        decoded, original_size = load_image_fit(image, *obj_detector.input_limits())
+    original_size = image_size or original_size
+    with stage('object_detection', 'preprocess'):
+        image_tensor = obj_detector.transform(decoded).to(obj_detector.device)
+    
+    objects = obj_detector.detect_tensors([image_tensor])[0]
+    masks = segmentation_model.segment_objects(image_tensor, objects, margin)
+    
+    height, width = image_tensor.shape[1:]
+    fitted_boxes = [box_region(obj['bbox'], width, height) for obj in objects]
+    obj_detector.rescale_objects(objects, (width, height), original_size)
+    
+    for obj, mask, fitted_box in zip(objects, masks, fitted_boxes):
+        box = box_region(obj['bbox'], *original_size)
+        if mask is None or box is None:
+            obj['mask'], obj['area'] = None, 0
+            continue
+        if (width, height) != original_size:
+            mask = Segmentation.scale_mask(mask, fitted_box, box, (width / original_size[0], height / original_size[1]))
+        obj['mask'] = {'box': list(box), **encode_rle(mask)}
+        obj['area'] = int(mask.sum())
+    
+    return {
+        'image_path': source_path(image),
+        'width': int(original_size[0]),
+        'height': int(original_size[1]),
+        'objects': objects
+    }
+
 # Export functions for API
-__all__ = ['detect_fashion_objects', 'segment_fashion_object']
+__all__ = ['ObjectDetection', 'Segmentation', 'StubSegmentation', 'detect_fashion_objects', 'segment_fashion_object', 'detect_and_segment_fashion_objects']
@@ -0,0 +1,261 @@
+import math
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torchvision.ops import box_iou
+
+from common.image_io import load_image_fit
+from common.metrics import stage
+
+
+class ObjectTracker:
+    """
+    Propagates detections across the frames of a clip
+    
+    The detector only runs on keyframes: every keyframe_interval frames, on
+    a scene change, or when a track is lost. In between, each box is moved
+    to where its content went, by normalized cross-correlation template
+    matching on small grayscale frames. Boxes keep their track_id across
+    keyframes when a new detection of the same class overlaps them.
+    """
+    
+    def __init__(self, keyframe_interval=5, scene_threshold=0.15, min_similarity=0.5,
+                 iou_threshold=0.3, search=0.5, work_size=320):
+        """
+        Initialize the tracker
+        
+        Args:
+            keyframe_interval: Maximum frames between detector runs (1 detects every frame)
+            scene_threshold: Mean absolute gray level change (0-1) since the last
+                keyframe that counts as a scene change
+            min_similarity: Lowest template match score (-1 to 1) of a tracked box
+            iou_threshold: Minimum IoU for a detection to continue a track
+            search: Distance a box may move between frames, as a fraction of its size
+            work_size: Longest side of the grayscale frames used for tracking
+        """
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.scene_threshold = scene_threshold
+        self.min_similarity = min_similarity
+        self.iou_threshold = iou_threshold
+        self.search = search
+        self.work_size = work_size
+        
+        self.tracks = []
+        self.next_id = 1
+        self.previous = None
+        self.keyframe = None
+        self.since_keyframe = 0
+    
+    def prepare(self, image):
+        """
+        Grayscale working copy of a frame
+        
+        Args:
+            image: RGB PIL image the boxes are given in
+        
+        Returns:
+            Tuple of the HxW float tensor in [0, 1] and its scale relative to the image
+        """
+        scale = min(1.0, self.work_size / max(image.size))
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        gray = image.convert('L')
+        if size != gray.size:
+            gray = gray.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return torch.from_numpy(np.asarray(gray, dtype=np.float32) / 255.0), size[0] / image.width
+    
+    def needs_detection(self, frame):
+        """
+        Whether the detector has to run on a frame
+        
+        Args:
+            frame: Frame from prepare
+        
+        Returns:
+            True on the first frame, after keyframe_interval frames and on a scene change
+        """
+        gray, _ = frame
+        if self.keyframe is None or self.since_keyframe + 1 >= self.keyframe_interval:
+            return True
+        if gray.shape != self.keyframe.shape:
+            return True
+        return float((gray - self.keyframe).abs().mean()) > self.scene_threshold
+    
+    def update(self, frame, detections):
+        """
+        Start or continue tracks from the detections of a keyframe
+        
+        Args:
+            frame: Frame from prepare
+            detections: Detected objects of the frame
+        
+        Returns:
+            The detections, each with a track_id
+        """
+        objects = [dict(obj, tracked=False) for obj in detections]
+        matched = set()
+        if self.tracks and objects:
+            ious = box_iou(
+                torch.tensor([obj['bbox'] for obj in objects], dtype=torch.float32),
+                torch.tensor([track['bbox'] for track in self.tracks], dtype=torch.float32)
+            )
+            # Greedy matching, best overlap first, same class only
+            for value, index in zip(*ious.flatten().sort(descending=True)):
+                if value < self.iou_threshold:
+                    break
+                d, t = divmod(int(index), len(self.tracks))
+                if 'track_id' in objects[d] or t in matched or objects[d]['class'] != self.tracks[t]['class']:
+                    continue
+                objects[d]['track_id'] = self.tracks[t]['track_id']
+                matched.add(t)
+        
+        for obj in objects:
+            if 'track_id' not in obj:
+                obj['track_id'] = self.next_id
+                self.next_id += 1
+        
+        self.tracks = [dict(obj) for obj in objects]
+        self.previous = self.keyframe = frame[0]
+        self.since_keyframe = 0
+        return objects
+    
+    def propagate(self, frame):
+        """
+        Move the tracked boxes to a new frame without running the detector
+        
+        Args:
+            frame: Frame from prepare
+        
+        Returns:
+            The tracked objects in the new frame, or None if a track was lost
+            (the frame should then be detected instead)
+        """
+        gray, scale = frame
+        if self.previous is None or gray.shape != self.previous.shape:
+            return None
+        
+        moved = []
+        for track in self.tracks:
+            box = self.follow(self.previous, gray, [value * scale for value in track['bbox']])
+            if box is None:
+                return None
+            moved.append(dict(track, bbox=[value / scale for value in box], tracked=True))
+        
+        self.tracks = moved
+        self.previous = gray
+        self.since_keyframe += 1
+        return [dict(track) for track in moved]
+    
+    def follow(self, previous, current, box):
+        """
+        Find a box's content of the previous frame in the current frame
+        
+        Args:
+            previous: Previous grayscale frame
+            current: Current grayscale frame
+            box: [x1, y1, x2, y2] in working frame coordinates
+        
+        Returns:
+            The moved box, or None if the best match is below min_similarity
+        """
+        height, width = current.shape
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(width, math.ceil(box[2])), min(height, math.ceil(box[3]))
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return box
+        template = previous[y1:y2, x1:x2]
+        if float(template.std()) < 1e-3:
+            # Flat content cannot be located, keep the box where it is
+            return box
+        
+        # Search window around the box
+        margin_x = max(4, round((x2 - x1) * self.search))
+        margin_y = max(4, round((y2 - y1) * self.search))
+        sx1, sy1 = max(0, x1 - margin_x), max(0, y1 - margin_y)
+        sx2, sy2 = min(width, x2 + margin_x), min(height, y2 + margin_y)
+        region = current[sy1:sy2, sx1:sx2]
+        
+        with stage('object_detection', 'track'):
+            # Coarse match on downsampled copies, so large boxes stay cheap
+            factor = max(1, math.ceil(max(template.shape) / 32))
+            if factor > 1:
+                coarse, _ = self.match(F.avg_pool2d(region[None], factor)[0], F.avg_pool2d(template[None], factor)[0])
+                dy, dx = coarse[0] * factor, coarse[1] * factor
+                # Refine at full resolution within one coarse step
+                ry1, rx1 = max(0, dy - factor), max(0, dx - factor)
+                ry2 = min(region.shape[0], dy + factor + template.shape[0])
+                rx2 = min(region.shape[1], dx + factor + template.shape[1])
+                (fy, fx), similarity = self.match(region[ry1:ry2, rx1:rx2], template)
+                dy, dx = ry1 + fy, rx1 + fx
+            else:
+                (dy, dx), similarity = self.match(region, template)
+        
+        if similarity < self.min_similarity:
+            return None
+        shift_x = sx1 + dx - x1
+        shift_y = sy1 + dy - y1
+        return [box[0] + shift_x, box[1] + shift_y, box[2] + shift_x, box[3] + shift_y]
+    
+    @staticmethod
+    def match(region, template):
+        """
+        Best normalized cross-correlation position of a template in a region
+        
+        Args:
+            region: HxW tensor, at least as large as the template
+            template: hxw tensor
+        
+        Returns:
+            Tuple of the (row, column) offset of the best match and its score (-1 to 1)
+        """
+        h, w = template.shape
+        if region.shape[0] < h or region.shape[1] < w:
+            return (0, 0), -1.0
+        centered = template - template.mean()
+        ones = torch.ones(1, 1, h, w)
+        image = region[None, None]
+        # With a zero-mean template, sum((r - mean(r)) * t) equals sum(r * t)
+        numerator = F.conv2d(image, centered[None, None])
+        sums = F.conv2d(image, ones)
+        energy = (F.conv2d(image * image, ones) - sums * sums / (h * w)).clamp(min=0)
+        scores = (numerator / (energy * (centered * centered).sum()).sqrt().clamp(min=1e-6))[0, 0]
+        best = int(scores.argmax())
+        return divmod(best, scores.shape[1]), float(scores.flatten()[best])
+
+
+def track_fashion_objects(frames, detector=None, max_size=None, **options):
+    """
+    Detect fashion objects across the frames of a clip
+    
+    The detector runs on keyframes only; boxes are propagated to the other
+    frames by an ObjectTracker.
+    
+    Args:
+        frames: Iterable of frames (paths, encoded bytes, PIL images or numpy arrays) in order
+        detector: Shared detector (a new ObjectDetection is created if None)
+        max_size: Longest side of the detection resolution tier
+        **options: ObjectTracker arguments (keyframe_interval, scene_threshold, ...)
+    
+    Yields:
+        Dictionary per frame with the frame index, whether it was a keyframe
+        and the objects (with track_id, in original frame coordinates)
+    """
+    if detector is None:
+        from object_detection.models import ObjectDetection
+        detector = ObjectDetection()
+    tracker = ObjectTracker(**options)
+    
+    for index, source in enumerate(frames):
+        image, original_size = load_image_fit(source, *detector.input_limits(max_size))
+        frame = tracker.prepare(image)
+        objects = None if tracker.needs_detection(frame) else tracker.propagate(frame)
+        keyframe = objects is None
+        if keyframe:
+            objects = tracker.update(frame, detector.detect_batch([image], max_size)[0])
+        
+        yield {
+            'frame': index,
+            'keyframe': keyframe,
+            'objects': detector.rescale_objects(objects, image.size, original_size)
+        }
@@ -4,8 +4,12 @@ import torch.nn as nn
 import torch.nn.functional as F
 from PIL import Image
 import torchvision.transforms as transforms
-import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from common.image_io import load_image, source_path
+from common.metrics import timed_stage
 
 class PatternExtractor:
     def __init__(self):
@@ -19,22 +23,24 @@ class PatternExtractor:
             transforms.ToTensor(),
         ])
     
-    def load_image(self, image_path):
+    @timed_stage('pattern_extractor', 'preprocess')
+    def load_image(self, image):
         """
         Load and preprocess image
         
         Args:
-            image_path: Path to the image file
+            image: Path, encoded bytes, PIL image or numpy array
             
         Returns:
             Preprocessed image tensor
         """
         # Load image
-        image = Image.open(image_path).convert('RGB')
+        image = load_image(image)
         image_tensor = self.transform(image).to(self.device)
         
         return image_tensor, image
     
+    @timed_stage('pattern_extractor', 'silhouette')
     def extract_silhouette(self, image_tensor):
         """
         Extract silhouette from image
@@ -92,6 +98,7 @@ class PatternExtractor:
         
         return mask_eroded
     
+    @timed_stage('pattern_extractor', 'contours')
     def detect_contours(self, silhouette):
         """
         Detect contours in silhouette
@@ -121,6 +128,7 @@ class PatternExtractor:
         
         return contour
     
+    @timed_stage('pattern_extractor', 'pieces')
     def generate_pattern_pieces(self, contour, num_pieces=4):
         """
         Generate pattern pieces from contour
@@ -189,6 +197,7 @@ class PatternExtractor:
         
         return pattern_pieces
     
+    @timed_stage('pattern_extractor', 'render')
     def visualize_pattern(self, original_image, silhouette, contour, pattern_pieces, output_path):
         """
         Visualize extracted pattern
@@ -203,11 +212,50 @@ class PatternExtractor:
         Returns:
             Path to the saved visualization
         """
+        fig = self.build_pattern_figure(original_image, silhouette, contour, pattern_pieces)
+        fig.savefig(output_path)
+        
+        return output_path
+    
+    @timed_stage('pattern_extractor', 'render')
+    def render_pattern_image(self, original_image, silhouette, contour, pattern_pieces):
+        """
+        Render extracted pattern visualization in memory
+        
+        Args:
+            original_image: Original PIL image
+            silhouette: Binary silhouette mask
+            contour: Array of contour points
+            pattern_pieces: List of pattern pieces
+            
+        Returns:
+            Rendered RGBA PIL image
+        """
+        fig = self.build_pattern_figure(original_image, silhouette, contour, pattern_pieces)
+        canvas = FigureCanvasAgg(fig)
+        canvas.draw()
+        
+        return Image.fromarray(np.asarray(canvas.buffer_rgba()))
+    
+    def build_pattern_figure(self, original_image, silhouette, contour, pattern_pieces):
+        """
+        Build the pattern visualization figure
+        
+        Args:
+            original_image: Original PIL image
+            silhouette: Binary silhouette mask
+            contour: Array of contour points
+            pattern_pieces: List of pattern pieces
+            
+        Returns:
+            Matplotlib figure
+        """
         # Convert tensors to numpy
         silhouette_np = silhouette.cpu().numpy()
         
-        # Create figure with subplots
-        fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+        # Create figure with subplots (the Figure API, unlike pyplot, is safe to use from worker threads)
+        fig = Figure(figsize=(12, 10))
+        axes = fig.subplots(2, 2)
         
         # Original image
         axes[0, 0].imshow(original_image)
@@ -238,28 +286,27 @@ class PatternExtractor:
         axes[1, 1].set_title('Pattern Pieces')
         axes[1, 1].axis('off')
         
-        # Adjust layout and save
-        plt.tight_layout()
-        plt.savefig(output_path)
-        plt.close()
+        # Adjust layout
+        fig.tight_layout()
         
-        return output_path
+        return fig
 
 # Main pattern extraction function to be used by the API
-def extract_pattern(design_image_path, output_path, num_pieces=4):
+def extract_pattern(design_image_path, output_path=None, num_pieces=4, extractor=None):
     """
     Extract clothing pattern from design image
     
     Args:
-        design_image_path: Path to the design image
-        output_path: Path to save the visualization
+        design_image_path: Design image (path, encoded bytes, PIL image or numpy array)
+        output_path: Path to save the visualization (None keeps it in memory only)
         num_pieces: Number of pattern pieces to generate
+        extractor: Shared PatternExtractor instance (a new one is created if None)
         
     Returns:
-        Dictionary with pattern extraction results
+        Dictionary with pattern extraction results and, when not saved, the visualization image
     """
     # Initialize pattern extractor
-    extractor = PatternExtractor()
+    extractor = extractor or PatternExtractor()
     
     # Load and preprocess image
     image_tensor, original_image = extractor.load_image(design_image_path)
@@ -273,22 +320,27 @@ def extract_pattern(design_image_path, output_path, num_pieces=4):
     # Generate pattern pieces
     pattern_pieces = extractor.generate_pattern_pieces(contour, num_pieces)
     
-    # Visualize pattern
-    visualization_path = extractor.visualize_pattern(
-        original_image, silhouette, contour, pattern_pieces, output_path
-    )
-    
     # Prepare pattern data for return
     pattern_data = {
         'num_pieces': num_pieces,
         'pieces': [piece.tolist() for piece in pattern_pieces]
     }
     
-    return {
-        'design_image': design_image_path,
-        'visualization': visualization_path,
+    result = {
+        'design_image': source_path(design_image_path),
+        'visualization': None,
         'pattern_data': pattern_data
     }
+    
+    # Visualize pattern
+    if output_path is None:
+        result['image'] = extractor.render_pattern_image(original_image, silhouette, contour, pattern_pieces)
+    else:
+        result['visualization'] = extractor.visualize_pattern(
+            original_image, silhouette, contour, pattern_pieces, output_path
+        )
+    
+    return result
 
 # Export functions for API
-__all__ = ['extract_pattern']
+__all__ = ['PatternExtractor', 'extract_pattern']
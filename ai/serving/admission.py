@@ -0,0 +1,244 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+class Overloaded(Exception):
+    """Raised when a request is rejected instead of queued"""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: float):
+        super().__init__(f"Endpoint '{endpoint}' is overloaded: {reason}")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Admitted request cost, returned to the controller by release()"""
+
+    def __init__(self, controller: 'AdmissionController', endpoint: str, cost: float):
+        self.controller = controller
+        self.endpoint = endpoint
+        self.cost = cost
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        """Return the cost to the endpoint budget (safe to call more than once)"""
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+
+class _EndpointState:
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.active_cost = 0.0
+        self.queued_cost = 0.0
+        self.waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+        # Smoothed service time per unit of cost, learned from completed requests
+        self.seconds_per_cost: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+
+
+class AdmissionController:
+    """
+    Cost-weighted admission control with fast rejection
+
+    Each endpoint has a budget of cost units (e.g. megapixels) that may be
+    in service at once. Requests over the budget wait in a FIFO queue, but
+    are rejected straight away when the queued cost or the estimated wait
+    would exceed the configured limits, so bursts fail fast with a
+    Retry-After hint instead of exhausting memory.
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[Dict[str, float]] = None,
+        default_capacity: float = 0.0,
+        max_queue: float = 0.0,
+        max_wait: float = 0.0,
+        smoothing: float = 0.2,
+    ):
+        """
+        Initialize admission controller
+
+        Args:
+            capacity: Cost units each endpoint may have in service at once
+            default_capacity: Capacity of endpoints without an explicit entry (0 disables admission control for them)
+            max_queue: Maximum queued cost per endpoint before rejecting (0 for unlimited)
+            max_wait: Maximum estimated wait in seconds before rejecting (0 for unlimited)
+            smoothing: Weight of the newest sample in the service time average
+        """
+        self.capacity = dict(capacity or {})
+        self.default_capacity = default_capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.smoothing = smoothing
+        self._endpoints: Dict[str, _EndpointState] = {}
+
+    def scale(self, factor: float):
+        """
+        Scale every capacity and the queue limit
+
+        Used to split one budget between several server processes.
+
+        Args:
+            factor: Multiplier of the budgets (e.g. 1 / number of workers)
+        """
+        self.capacity = {endpoint: capacity * factor for endpoint, capacity in self.capacity.items()}
+        self.default_capacity *= factor
+        self.max_queue *= factor
+        for state in self._endpoints.values():
+            state.capacity *= factor
+
+    def enabled(self, endpoint: str) -> bool:
+        """Whether admission control applies to an endpoint"""
+        return self.capacity.get(endpoint, self.default_capacity) > 0
+
+    async def acquire(self, endpoint: str, cost: float) -> AdmissionTicket:
+        """
+        Admit a request, waiting for budget or rejecting it
+
+        Args:
+            endpoint: Endpoint name
+            cost: Estimated cost of the request
+
+        Returns:
+            Ticket that must be released when the request has finished
+
+        Raises:
+            Overloaded: The queue or estimated wait limit would be exceeded
+        """
+        if not self.enabled(endpoint):
+            return AdmissionTicket(self, endpoint, 0.0)
+
+        state = self._state(endpoint)
+        # A request larger than the whole budget runs on its own instead of never fitting
+        cost = min(max(cost, 0.0), state.capacity)
+
+        if not state.waiters and state.active_cost + cost <= state.capacity:
+            state.active_cost += cost
+            state.admitted += 1
+            return AdmissionTicket(self, endpoint, cost)
+
+        wait = self.estimated_wait(endpoint, cost)
+        if self.max_queue and state.queued_cost + cost > self.max_queue:
+            state.rejected += 1
+            raise Overloaded(endpoint, "queue is full", wait)
+        if self.max_wait and wait > self.max_wait:
+            state.rejected += 1
+            raise Overloaded(endpoint, f"estimated wait {wait:.1f}s exceeds {self.max_wait:.1f}s", wait)
+
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append((cost, future))
+        state.queued_cost += cost
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Admitted just before the caller gave up
+                state.active_cost -= cost
+            elif (cost, future) in state.waiters:
+                state.waiters.remove((cost, future))
+                state.queued_cost -= cost
+            self._wake(state)
+            raise
+
+        state.admitted += 1
+        return AdmissionTicket(self, endpoint, cost)
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str, cost: float):
+        """
+        Context manager form of acquire() that releases on exit
+
+        Args:
+            endpoint: Endpoint name
+            cost: Estimated cost of the request
+        """
+        ticket = await self.acquire(endpoint, cost)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def estimated_wait(self, endpoint: str, cost: float = 0.0) -> float:
+        """
+        Estimate how long a new request would wait before being admitted
+
+        Args:
+            endpoint: Endpoint name
+            cost: Cost of the new request
+
+        Returns:
+            Estimated wait in seconds (0 until a service time has been observed)
+        """
+        state = self._state(endpoint)
+        if not state.seconds_per_cost:
+            return 0.0
+        # The budget drains at capacity / seconds_per_cost cost units per second
+        backlog = state.active_cost + state.queued_cost + cost - state.capacity
+        return max(0.0, backlog) * state.seconds_per_cost / state.capacity
+
+    @staticmethod
+    def retry_after(overloaded: Overloaded) -> int:
+        """Retry-After header value in whole seconds (at least 1)"""
+        return max(1, math.ceil(overloaded.retry_after))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Budget usage and admission counters per endpoint"""
+        return {
+            endpoint: {
+                'capacity': state.capacity,
+                'active_cost': state.active_cost,
+                'queued_cost': state.queued_cost,
+                'queued': len(state.waiters),
+                'admitted': state.admitted,
+                'rejected': state.rejected,
+                'seconds_per_cost': state.seconds_per_cost,
+                'estimated_wait': self.estimated_wait(endpoint),
+            }
+            for endpoint, state in self._endpoints.items()
+        }
+
+    def _state(self, endpoint):
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = _EndpointState(self.capacity.get(endpoint, self.default_capacity))
+        return self._endpoints[endpoint]
+
+    def _release(self, ticket):
+        if not self.enabled(ticket.endpoint):
+            return
+
+        state = self._state(ticket.endpoint)
+        state.active_cost = max(0.0, state.active_cost - ticket.cost)
+
+        if ticket.cost > 0:
+            sample = (time.monotonic() - ticket.started) / ticket.cost
+            if state.seconds_per_cost is None:
+                state.seconds_per_cost = sample
+            else:
+                state.seconds_per_cost += self.smoothing * (sample - state.seconds_per_cost)
+
+        self._wake(state)
+
+    @staticmethod
+    def _wake(state):
+        # Strict FIFO: a large request at the head is not overtaken by smaller ones
+        while state.waiters:
+            cost, future = state.waiters[0]
+            if future.done():
+                state.waiters.popleft()
+                state.queued_cost -= cost
+                continue
+            if state.active_cost > 0 and state.active_cost + cost > state.capacity:
+                break
+            state.waiters.popleft()
+            state.queued_cost -= cost
+            state.active_cost += cost
+            future.set_result(None)
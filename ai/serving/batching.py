@@ -0,0 +1,118 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler
+
+    Concurrent calls to submit() are gathered for up to max_wait seconds or
+    until max_batch_size items are queued, then processed together by one
+    call to process_batch. Each caller receives the result for its own item.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+        num_workers: int = 1,
+        runner: Optional[Callable[[Callable, List[Any]], Awaitable[List[Any]]]] = None,
+    ):
+        """
+        Initialize micro-batcher
+
+        Args:
+            process_batch: Blocking function mapping a list of items to a list of results
+            max_batch_size: Maximum number of items per batch
+            max_wait: Seconds to wait for more items after the first one arrives
+            num_workers: Number of batches that may run at the same time
+            runner: Coroutine function runner(process_batch, items) that executes a batch
+                off the event loop (defaults to the loop's default executor)
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.num_workers = max(1, num_workers)
+        self.runner = runner or self._run_in_default_executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue an item and wait for its result
+
+        Args:
+            item: Input item for process_batch
+
+        Returns:
+            Result of process_batch for this item
+        """
+        if self._queue is None:
+            self._start()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def queue_depth(self) -> int:
+        """Number of items waiting to be batched"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def close(self):
+        """Stop the batch workers"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def _start(self):
+        self._queue = asyncio.Queue()
+        # Created in an empty context so the workers do not inherit the
+        # context variables of the request that happened to start them
+        self._workers = [contextvars.Context().run(asyncio.create_task, self._worker()) for _ in range(self.num_workers)]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            # Collect more items until the batch is full or the window closes
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout <= 0:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+
+            await self._run(batch)
+
+    async def _run(self, batch):
+        # Callers that gave up while queued do not need a result
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        items = [item for item, _ in batch]
+        try:
+            results = await self.runner(self.process_batch, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    async def _run_in_default_executor(fn, items):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, items)
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class CachedResult(NamedTuple):
+    media_type: str
+    body: bytes
+
+
+def content_digest(data: bytes) -> str:
+    """
+    Hash uploaded content
+
+    Args:
+        data: Raw file bytes
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_cache_key(endpoint: str, digests: List[str], params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a cache key from input digests and normalized endpoint parameters
+
+    Args:
+        endpoint: Endpoint name
+        digests: Content digests of the uploaded files, in argument order
+        params: Endpoint parameters (must be JSON serializable)
+
+    Returns:
+        Hex cache key
+    """
+    normalized = json.dumps(
+        {'endpoint': endpoint, 'inputs': digests, 'params': params or {}},
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier content-addressed result cache
+
+    Results are kept in a size-bounded in-memory LRU and, optionally, in a
+    size-bounded LRU directory on disk that survives restarts. Disk hits
+    are promoted back into memory.
+    """
+
+    def __init__(self, memory_max_bytes: int = 0, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        """
+        Initialize result cache
+
+        Args:
+            memory_max_bytes: Byte budget of the in-memory tier (0 disables it)
+            disk_dir: Directory of the on-disk tier (None disables it)
+            disk_max_bytes: Byte budget of the on-disk tier
+        """
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir if disk_dir and disk_max_bytes else None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: 'OrderedDict[str, CachedResult]' = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: 'OrderedDict[str, int]' = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.memory_max_bytes or self.disk_dir)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """
+        Look up a cached result
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached result, or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        # Entries missing from the index may have been written by another process sharing the directory
+        entry = self._read_disk(key) if self.disk_dir else None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            else:
+                size = len(entry.media_type.encode('utf-8')) + 1 + len(entry.body)
+                self._disk[key] = size
+                self._disk_bytes += size
+            self._put_memory(key, entry)
+        return entry
+
+    def put(self, key: str, media_type: str, body: bytes):
+        """
+        Store a result
+
+        Args:
+            key: Cache key
+            media_type: Media type of the response body
+            body: Response body
+        """
+        entry = CachedResult(media_type, body)
+
+        with self._lock:
+            self._put_memory(key, entry)
+
+        if self.disk_dir and len(body) <= self.disk_max_bytes:
+            self._write_disk(key, entry)
+
+    def resize(self, memory_max_bytes: int, disk_max_bytes: int):
+        """
+        Change the tier budgets, evicting what no longer fits
+
+        Processes that share the disk directory each get a share of the
+        disk budget, so together they stay within it.
+
+        Args:
+            memory_max_bytes: Byte budget of the in-memory tier
+            disk_max_bytes: Byte budget of the on-disk tier (ignored if the disk tier is disabled)
+        """
+        with self._lock:
+            self.memory_max_bytes = memory_max_bytes
+            while self._memory and self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.body)
+            self.disk_max_bytes = disk_max_bytes
+            evicted = self._evict_disk(keep=0) if self.disk_dir else []
+        self._remove_disk(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'disk_entries': len(self._disk),
+            'disk_bytes': self._disk_bytes,
+        }
+
+    def _put_memory(self, key, entry):
+        size = len(entry.body)
+        if size > self.memory_max_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous.body)
+        self._memory[key] = entry
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.body)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                media_type = f.readline().decode('utf-8').strip()
+                body = f.read()
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)
+            return None
+
+        # Refresh the access time used to rebuild LRU order on restart
+        try:
+            os.utime(self._disk_path(key))
+        except OSError:
+            pass
+        return CachedResult(media_type, body)
+
+    def _write_disk(self, key, entry):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial entries
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(entry.media_type.encode('utf-8') + b'\n')
+            f.write(entry.body)
+        os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._forget_disk(key)
+            self._disk[key] = size
+            self._disk_bytes += size
+            # The entry just written is kept even if it alone exceeds the budget
+            evicted = self._evict_disk(keep=1)
+        self._remove_disk(evicted)
+
+    def _evict_disk(self, keep):
+        evicted = []
+        while self._disk_bytes > self.disk_max_bytes and len(self._disk) > keep:
+            evicted_key, _ = next(iter(self._disk.items()))
+            self._forget_disk(evicted_key)
+            evicted.append(evicted_key)
+        return evicted
+
+    def _remove_disk(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _forget_disk(self, key):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _load_disk_index(self):
+        entries = []
+        for shard in os.listdir(self.disk_dir):
+            shard_dir = os.path.join(self.disk_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, name)
+                if name.endswith('.tmp'):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+
+        # Oldest entries first so they are evicted first
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
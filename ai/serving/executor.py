@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class InferenceExecutor:
+    """
+    Bounded execution layer for blocking model functions
+
+    Work runs on a thread or process pool so the event loop stays free to
+    accept requests. Each endpoint additionally has its own concurrency
+    limit so one slow endpoint cannot occupy the whole pool.
+    """
+
+    def __init__(
+        self,
+        kind: str = 'thread',
+        max_workers: Optional[int] = None,
+        endpoint_limits: Optional[Dict[str, int]] = None,
+        default_limit: Optional[int] = None,
+        call_wrapper: Optional[Callable[[Callable[[], Any]], Any]] = None,
+    ):
+        """
+        Initialize inference executor
+
+        Args:
+            kind: Pool type, 'thread' or 'process'
+            max_workers: Pool size (defaults to the number of CPUs)
+            endpoint_limits: Maximum concurrent calls per endpoint name
+            default_limit: Limit for endpoints without an explicit entry (None for unlimited)
+            call_wrapper: Module-level function wrapper(call) that runs each call (e.g. to profile it)
+        """
+        max_workers = max_workers or multiprocessing.cpu_count()
+        self._pool = self._create_pool(kind, max_workers)
+        self.kind = kind
+        self.max_workers = max_workers
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self.default_limit = default_limit
+        self.call_wrapper = call_wrapper
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+
+    async def run(self, endpoint: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking function on the pool
+
+        With a process pool, fn and its arguments must be picklable, so pass
+        module-level functions and plain data rather than model instances.
+
+        Args:
+            endpoint: Endpoint name used for the concurrency limit
+            fn: Blocking function to call
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Return value of fn
+        """
+        semaphore = self._semaphore(endpoint)
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        if self.call_wrapper is not None:
+            call = functools.partial(self.call_wrapper, call)
+        if self.kind == 'thread':
+            # Threads see the caller's context variables (process workers start from a fresh context)
+            call = functools.partial(contextvars.copy_context().run, call)
+
+        if semaphore is None:
+            return await self._call(loop, endpoint, call)
+
+        self._waiting[endpoint] = self._waiting.get(endpoint, 0) + 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting[endpoint] -= 1
+        try:
+            return await self._call(loop, endpoint, call)
+        finally:
+            semaphore.release()
+
+    def in_flight(self, endpoint: str) -> int:
+        """Number of calls currently running for an endpoint"""
+        return self._in_flight.get(endpoint, 0)
+
+    def waiting(self, endpoint: str) -> int:
+        """Number of calls waiting for the endpoint's concurrency limit"""
+        return self._waiting.get(endpoint, 0)
+
+    def endpoints(self) -> List[str]:
+        """Endpoints that have submitted work"""
+        return sorted(set(self._in_flight) | set(self._waiting))
+
+    def resize(self, max_workers: int):
+        """
+        Replace the pool with one of another size
+
+        Meant for a freshly forked server worker that gets a share of the
+        cores. Calls already running finish on the old pool.
+
+        Args:
+            max_workers: New pool size
+        """
+        previous = self._pool
+        self._pool = self._create_pool(self.kind, max_workers)
+        self.max_workers = max_workers
+        previous.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True):
+        """Shut down the underlying pool"""
+        self._pool.shutdown(wait=wait)
+
+    @staticmethod
+    def _create_pool(kind, max_workers):
+        if kind == 'thread':
+            return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+        if kind == 'process':
+            # Forked workers inherit already loaded modules and model weights
+            return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork'))
+        raise ValueError(f"Unknown executor kind '{kind}'")
+
+    async def _call(self, loop, endpoint, call):
+        self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+        try:
+            return await loop.run_in_executor(self._pool, call)
+        finally:
+            self._in_flight[endpoint] -= 1
+
+    def _semaphore(self, endpoint):
+        if endpoint not in self._semaphores:
+            limit = self.endpoint_limits.get(endpoint, self.default_limit)
+            self._semaphores[endpoint] = asyncio.Semaphore(limit) if limit else None
+        return self._semaphores[endpoint]
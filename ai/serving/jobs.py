@@ -0,0 +1,391 @@
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 1,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, available_at, created_at);
+"""
+
+
+class JobStore:
+    """
+    Persistent job queue in a local SQLite database
+
+    The database is shared by the API process, which submits and polls
+    jobs, and the worker processes, which claim and run them. WAL mode
+    lets readers poll while a worker writes.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize job store
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Databases created before heartbeats were recorded
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'heartbeat_at' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0, max_attempts: int = 1) -> str:
+        """
+        Queue a job
+
+        Args:
+            kind: Job kind, used to pick the handler
+            payload: JSON-serializable job input
+            priority: Higher priorities are claimed first
+            max_attempts: Number of times the job is tried before it fails
+
+        Returns:
+            Job ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, priority, payload, max_attempts, created_at, available_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, priority, json.dumps(payload), max(1, max_attempts), now, now)
+            )
+        return job_id
+
+    def claim(self, worker: str, kinds: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the next runnable job
+
+        Args:
+            worker: Worker identifier recorded on the job
+            kinds: Only claim these job kinds (all kinds if None)
+
+        Returns:
+            Claimed job, or None if the queue is empty
+        """
+        now = time.time()
+        query = "SELECT * FROM jobs WHERE status = ? AND available_at <= ?"
+        params: List[Any] = [QUEUED, now]
+        if kinds:
+            query += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params += kinds
+        query += " ORDER BY priority DESC, available_at, created_at LIMIT 1"
+
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so two workers cannot claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, started_at = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (RUNNING, worker, now, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        job = self._to_dict(row)
+        job.update(status=RUNNING, attempts=row['attempts'] + 1, worker=worker, started_at=now, heartbeat_at=now)
+        return job
+
+    def heartbeat(self, job_id: str):
+        """
+        Record that the worker of a running job is still alive
+
+        Args:
+            job_id: Job ID
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                (time.time(), job_id, RUNNING)
+            )
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        """
+        Record a successful job, or finish its cancellation if one was requested
+
+        Args:
+            job_id: Job ID
+            result: JSON-serializable job output
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, "
+                "result = CASE WHEN cancel_requested THEN NULL ELSE ? END, finished_at = ? "
+                "WHERE id = ? AND status = ?",
+                (CANCELLED, SUCCEEDED, json.dumps(result), time.time(), job_id, RUNNING)
+            )
+
+    def fail(self, job_id: str, error: str, retry_delay: float = 0.0) -> str:
+        """
+        Record a failed attempt, requeueing the job while attempts remain
+
+        Args:
+            job_id: Job ID
+            error: Error description
+            retry_delay: Seconds before a retry may be claimed
+
+        Returns:
+            New job status
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET "
+                "status = CASE WHEN cancel_requested THEN ? WHEN attempts < max_attempts THEN ? ELSE ? END, "
+                "available_at = ?, error = ?, "
+                "finished_at = CASE WHEN attempts < max_attempts AND NOT cancel_requested THEN NULL ELSE ? END "
+                "WHERE id = ? AND status = ?",
+                (CANCELLED, QUEUED, FAILED, now + retry_delay, error, now, job_id, RUNNING)
+            )
+        return self.get(job_id)['status']
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a job
+
+        Queued jobs are cancelled immediately. Running jobs are flagged and
+        their result is discarded when the worker finishes.
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Job status after the request, or None if the job does not exist
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, now, job_id, QUEUED)
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING)
+            )
+        job = self.get(job_id)
+        return job['status'] if job else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a job
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Job, or None if it does not exist
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def requeue_stale(self, timeout: float) -> int:
+        """
+        Requeue running jobs whose worker disappeared
+
+        Workers refresh the heartbeat of the job they run, so a job is only
+        abandoned when its worker stopped doing that, however long it runs.
+
+        Args:
+            timeout: Seconds without a heartbeat after which a running job is considered abandoned
+
+        Returns:
+            Number of requeued jobs
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN ? ELSE ? END, "
+                "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END, "
+                "error = 'Worker timed out', available_at = ? "
+                "WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ?",
+                (QUEUED, FAILED, now, now, RUNNING, now - timeout)
+            )
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _ClosingConnection(conn)
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+
+class _ClosingConnection:
+    """sqlite3 connection whose context manager closes it (the stock one only commits)"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, *exc_info):
+        self._conn.close()
+
+
+class JobWorker:
+    """
+    Pulls jobs from a JobStore and runs them with the handler of their kind
+
+    Handlers receive the job payload (with the job ID added as 'job_id')
+    and return a JSON-serializable result. Exceptions count as a failed
+    attempt and are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]],
+        poll_interval: float = 0.5,
+        stale_timeout: Optional[float] = None,
+        retry_backoff: float = 2.0,
+        heartbeat_interval: Optional[float] = None,
+    ):
+        """
+        Initialize job worker
+
+        Args:
+            store: Job store to pull from
+            handlers: Mapping of job kind to handler
+            poll_interval: Seconds to wait when the queue is empty
+            stale_timeout: Requeue running jobs without a heartbeat for this many seconds (None disables)
+            retry_backoff: Base delay in seconds before a failed job is retried
+            heartbeat_interval: Seconds between heartbeats of the running job
+                (a quarter of stale_timeout if None)
+        """
+        self.store = store
+        self.handlers = handlers
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.retry_backoff = retry_backoff
+        if heartbeat_interval is None and stale_timeout:
+            heartbeat_interval = stale_timeout / 4
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = f"{os.uname().nodename}:{os.getpid()}"
+        self._stop = threading.Event()
+
+    def run_once(self) -> bool:
+        """
+        Claim and run one job
+
+        Returns:
+            True if a job was run
+        """
+        job = self.store.claim(self.worker_id, list(self.handlers))
+        if job is None:
+            return False
+
+        finished = threading.Event()
+        if self.heartbeat_interval:
+            threading.Thread(target=self._heartbeat, args=(job['id'], finished), daemon=True).start()
+
+        try:
+            result = self.handlers[job['kind']](dict(job['payload'], job_id=job['id']))
+        except Exception:
+            delay = self.retry_backoff * (2 ** (job['attempts'] - 1))
+            self.store.fail(job['id'], traceback.format_exc(limit=5), retry_delay=delay)
+        else:
+            self.store.complete(job['id'], result)
+        finally:
+            finished.set()
+        return True
+
+    def _heartbeat(self, job_id, finished):
+        while not finished.wait(self.heartbeat_interval):
+            try:
+                self.store.heartbeat(job_id)
+            except sqlite3.Error:
+                # A busy database only delays the heartbeat, the next one retries
+                continue
+
+    def run_forever(self):
+        """Run jobs until stop() is called"""
+        while not self._stop.is_set():
+            if self.run_once():
+                continue
+            if self.stale_timeout:
+                self.store.requeue_stale(self.stale_timeout)
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        """Stop after the current job"""
+        self._stop.set()
+
+
+def run_worker_process(store_path: str, handlers: Dict[str, Callable], **kwargs):
+    """
+    Entry point of a job worker process
+
+    SIGTERM lets the current job finish before the process exits.
+
+    Args:
+        store_path: SQLite database file of the job store
+        handlers: Mapping of job kind to handler
+        **kwargs: Additional JobWorker options
+    """
+    worker = JobWorker(JobStore(store_path), handlers, **kwargs)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker.run_forever()
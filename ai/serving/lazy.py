@@ -0,0 +1,67 @@
+import importlib
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class ImportTimer:
+    """
+    Deferred module imports with a per-module timing report
+
+    Heavy modules (torch, torchvision, matplotlib) are only imported when
+    a caller first needs them, and the wall-clock time of each first import
+    is recorded so cold-start cost can be attributed.
+    """
+
+    def __init__(self):
+        self._times: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def load(self, name: str) -> Any:
+        """
+        Import a module, timing the first import
+
+        Args:
+            name: Dotted module name
+
+        Returns:
+            Module object
+        """
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+
+        # Serialized so concurrent first uses do not report each other's time
+        with self._lock:
+            module = sys.modules.get(name)
+            if module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(name)
+                self._times[name] = time.perf_counter() - start
+        return module
+
+    def attr(self, module: str, name: str) -> Callable[..., Any]:
+        """
+        Build a callable that imports module on first call and forwards to module.name
+
+        Args:
+            module: Dotted module name
+            name: Attribute of the module to call
+
+        Returns:
+            Forwarding callable
+        """
+        def call(*args, **kwargs):
+            return getattr(self.load(module), name)(*args, **kwargs)
+
+        call.__name__ = name
+        call.__qualname__ = f"{module}.{name}"
+        return call
+
+    def report(self) -> Dict[str, float]:
+        """Seconds spent importing each lazily loaded module, in import order"""
+        return dict(self._times)
+
+
+imports = ImportTimer()
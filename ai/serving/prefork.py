@@ -0,0 +1,166 @@
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+import uvicorn
+
+
+class PreforkServer:
+    """
+    Pre-fork multi-worker server
+
+    The parent process loads the application and its models once, then
+    forks the HTTP workers, which share the model weights copy-on-write.
+    The parent only supervises: it restarts workers that die and forwards
+    SIGTERM/SIGINT for a graceful shutdown.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        host: str = '0.0.0.0',
+        port: int = 8000,
+        workers: int = 2,
+        before_fork: Optional[Callable[[], None]] = None,
+        after_fork: Optional[Callable[[int], None]] = None,
+        on_shutdown: Optional[Callable[[], None]] = None,
+        shutdown_timeout: float = 30.0,
+        poll_interval: float = 1.0,
+        **uvicorn_kwargs,
+    ):
+        """
+        Initialize pre-fork server
+
+        Args:
+            app: ASGI application
+            host: Bind address
+            port: Bind port
+            workers: Number of HTTP worker processes
+            before_fork: Called once in the parent before the first fork (e.g. to load models)
+            after_fork: Called in each worker with its index, before it starts serving
+            on_shutdown: Called in the parent after all workers have exited
+            shutdown_timeout: Seconds to wait for workers to exit before killing them
+            poll_interval: Seconds between worker liveness checks (also throttles restarts)
+            **uvicorn_kwargs: Additional uvicorn.Config options
+        """
+        self.config = uvicorn.Config(app, host=host, port=port, workers=1, **uvicorn_kwargs)
+        self.workers = max(1, workers)
+        self.before_fork = before_fork
+        self.after_fork = after_fork
+        self.on_shutdown = on_shutdown
+        self.shutdown_timeout = shutdown_timeout
+        self.poll_interval = poll_interval
+        self._children: Dict[int, int] = {}
+        self._stopping = False
+
+    def run(self):
+        """Load, fork the workers and supervise them until a shutdown signal"""
+        # Bound once in the parent and inherited, so all workers accept on the same socket
+        sock = self.config.bind_socket()
+
+        if self.before_fork:
+            self.before_fork()
+
+        # Move everything loaded so far out of the collector's reach, so
+        # collections in the workers do not write to (and copy) shared pages
+        gc.collect()
+        gc.freeze()
+
+        for index in range(self.workers):
+            self._spawn(index, sock)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        while not self._stopping:
+            # Only our own workers are reaped; the parent may have other children (e.g. job workers)
+            for pid, index in list(self._children.items()):
+                try:
+                    done, status = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done, status = pid, 0
+                if not done or self._stopping:
+                    continue
+                del self._children[pid]
+                print(f"Worker {index} (pid {pid}) exited with status {status}, restarting", file=sys.stderr)
+                self._spawn(index, sock)
+            time.sleep(self.poll_interval)
+
+        self._shutdown()
+        sock.close()
+        if self.on_shutdown:
+            self.on_shutdown()
+
+    def _spawn(self, index, sock):
+        pid = os.fork()
+        if pid:
+            self._children[pid] = index
+            return
+
+        # Worker process
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            if self.after_fork:
+                self.after_fork(index)
+            uvicorn.Server(self.config).run(sockets=[sock])
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            # Skip the parent's atexit handlers and buffered state
+            os._exit(exit_code)
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _shutdown(self):
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self._children.pop(pid, None)
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self._children and time.monotonic() < deadline:
+            for pid in list(self._children):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    self._children.pop(pid, None)
+            time.sleep(0.1)
+
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._children.clear()
+
+
+def intra_op_threads(workers: int, requested: int = 0) -> int:
+    """
+    Torch intra-op threads per worker that keep the cores from being oversubscribed
+
+    Args:
+        workers: Number of worker processes sharing the machine
+        requested: Explicit thread count (0 divides the available cores evenly)
+
+    Returns:
+        Thread count
+    """
+    if requested > 0:
+        return requested
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, cores // max(1, workers))
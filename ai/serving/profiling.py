@@ -0,0 +1,318 @@
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set
+
+MODES = ('cprofile', 'torch')
+
+# Profile session of the request being handled. The executor runs blocking
+# calls in a copy of the caller's context, so its threads see it too.
+current_profile: contextvars.ContextVar = contextvars.ContextVar('current_profile', default=None)
+
+# cProfile (on Python 3.12+) and the torch profiler are process-wide, so only
+# one capture of each kind can run at a time; overlapping calls are skipped
+_mode_locks = {mode: threading.Lock() for mode in MODES}
+
+
+def parse_modes(value: str) -> Set[str]:
+    """
+    Parse a profiling request
+
+    Args:
+        value: 'cprofile', 'torch', 'all' or a comma-separated list ('1', 'true' and 'yes' mean cprofile)
+
+    Returns:
+        Set of profiler modes
+    """
+    modes = set()
+    for item in value.lower().split(','):
+        item = item.strip()
+        if item in ('1', 'true', 'yes', 'cprofile'):
+            modes.add('cprofile')
+        elif item == 'torch':
+            modes.add('torch')
+        elif item == 'all':
+            modes.update(MODES)
+        elif item:
+            raise ValueError(f"Unknown profile mode '{item}' (expected one of: cprofile, torch, all)")
+    if not modes:
+        raise ValueError("Empty profile mode")
+    return modes
+
+
+def run_profiled(fn: Callable[[], Any]) -> Any:
+    """
+    Call fn, capturing it in the current request's profile if there is one
+
+    Module-level so it can wrap calls sent to a process pool, where no
+    profile is active and fn is simply called.
+    """
+    session = current_profile.get()
+    if session is None:
+        return fn()
+    return session.run(fn)
+
+
+class ProfileSession:
+    """
+    Profile of a single request
+
+    Only the blocking work a request sends to the inference pool is
+    captured, since the event loop thread interleaves concurrent requests.
+    Files are written by finish() once the response has been sent.
+    """
+
+    def __init__(self, directory: str, modes: Set[str], endpoint: str, trigger: str, top: int = 25):
+        """
+        Initialize profile session
+
+        Args:
+            directory: Directory the profile files are written to
+            modes: Profilers to run ('cprofile', 'torch')
+            endpoint: Route template of the request
+            trigger: 'request' (asked for by the client) or 'sample'
+            top: Number of functions/operators listed in the summary
+        """
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.directory = directory
+        self.modes = modes
+        self.endpoint = endpoint
+        self.trigger = trigger
+        self.top = top
+        self.started = time.time()
+        self.calls = 0
+        self.skipped: Dict[str, int] = {}
+        self._start = time.perf_counter()
+        self._cprofile = cProfile.Profile() if 'cprofile' in modes else None
+        self._cprofile_used = False
+        self._torch_profiles: List[Any] = []
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        """Call fn under the session's profilers"""
+        with self._lock:
+            self.calls += 1
+        with contextlib.ExitStack() as stack:
+            if self._cprofile is not None and self._acquire('cprofile', stack):
+                self._cprofile.enable()
+                stack.callback(self._cprofile.disable)
+                self._cprofile_used = True
+            if 'torch' in self.modes and self._acquire('torch', stack):
+                torch_profile = self._start_torch()
+                if torch_profile is not None:
+                    stack.enter_context(torch_profile)
+                    with self._lock:
+                        self._torch_profiles.append(torch_profile)
+            return fn()
+
+    def finish(self, status: int) -> Dict[str, Any]:
+        """
+        Write the profile files and the summary
+
+        Args:
+            status: HTTP status of the response
+
+        Returns:
+            Summary, also written to <id>.json
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        summary = {
+            'id': self.id,
+            'endpoint': self.endpoint,
+            'status': status,
+            'trigger': self.trigger,
+            'modes': sorted(self.modes),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'duration_ms': (time.perf_counter() - self._start) * 1000,
+            'profiled_calls': self.calls,
+            'skipped_calls': self.skipped,
+            'files': [],
+        }
+
+        if self._cprofile_used:
+            name = f"{self.id}.prof"
+            self._cprofile.dump_stats(os.path.join(self.directory, name))
+            summary['files'].append(name)
+            summary['top_functions'] = self._top_functions()
+
+        for index, torch_profile in enumerate(self._torch_profiles):
+            name = f"{self.id}.trace{index}.json"
+            torch_profile.export_chrome_trace(os.path.join(self.directory, name))
+            summary['files'].append(name)
+        if self._torch_profiles:
+            summary['top_operators'] = self._top_operators()
+
+        with open(os.path.join(self.directory, f"{self.id}.json"), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def _acquire(self, mode, stack):
+        lock = _mode_locks[mode]
+        if not lock.acquire(blocking=False):
+            with self._lock:
+                self.skipped[mode] = self.skipped.get(mode, 0) + 1
+            return False
+        stack.callback(lock.release)
+        return True
+
+    def _start_torch(self):
+        try:
+            from torch.profiler import ProfilerActivity, profile
+        except ImportError:
+            with self._lock:
+                self.skipped['torch'] = self.skipped.get('torch', 0) + 1
+            return None
+        return profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+
+    def _top_functions(self):
+        stats = pstats.Stats(self._cprofile)
+        stats.sort_stats('cumulative')
+        rows = []
+        for func in stats.fcn_list[:self.top]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[func]
+            rows.append({
+                'function': pstats.func_std_string(func),
+                'calls': calls,
+                'total_ms': total_time * 1000,
+                'cumulative_ms': cumulative_time * 1000,
+            })
+        return rows
+
+    def _top_operators(self):
+        totals: Dict[str, Dict[str, float]] = {}
+        for torch_profile in self._torch_profiles:
+            for event in torch_profile.key_averages():
+                row = totals.setdefault(event.key, {'operator': event.key, 'calls': 0, 'self_cpu_ms': 0.0, 'cpu_ms': 0.0})
+                row['calls'] += event.count
+                row['self_cpu_ms'] += event.self_cpu_time_total / 1000
+                row['cpu_ms'] += event.cpu_time_total / 1000
+        return sorted(totals.values(), key=lambda row: row['self_cpu_ms'], reverse=True)[:self.top]
+
+
+class RequestProfiler:
+    """
+    Opt-in and sampled per-request profiling
+
+    Clients ask for a profile of one request; a configurable fraction of
+    requests is also profiled without being asked. A per-minute budget
+    bounds the overhead and the number of files written.
+    """
+
+    def __init__(
+        self,
+        directory: str = 'profiles',
+        on_demand: bool = True,
+        sample_rate: float = 0.0,
+        sample_modes: Optional[Set[str]] = None,
+        max_per_minute: int = 10,
+    ):
+        """
+        Initialize request profiler
+
+        Args:
+            directory: Directory profile files are written to
+            on_demand: Whether clients may ask for profiles
+            sample_rate: Fraction of requests profiled without being asked
+            sample_modes: Profilers run for sampled requests
+            max_per_minute: Profiles allowed per minute (0 for unlimited)
+        """
+        self.directory = directory
+        self.on_demand = on_demand
+        self.sample_rate = sample_rate
+        self.sample_modes = set(sample_modes or {'cprofile'})
+        self.max_per_minute = max_per_minute
+        self._tokens = float(max_per_minute)
+        self._refilled = time.monotonic()
+        self.captured = 0
+        self.rate_limited = 0
+
+    def start(self, requested: Optional[str], endpoint: str, sampling: bool = True) -> Optional[ProfileSession]:
+        """
+        Decide whether to profile a request
+
+        Args:
+            requested: Profile modes asked for by the client (None if not asked)
+            endpoint: Route template of the request
+            sampling: Whether the request may be sampled
+
+        Returns:
+            Session to activate, or None
+
+        Raises:
+            ValueError: If the requested modes are invalid
+        """
+        if requested is not None and self.on_demand:
+            modes, trigger = parse_modes(requested), 'request'
+        elif sampling and self.sample_rate > 0 and random.random() < self.sample_rate:
+            modes, trigger = self.sample_modes, 'sample'
+        else:
+            return None
+
+        if not self._take_token():
+            self.rate_limited += 1
+            return None
+        self.captured += 1
+        return ProfileSession(self.directory, modes, endpoint, trigger)
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a profile file, or None if name is not a file in the profile directory"""
+        if os.path.basename(name) != name or name.startswith('.'):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Summaries of the most recent profiles
+
+        Args:
+            limit: Maximum number of summaries
+
+        Returns:
+            Summaries, newest first
+        """
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.json') and '.trace' not in name]
+        except FileNotFoundError:
+            return []
+        paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime, reverse=True)
+        summaries = []
+        for path in paths[:limit]:
+            try:
+                with open(path) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop('top_functions', None)
+            summary.pop('top_operators', None)
+            summaries.append(summary)
+        return summaries
+
+    def stats(self) -> Dict[str, Any]:
+        """Profiler settings and counters"""
+        return {
+            'on_demand': self.on_demand,
+            'sample_rate': self.sample_rate,
+            'sample_modes': sorted(self.sample_modes),
+            'max_per_minute': self.max_per_minute,
+            'captured': self.captured,
+            'rate_limited': self.rate_limited,
+        }
+
+    def _take_token(self):
+        if not self.max_per_minute:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.max_per_minute, self._tokens + (now - self._refilled) * self.max_per_minute / 60)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
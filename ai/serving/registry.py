@@ -0,0 +1,165 @@
+import gc
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _RegistryEntry:
+    def __init__(self, factory: Callable[[], Any], idle_timeout: Optional[float], pinned: bool):
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.pinned = pinned
+        self.instance = None
+        self.load_time = None
+        self.last_used = None
+        self.load_count = 0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of shared model instances
+
+    Each model is constructed once by its factory and then shared by every
+    request. Models that are not pinned are evicted after they have been
+    idle for longer than their idle timeout and are reloaded on next use.
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = None):
+        """
+        Initialize model registry
+
+        Args:
+            idle_timeout: Default idle timeout in seconds (None or 0 disables eviction)
+        """
+        self.idle_timeout = idle_timeout or None
+        self._entries: Dict[str, _RegistryEntry] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], idle_timeout: Optional[float] = None, pinned: bool = False):
+        """
+        Register a model factory
+
+        Args:
+            name: Model name used to look the model up
+            factory: Callable that constructs the model
+            idle_timeout: Idle timeout overriding the registry default
+            pinned: Whether the model is kept loaded regardless of use
+        """
+        with self._lock:
+            self._entries[name] = _RegistryEntry(
+                factory,
+                idle_timeout if idle_timeout is not None else self.idle_timeout,
+                pinned
+            )
+
+    def get(self, name: str) -> Any:
+        """
+        Get a shared model instance, loading it on first use
+
+        Args:
+            name: Registered model name
+
+        Returns:
+            Model instance
+        """
+        entry = self._entry(name)
+
+        instance = entry.instance
+        if instance is None:
+            # Only one caller constructs the model, the others wait for it
+            with entry.lock:
+                instance = entry.instance
+                if instance is None:
+                    start = time.perf_counter()
+                    instance = entry.factory()
+                    entry.load_time = time.perf_counter() - start
+                    entry.load_count += 1
+                    entry.instance = instance
+
+        entry.last_used = time.monotonic()
+        return instance
+
+    def preload(self, names: Optional[List[str]] = None, pin: bool = True):
+        """
+        Load models ahead of the first request
+
+        Args:
+            names: Model names to load (all registered models if None)
+            pin: Whether preloaded models are exempt from idle eviction
+        """
+        for name in names if names is not None else list(self._entries):
+            if pin:
+                self._entry(name).pinned = True
+            self.get(name)
+
+    def evict(self, name: str) -> bool:
+        """
+        Drop the shared instance of a model
+
+        Args:
+            name: Registered model name
+
+        Returns:
+            True if a loaded instance was dropped
+        """
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.instance is None:
+                return False
+            entry.instance = None
+
+        # Requests still holding the model keep it alive until they finish
+        gc.collect()
+        return True
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """
+        Evict every unpinned model that has been idle for too long
+
+        Args:
+            now: Current monotonic time (defaults to time.monotonic())
+
+        Returns:
+            Names of the evicted models
+        """
+        now = time.monotonic() if now is None else now
+        evicted = []
+
+        for name, entry in list(self._entries.items()):
+            if entry.pinned or not entry.idle_timeout or entry.instance is None:
+                continue
+            if now - entry.last_used >= entry.idle_timeout and self.evict(name):
+                evicted.append(name)
+
+        return evicted
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Describe the state of every registered model
+
+        Returns:
+            Dictionary mapping model names to their load state
+        """
+        now = time.monotonic()
+        return {
+            name: {
+                'loaded': entry.instance is not None,
+                'pinned': entry.pinned,
+                'load_count': entry.load_count,
+                'load_time': entry.load_time,
+                'idle_seconds': now - entry.last_used if entry.last_used is not None else None,
+                'idle_timeout': entry.idle_timeout,
+                # Inference backend of models that have several (see object_detection/backends.py)
+                'backend': getattr(entry.instance, 'backend', None),
+                # Internal cache of models that keep one (see texture_rendering/texture_cache.py)
+                'cache': entry.instance.cache_stats() if hasattr(entry.instance, 'cache_stats') else None,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def _entry(self, name: str) -> _RegistryEntry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Model '{name}' is not registered")
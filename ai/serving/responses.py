@@ -0,0 +1,137 @@
+import unicodedata
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import quote
+
+from fastapi.responses import Response
+
+from common.image_io import IMAGE_FORMATS
+
+
+class ImageOptions(NamedTuple):
+    format: str
+    quality: Optional[int]
+    max_size: Optional[int]
+
+    @property
+    def media_type(self) -> str:
+        return IMAGE_FORMATS[self.format][1]
+
+    @property
+    def extension(self) -> str:
+        return IMAGE_FORMATS[self.format][2]
+
+    def cache_params(self) -> Dict[str, Any]:
+        """Parameters that change the encoded output, for cache keys"""
+        return {'format': self.format, 'quality': self.quality, 'max_size': self.max_size}
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the output image format
+
+    An explicit format wins. Otherwise the supported image type with the
+    highest q-value in the Accept header is used, falling back to PNG.
+
+    Args:
+        requested: Format asked for by the client (png, jpeg/jpg or webp)
+        accept: Accept request header
+
+    Returns:
+        Format name
+    """
+    if requested:
+        fmt = requested.lower()
+        fmt = 'jpeg' if fmt == 'jpg' else fmt
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format '{requested}'")
+        return fmt
+
+    media_types = {media_type: name for name, (_, media_type, _) in IMAGE_FORMATS.items()}
+    best, best_q = 'png', 0.0
+    for part in (accept or '').split(','):
+        media, _, params = part.strip().partition(';')
+        if media.strip() not in media_types:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = media_types[media.strip()], q
+
+    return best
+
+
+def parse_image_options(
+    requested_format: Optional[str],
+    quality: Optional[int],
+    max_size: Optional[int],
+    accept: Optional[str]
+) -> ImageOptions:
+    """
+    Validate the image output options of a request
+
+    Args:
+        requested_format: Format query parameter
+        quality: Quality query parameter (1-100)
+        max_size: Preview size query parameter (maximum width/height in pixels)
+        accept: Accept request header
+
+    Returns:
+        Normalized image options
+    """
+    fmt = negotiate_format(requested_format, accept)
+    if quality is not None and not 1 <= quality <= 100:
+        raise ValueError("Quality must be between 1 and 100")
+    if max_size is not None and max_size < 1:
+        raise ValueError("Preview size must be positive")
+
+    # Quality has no effect on PNG, so it must not split cache entries
+    return ImageOptions(fmt, quality if fmt != 'png' else None, max_size)
+
+
+def content_disposition(filename: str) -> str:
+    """
+    Build an attachment Content-Disposition header value
+
+    Headers are Latin-1, so names outside ASCII get an ASCII fallback in
+    filename and the full name percent-encoded in filename* (RFC 6266).
+
+    Args:
+        filename: Download filename
+
+    Returns:
+        Header value
+    """
+    fallback = ''.join(
+        char for char in unicodedata.normalize('NFKD', filename)
+        if ' ' <= char <= '~' and char not in '"\\'
+    )
+    if fallback == filename:
+        return f'attachment; filename="{filename}"'
+    stem, dot, extension = fallback.rpartition('.')
+    fallback = f"{stem.strip() or 'image'}{dot}{extension}" if dot else fallback.strip() or 'image'
+    return f'attachment; filename="{fallback}"; filename*=utf-8\'\'{quote(filename)}'
+
+
+def image_response(body: bytes, options: ImageOptions, filename_stem: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Build a response for an encoded image
+
+    Args:
+        body: Encoded image bytes
+        options: Image options the body was encoded with
+        filename_stem: Download filename without extension
+        headers: Additional response headers
+
+    Returns:
+        Response with the image body
+    """
+    headers = dict(headers or {})
+    headers['Content-Disposition'] = content_disposition(f"{filename_stem}{options.extension}")
+    headers['Vary'] = 'Accept'
+    return Response(content=body, media_type=options.media_type, headers=headers)
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Deduplication of identical concurrent calls
+
+    The first caller for a key (the leader) starts the computation; callers
+    that arrive with the same key while it is running (followers) wait for
+    the leader's result instead of computing it again. The computation runs
+    in its own task, so it still completes for the followers when the
+    leader's client disconnects. Results are shared, so callers must not
+    mutate them.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Run fn once per key at a time, sharing the result with concurrent callers
+
+        Args:
+            key: Identity of the call (e.g. content hash plus parameters)
+            fn: Coroutine function computing the result
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Result of fn, or the exception it raised
+        """
+        future = self._calls.get(key)
+        if future is None:
+            self.leaders += 1
+            future = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.followers += 1
+
+        # Shielded so a caller that gives up does not cancel the shared computation
+        return await asyncio.shield(future)
+
+    def in_flight(self) -> int:
+        """Number of distinct computations currently running"""
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        """Leader and follower counters"""
+        return {'in_flight': self.in_flight(), 'leaders': self.leaders, 'followers': self.followers}
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Mark the exception as retrieved when every caller has gone away
+        if not future.cancelled():
+            future.exception()
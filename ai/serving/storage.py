@@ -0,0 +1,240 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+def shard_path(root: str, name: str, levels: int = 2, create: bool = True) -> str:
+    """
+    Place a file in a hash-prefix sharded directory tree
+
+    A flat directory with hundreds of thousands of entries makes every
+    lookup and listing slow. Spreading names over root/ab/cd/ keeps each
+    directory small (65536 leaf directories for two levels).
+
+    Args:
+        root: Storage root directory
+        name: File or directory name
+        levels: Number of two-hex-digit directory levels
+        create: Whether to create the parent directories (False for lookups)
+
+    Returns:
+        Sharded path
+    """
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    parent = os.path.join(root, *[digest[2 * i:2 * i + 2] for i in range(levels)])
+    if create:
+        os.makedirs(parent, exist_ok=True)
+    return os.path.join(parent, name)
+
+
+class Janitor:
+    """
+    Retention and quota enforcement for generated files
+
+    Each sweep deletes files older than the TTL, then deletes the oldest
+    remaining files until the total size is under the quota, and finally
+    removes directories left empty. Files younger than the grace period
+    are never deleted so in-flight requests keep their outputs.
+    """
+
+    def __init__(self, roots: List[str], ttl: Optional[float] = None, max_bytes: Optional[int] = None, grace: float = 60.0):
+        """
+        Initialize janitor
+
+        Args:
+            roots: Directories to manage
+            ttl: Maximum file age in seconds (None or 0 disables)
+            max_bytes: Maximum total size of all roots (None or 0 disables)
+            grace: Minimum age in seconds before a file may be deleted
+        """
+        self.roots = roots
+        self.ttl = ttl or None
+        self.max_bytes = max_bytes or None
+        self.grace = grace
+        self._lock = threading.Lock()
+        self.sweeps = 0
+        self.files_removed = 0
+        self.bytes_reclaimed = 0
+        self.last_sweep: Dict[str, Any] = {}
+
+    def sweep(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run one retention pass
+
+        Args:
+            now: Current wall-clock time (defaults to time.time())
+
+        Returns:
+            Statistics of this sweep
+        """
+        with self._lock:
+            started = time.perf_counter()
+            now = time.time() if now is None else now
+            files = self._scan()
+            total_bytes = sum(size for _, _, size in files)
+            removed = 0
+            reclaimed = 0
+
+            # Oldest first, so both passes remove the least recently written files
+            files.sort()
+            remaining = []
+            for mtime, path, size in files:
+                if self.ttl and now - mtime > self.ttl and self._remove(path):
+                    removed += 1
+                    reclaimed += size
+                    total_bytes -= size
+                else:
+                    remaining.append((mtime, path, size))
+
+            if self.max_bytes:
+                for mtime, path, size in remaining:
+                    if total_bytes <= self.max_bytes:
+                        break
+                    if now - mtime < self.grace:
+                        continue
+                    if self._remove(path):
+                        removed += 1
+                        reclaimed += size
+                        total_bytes -= size
+
+            self._remove_empty_dirs(now)
+
+            self.sweeps += 1
+            self.files_removed += removed
+            self.bytes_reclaimed += reclaimed
+            self.last_sweep = {
+                'time': now,
+                'duration': time.perf_counter() - started,
+                'files_removed': removed,
+                'bytes_reclaimed': reclaimed,
+                'files': len(files) - removed,
+                'bytes': total_bytes,
+            }
+            return self.last_sweep
+
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative reclaim counters and the result of the last sweep"""
+        return {
+            'roots': self.roots,
+            'ttl': self.ttl,
+            'max_bytes': self.max_bytes,
+            'sweeps': self.sweeps,
+            'files_removed': self.files_removed,
+            'bytes_reclaimed': self.bytes_reclaimed,
+            'last_sweep': self.last_sweep,
+        }
+
+    def _scan(self):
+        files = []
+        stack = [root for root in self.roots if os.path.isdir(root)]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                stat = entry.stat(follow_symlinks=False)
+                                files.append((stat.st_mtime, entry.path, stat.st_size))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return files
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _remove_empty_dirs(self, now):
+        for root in self.roots:
+            for directory, _, _ in os.walk(root, topdown=False):
+                if directory == root:
+                    continue
+                try:
+                    # Skip fresh directories a writer may be about to use
+                    if now - os.stat(directory).st_mtime < self.grace:
+                        continue
+                    # Fails unless the directory is empty
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+
+
+class MaskStore:
+    """
+    Packed segmentation masks stored on disk by ID
+
+    Masks are kept in the format of common.masks.pack_mask under a sharded
+    directory, so other endpoints can use a mask by ID instead of having
+    it uploaded again. Reading a mask refreshes its modification time, so
+    masks in use outlive the janitor's TTL.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize mask store
+
+        Args:
+            directory: Storage directory
+        """
+        self.directory = directory
+
+    @staticmethod
+    def valid_id(mask_id: str) -> bool:
+        """Whether a string is a well-formed mask ID (32 lowercase hex digits)"""
+        return len(mask_id) == 32 and all(c in '0123456789abcdef' for c in mask_id)
+
+    def path(self, mask_id: str, create: bool = False) -> Optional[str]:
+        """File of a mask, or None for a malformed ID"""
+        if not self.valid_id(mask_id):
+            return None
+        return shard_path(self.directory, f"{mask_id}.mask", create=create)
+
+    def put(self, mask_id: str, data: bytes):
+        """
+        Store a packed mask
+
+        Args:
+            mask_id: Mask ID
+            data: Packed mask bytes
+        """
+        path = self.path(mask_id, create=True)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def get(self, mask_id: str) -> Optional[bytes]:
+        """
+        Read a packed mask
+
+        Args:
+            mask_id: Mask ID
+
+        Returns:
+            Packed mask bytes, or None if the mask is unknown or expired
+        """
+        path = self.path(mask_id)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def exists(self, mask_id: str) -> bool:
+        """Whether a mask is stored"""
+        path = self.path(mask_id)
+        return path is not None and os.path.exists(path)
@@ -0,0 +1,55 @@
+import io
+import sys
+
+import pytest
+from PIL import Image
+
+from serving.responses import content_disposition
+
+
+def test_content_disposition_ascii():
+    assert content_disposition('dress.png') == 'attachment; filename="dress.png"'
+
+
+def test_content_disposition_non_ascii():
+    header = content_disposition('segmented_드레스.png')
+
+    header.encode('latin-1')
+    assert 'filename="segmented_.png"' in header
+    assert "filename*=utf-8''segmented_%EB%93%9C%EB%A0%88%EC%8A%A4.png" in header
+
+
+def test_content_disposition_strips_quotes_and_control_characters():
+    header = content_disposition('a"b\r\n.png')
+
+    assert 'filename="ab.png"' in header
+    assert '\r' not in header and '\n' not in header
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AI_JOB_WORKERS', '0')
+    monkeypatch.setenv('AI_PRELOAD_MODELS', '')
+    monkeypatch.setenv('AI_DETECTOR', 'stub')
+    for module in ('main', 'config'):
+        monkeypatch.delitem(sys.modules, module, raising=False)
+
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def test_non_ascii_upload_filename(client):
+    body = io.BytesIO()
+    Image.new('RGB', (64, 48), (200, 40, 40)).save(body, 'PNG')
+
+    response = client.post('/segment-object', files={'file': ('드레스.png', body.getvalue(), 'image/png')})
+
+    assert response.status_code == 200
+    assert response.headers['content-disposition'] == (
+        'attachment; filename="segmented_.png"; '
+        "filename*=utf-8''segmented_%EB%93%9C%EB%A0%88%EC%8A%A4.png"
+    )
@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 import torch
 import torch.nn as nn
@@ -5,10 +7,20 @@ import torch.nn.functional as F
 from PIL import Image
 import torchvision.transforms as transforms
 
+from common.image_io import load_mask, source_path
+from common.metrics import timed_stage
+from texture_rendering.texture_cache import TextureCache
+
+# Procedural patterns generated without the texture image
+PROCEDURAL_PATTERNS = ('noise', 'checker', 'stripes')
+
 class TextureRenderer:
-    def __init__(self):
+    def __init__(self, cache_bytes=0):
         """
         Initialize texture renderer
+        
+        Args:
+            cache_bytes: Byte budget of the decoded texture cache (0 decodes every texture)
         """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
@@ -16,34 +28,43 @@ class TextureRenderer:
         self.transform = transforms.Compose([
             transforms.ToTensor(),
         ])
+        
+        # Decoded textures with their mip levels, reused across renders
+        self.textures = TextureCache(cache_bytes)
+    
+    def cache_stats(self):
+        """Statistics of the decoded texture cache"""
+        return self.textures.stats()
     
+    @timed_stage('texture_renderer', 'apply')
     def apply_texture(self, object_mask, texture_image, texture_type='simple', texture_params=None):
         """
         Apply texture to object mask
         
         Args:
-            object_mask: Binary mask of the object
-            texture_image: Path to texture image
+            object_mask: Binary mask of the object (numpy array or tensor, or
+                path, encoded bytes or PIL image of a mask image)
+            texture_image: Path, encoded bytes, PIL image or numpy array of the texture
             texture_type: Type of texture application (simple, mapped, procedural)
             texture_params: Additional parameters for texture application
             
         Returns:
             Object with applied texture
         """
-        # Load texture image
-        texture = Image.open(texture_image).convert('RGB')
-        texture_tensor = self.transform(texture).to(self.device)
-        
-        # Convert mask to tensor
-        if isinstance(object_mask, str):
-            # If object_mask is a path to an image
-            mask_img = Image.open(object_mask).convert('L')
-            mask = np.array(mask_img) / 255.0
+        # Convert mask to a float32 tensor, without a float64 copy
+        if isinstance(object_mask, torch.Tensor):
+            # If object_mask is already a tensor (0-1)
+            mask_tensor = object_mask.to(self.device, torch.float32)
+        elif isinstance(object_mask, np.ndarray):
+            # If object_mask is already a numpy array (e.g. a stored mask)
+            mask_tensor = torch.from_numpy(np.ascontiguousarray(object_mask)).to(self.device, torch.float32)
+            if mask_tensor.max() > 1.0:
+                mask_tensor /= 255.0
         else:
-            # If object_mask is already a numpy array
-            mask = object_mask / 255.0 if object_mask.max() > 1.0 else object_mask
-        
-        mask_tensor = torch.tensor(mask, dtype=torch.float32).to(self.device)
+            # If object_mask is an image (path, bytes or PIL image); the alpha
+            # channel of transparent images such as segment-object output
+            mask_img = load_mask(object_mask)
+            mask_tensor = torch.from_numpy(np.array(mask_img)).to(self.device, torch.float32) / 255.0
         
         # Expand mask to match texture dimensions (3 channels)
         if len(mask_tensor.shape) == 2:
@@ -51,13 +72,16 @@ class TextureRenderer:
         if mask_tensor.shape[0] == 1:
             mask_tensor = mask_tensor.repeat(3, 1, 1)
         
-        # Resize texture to match mask dimensions
-        texture_resized = F.interpolate(
-            texture_tensor.unsqueeze(0),
-            size=(mask_tensor.shape[1], mask_tensor.shape[2]),
-            mode='bilinear',
-            align_corners=False
-        ).squeeze(0)
+        # Decoded texture and its mip levels (skipped by the procedural patterns)
+        pattern = (texture_params or {}).get('pattern', 'noise')
+        pyramid = None
+        if texture_type != 'procedural' or pattern not in PROCEDURAL_PATTERNS:
+            pyramid = self.textures.get(texture_image)
+        
+        # Texture at the mask size, resized from the nearest mip level at least that large
+        texture_resized = None
+        if pyramid is not None and texture_type != 'mapped':
+            texture_resized = pyramid.sample(mask_tensor.shape[1], mask_tensor.shape[2], self.device)
         
         # Apply texture based on type
         if texture_type == 'simple':
@@ -107,6 +131,11 @@ class TextureRenderer:
             # Stack coordinates for grid_sample
             grid = torch.stack([x_coords, y_coords], dim=2).unsqueeze(0)
             
+            # Sample the mip level matching the texture's on-screen size (one repeat
+            # spans 1/scale of the mask)
+            repeat = max(abs(scale), 1e-3)
+            texture_tensor = pyramid.texture(math.ceil(h / repeat), math.ceil(w / repeat), self.device)
+            
             # Sample texture using grid
             sampled_texture = F.grid_sample(
                 texture_tensor.unsqueeze(0),
@@ -182,6 +211,7 @@ class TextureRenderer:
         
         return textured_object_np
     
+    @timed_stage('texture_renderer', 'save')
     def save_textured_object(self, textured_object, output_path):
         """
         Save textured object as image
@@ -200,35 +230,43 @@ class TextureRenderer:
         return output_path
 
 # Main texture rendering function to be used by the API
-def render_texture(object_mask_path, texture_image_path, output_path, texture_type='simple', texture_params=None):
+def render_texture(object_mask_path, texture_image_path, output_path=None, texture_type='simple', texture_params=None, renderer=None):
     """
     Render texture on an object mask
     
     Args:
-        object_mask_path: Path to the object mask image
-        texture_image_path: Path to the texture image
-        output_path: Path to save the output image
+        object_mask_path: Object mask (path, encoded bytes or PIL image of a mask image, or
+            numpy array / tensor such as a stored mask from common.masks.unpack_mask)
+        texture_image_path: Texture image (path, encoded bytes, PIL image or numpy array)
+        output_path: Path to save the output image (None keeps it in memory only)
         texture_type: Type of texture application
         texture_params: Additional parameters for texture application
+        renderer: Shared TextureRenderer instance (a new one is created if None)
         
     Returns:
-        Dictionary with input and output paths
+        Dictionary with input and output paths and, when not saved, the textured image array
     """
-    renderer = TextureRenderer()
+    renderer = renderer or TextureRenderer()
     textured_object = renderer.apply_texture(
         object_mask_path,
         texture_image_path,
         texture_type,
         texture_params
     )
-    result_path = renderer.save_textured_object(textured_object, output_path)
     
-    return {
-        'object_mask': object_mask_path,
-        'texture_image': texture_image_path,
-        'output_image': result_path,
+    result = {
+        'object_mask': source_path(object_mask_path),
+        'texture_image': source_path(texture_image_path),
+        'output_image': None,
         'texture_type': texture_type
     }
+    
+    if output_path is None:
+        result['image'] = textured_object
+    else:
+        result['output_image'] = renderer.save_textured_object(textured_object, output_path)
+    
+    return result
 
 # Export functions for API
-__all__ = ['render_texture']
+__all__ = ['TextureRenderer', 'render_texture']
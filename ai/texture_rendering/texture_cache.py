@@ -0,0 +1,175 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from common.image_io import load_image
+
+# Levels stop once the longer side is this small
+MIN_LEVEL_SIZE = 16
+
+
+class TexturePyramid:
+    """
+    Decoded texture with precomputed downscaled levels
+    
+    Level 0 is the full-resolution texture and each following level halves
+    both sides (2x2 box filter). Levels are kept as uint8 tensors, a
+    quarter of the float32 size; only the level a render samples is
+    converted to float.
+    """
+    
+    def __init__(self, image, max_levels=None):
+        """
+        Build the pyramid of a texture
+        
+        Args:
+            image: RGB PIL image
+            max_levels: Maximum number of levels (None builds them down to
+                MIN_LEVEL_SIZE; 1 keeps only the full-resolution texture)
+        """
+        level = torch.from_numpy(np.array(image)).permute(2, 0, 1).contiguous()
+        self.levels = [level]
+        while max(level.shape[1:]) > MIN_LEVEL_SIZE and min(level.shape[1:]) > 1:
+            if max_levels is not None and len(self.levels) >= max_levels:
+                break
+            level = F.avg_pool2d(level[None].float(), 2, ceil_mode=True)[0].round().to(torch.uint8)
+            self.levels.append(level)
+        self.nbytes = sum(level.numel() for level in self.levels)
+    
+    @property
+    def size(self):
+        """(height, width) of the full-resolution texture"""
+        return tuple(self.levels[0].shape[1:])
+    
+    def level(self, height, width):
+        """
+        Smallest level at least as large as a target size
+        
+        Sampling from it never minifies by more than 2x, so a bilinear
+        resize from there does not alias.
+        
+        Args:
+            height: Target height
+            width: Target width
+        
+        Returns:
+            3xHxW uint8 tensor (level 0 if the target is larger than the texture)
+        """
+        chosen = self.levels[0]
+        for level in self.levels[1:]:
+            if level.shape[1] < height or level.shape[2] < width:
+                break
+            chosen = level
+        return chosen
+    
+    def sample(self, height, width, device):
+        """
+        Float texture at a target size
+        
+        Args:
+            height: Target height
+            width: Target width
+            device: Torch device
+        
+        Returns:
+            3xHxW float tensor in [0, 1]
+        """
+        level = self.level(height, width).to(device, torch.float32) / 255.0
+        if tuple(level.shape[1:]) == (height, width):
+            return level
+        return F.interpolate(level[None], size=(height, width), mode='bilinear', align_corners=False)[0]
+    
+    def texture(self, height, width, device):
+        """
+        Float texture of the smallest level at least as large as a target size, not resized
+        
+        Args:
+            height: Target height
+            width: Target width
+            device: Torch device
+        
+        Returns:
+            3xhxw float tensor in [0, 1]
+        """
+        return self.level(height, width).to(device, torch.float32) / 255.0
+
+
+class TextureCache:
+    """
+    LRU cache of decoded texture pyramids keyed by content hash
+    
+    The same texture uploaded again (or read again from the same file
+    content) skips decoding and pyramid construction. Memory is bounded by
+    a byte budget; a texture larger than the budget is used uncached.
+    """
+    
+    def __init__(self, max_bytes):
+        """
+        Initialize texture cache
+        
+        Args:
+            max_bytes: Byte budget of the cached pyramids (0 disables caching)
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, source):
+        """
+        Pyramid of a texture
+        
+        Args:
+            source: Path, encoded bytes, PIL image or numpy array of the texture
+                (only paths and bytes are cached; decoded images are used as is)
+        
+        Returns:
+            TexturePyramid (only the full-resolution level when not cached)
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                source = f.read()
+        if not isinstance(source, (bytes, bytearray, memoryview)) or not self.max_bytes:
+            # Used once, so the smaller levels would not pay for themselves
+            return TexturePyramid(load_image(source), max_levels=1)
+        
+        key = hashlib.sha256(source).hexdigest()
+        with self._lock:
+            pyramid = self._entries.get(key)
+            if pyramid is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pyramid
+            self.misses += 1
+        
+        # Decoded outside the lock; concurrent misses of one texture both decode it
+        pyramid = TexturePyramid(load_image(source))
+        if pyramid.nbytes <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = pyramid
+                    self.bytes += pyramid.nbytes
+                while self.bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= evicted.nbytes
+        return pyramid
+    
+    def stats(self):
+        """Hit rate, entries and bytes of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }